@@ -1,10 +1,291 @@
 import { Server } from "@modelcontextprotocol/sdk/server/index.js";
 import { StdioServerTransport } from "@modelcontextprotocol/sdk/server/stdio.js";
 import { CallToolRequestSchema, ListToolsRequestSchema } from "@modelcontextprotocol/sdk/types.js";
-import { chromium, Browser, Page } from "playwright";
+import { chromium, Browser, BrowserContext, Page } from "playwright";
+import { createHash, randomUUID } from "node:crypto";
+import { existsSync, mkdirSync, writeFileSync } from "node:fs";
+import { join } from "node:path";
+import { fileURLToPath } from "node:url";
 
-let browser: Browser | null = null;
-let page: Page | null = null;
+// Content-addressed screenshot store (<sha256>.png), served over HTTP by the Python API
+const SCREENSHOT_DIR = process.env.SCREENSHOT_DIR || fileURLToPath(new URL("../screenshots", import.meta.url));
+const THUMBNAIL_WIDTH = 320;
+
+// One server, many isolated browser contexts (one per agent/session), addressed by context_id.
+// Calls without a context_id use the "default" context.
+type ContextSlot = { context: BrowserContext; page: Page; lastSnapshot?: SnapshotState };
+// Last snapshot sent for the slot's page: later calls only return what changed
+type SnapshotState = { url: string; lines: Map<string, string> };
+const DEFAULT_CONTEXT = "default";
+
+// Headed and headless browsers are launched lazily, contexts pick one via their options
+const browsers = new Map<boolean, Browser>();
+// Launches in progress, shared by concurrent create_context calls
+const launches = new Map<boolean, Promise<Browser>>();
+const contexts = new Map<string, ContextSlot>();
+
+// Execution profile options accepted by launch_browser / create_context / reset_session
+type ContextOptions = {
+  headless: boolean;
+  blockResources: string[];
+  disableAnimations: boolean;
+  timeoutMs?: number;
+  navigationTimeoutMs?: number;
+};
+
+const NO_ANIMATIONS_CSS = "*,*::before,*::after{animation:none!important;transition:none!important;caret-color:transparent!important}";
+
+// Accessibility snapshot: visible interactive/landmark elements, one line each,
+// tagged with a data-mcp-ref that stays on the element for the life of the page.
+// Plain strings (not functions) so nothing from the TS build ends up in the page.
+const SNAPSHOT_MAX_ELEMENTS = Number(process.env.SNAPSHOT_MAX_ELEMENTS || 300);
+const SNAPSHOT_HELPERS = String.raw`
+  const TAG_ROLES = { A: "link", BUTTON: "button", SELECT: "combobox", TEXTAREA: "textbox", IMG: "img", NAV: "navigation",
+    MAIN: "main", FORM: "form", DIALOG: "dialog", H1: "heading", H2: "heading", H3: "heading", H4: "heading", H5: "heading", H6: "heading" };
+  const INPUT_ROLES = { checkbox: "checkbox", radio: "radio", submit: "button", button: "button", reset: "button",
+    range: "slider", search: "searchbox", number: "spinbutton" };
+  const clean = (t) => (t || "").replace(/\s+/g, " ").trim().slice(0, 80);
+  const roleOf = (el) => el.getAttribute("role")
+    || (el.tagName === "INPUT" ? (INPUT_ROLES[el.type] || "textbox") : TAG_ROLES[el.tagName]);
+  const nameOf = (el) => {
+    const labelledBy = el.getAttribute("aria-labelledby");
+    if (labelledBy) return clean(labelledBy.split(/\s+/).map((id) => (document.getElementById(id) || {}).textContent || "").join(" "));
+    if (el.getAttribute("aria-label")) return clean(el.getAttribute("aria-label"));
+    if (el.labels && el.labels.length) return clean(el.labels[0].textContent);
+    if (el.tagName === "IMG") return clean(el.alt);
+    if (el.tagName === "INPUT" || el.tagName === "TEXTAREA") return clean(el.placeholder || el.title || el.name);
+    return clean(el.innerText || el.title);
+  };
+`;
+const SNAPSHOT_JS = String.raw`(maxElements) => {` + SNAPSHOT_HELPERS + String.raw`
+  const visible = (el) => {
+    const box = el.getBoundingClientRect();
+    const style = getComputedStyle(el);
+    return box.width > 0 && box.height > 0 && style.visibility !== "hidden" && style.display !== "none";
+  };
+  let seq = window.__mcpRefSeq || 0;
+  const lines = [];
+  const candidates = document.querySelectorAll(
+    "a[href],button,input:not([type=hidden]),select,textarea,h1,h2,h3,h4,h5,h6,[role],img[alt],nav,main,form,dialog[open]");
+  for (const el of candidates) {
+    if (lines.length >= maxElements) break;
+    const role = roleOf(el);
+    if (!role || !visible(el)) continue;
+    let ref = el.getAttribute("data-mcp-ref");
+    if (!ref) { ref = "e" + (++seq); el.setAttribute("data-mcp-ref", ref); }
+    let line = role + ' "' + nameOf(el) + '"';
+    if (/^H\d$/.test(el.tagName)) line += " [level=" + el.tagName[1] + "]";
+    if (el.type === "checkbox" || el.type === "radio") line += el.checked ? " [checked]" : "";
+    else if ("value" in el && el.value && el.type !== "password" && el.tagName !== "BUTTON") line += ' value="' + clean(el.value) + '"';
+    if (el.disabled) line += " [disabled]";
+    lines.push([ref, line]);
+  }
+  window.__mcpRefSeq = seq;
+  return lines;
+}`;
+// Selector for a ref'd element that still works in a later run (for recorded actions / POMs)
+const DURABLE_SELECTOR_JS = String.raw`(ref) => {` + SNAPSHOT_HELPERS + String.raw`
+  const el = document.querySelector('[data-mcp-ref="' + ref + '"]');
+  if (!el) return null;
+  const quote = (v) => '"' + v.replace(/"/g, '\\"') + '"';
+  const unique = (sel) => { try { return document.querySelectorAll(sel).length === 1 ? sel : null; } catch (e) { return null; } };
+  const tag = el.tagName.toLowerCase();
+  if (el.id && unique("#" + CSS.escape(el.id))) return "#" + CSS.escape(el.id);
+  for (const attr of ["data-testid", "data-test", "data-qa", "name", "aria-label", "placeholder"]) {
+    const value = el.getAttribute(attr);
+    if (value && unique(tag + "[" + attr + "=" + quote(value) + "]")) return tag + "[" + attr + "=" + quote(value) + "]";
+  }
+  const role = roleOf(el), name = nameOf(el);
+  return role && name ? "role=" + role + "[name=" + quote(name) + "]" : null;
+}`;
+
+async function takeSnapshot(slot: ContextSlot, full: boolean): Promise<string> {
+  const page = slot.page;
+  const entries: [string, string][] = await page.evaluate(`(${SNAPSHOT_JS})(${SNAPSHOT_MAX_ELEMENTS})`);
+  const lines = new Map(entries);
+  const previous = slot.lastSnapshot;
+  slot.lastSnapshot = { url: page.url(), lines };
+  const header = `Page: ${await page.title()} (${page.url()})`;
+  const render = (ref: string, line: string) => `[${ref}] ${line}`;
+
+  if (full || !previous || previous.url !== page.url()) {
+    return [header, ...entries.map(([ref, line]) => `- ${render(ref, line)}`)].join("\n");
+  }
+  const changes: string[] = [];
+  for (const [ref, line] of entries) {
+    if (!previous.lines.has(ref)) changes.push(`+ ${render(ref, line)}`);
+    else if (previous.lines.get(ref) !== line) changes.push(`~ ${render(ref, line)}`);
+  }
+  for (const [ref, line] of previous.lines) {
+    if (!lines.has(ref)) changes.push(`- ${render(ref, line)}`);
+  }
+  if (!changes.length) return `${header}\nNo changes since the last snapshot.`;
+  // A mostly new page reads better in full
+  if (changes.length > entries.length) {
+    return [header, ...entries.map(([ref, line]) => `- ${render(ref, line)}`)].join("\n");
+  }
+  return [`${header}\nChanges since the last snapshot (+ added, - removed, ~ changed):`, ...changes].join("\n");
+}
+
+// Target of click/fill: a snapshot ref (e12) or a CSS selector. For refs also
+// returns a durable selector, computed before the action (which may navigate away).
+async function resolveTarget(page: Page, args: any): Promise<{ target: string; label: string; durable?: string | null }> {
+  if (args?.ref) {
+    const ref = String(args.ref).replace(/^\[|\]$/g, "");
+    // Only refs the snapshot generated: anything else would be spliced into the CSS selector
+    if (!/^e\d+$/.test(ref)) throw new Error(`Invalid ref '${ref}': use a ref from the latest snapshot, e.g. e12.`);
+    const durable: string | null = await page.evaluate(`(${DURABLE_SELECTOR_JS})(${JSON.stringify(ref)})`);
+    return { target: `[data-mcp-ref="${ref}"]`, label: `[${ref}]`, durable };
+  }
+  if (!args?.selector) throw new Error("Provide 'ref' (from snapshot) or 'selector'.");
+  return { target: String(args.selector), label: String(args.selector) };
+}
+
+function targetNote(durable?: string | null): string {
+  return durable === undefined ? "" : ` (selector: ${durable ?? "none"})`;
+}
+
+let thumbPage: Page | null = null;
+let thumbQueue: Promise<unknown> = Promise.resolve();
+
+// Stores the PNG under its hash; identical screenshots are written once
+function storeScreenshot(png: Buffer): { digest: string; file: string } {
+  const digest = createHash("sha256").update(png).digest("hex");
+  const file = join(SCREENSHOT_DIR, `${digest}.png`);
+  if (!existsSync(file)) {
+    mkdirSync(SCREENSHOT_DIR, { recursive: true });
+    writeFileSync(file, png);
+  }
+  return { digest, file };
+}
+
+// Small JPEG preview for the chat view, rendered in a private context of the headless browser
+// (launched for it if needed), so it never opens a window in the user's session.
+// Contexts share the one thumbnail page, so renders are queued.
+function makeThumbnail(png: Buffer): Promise<Buffer> {
+  const job = thumbQueue.then(() => renderThumbnail(png));
+  thumbQueue = job.catch(() => {});
+  return job;
+}
+
+async function renderThumbnail(png: Buffer): Promise<Buffer> {
+  if (!thumbPage || thumbPage.isClosed() || !thumbPage.context().browser()?.isConnected()) {
+    await ensureBrowser(true);
+    const thumbContext = await browsers.get(true)!.newContext({ viewport: { width: THUMBNAIL_WIDTH, height: THUMBNAIL_WIDTH } });
+    thumbPage = await thumbContext.newPage();
+  }
+  await thumbPage.setContent(
+    `<img id="t" style="display:block;width:${THUMBNAIL_WIDTH}px" src="data:image/png;base64,${png.toString("base64")}">`
+  );
+  await thumbPage.waitForFunction("document.getElementById('t').complete");
+  return await thumbPage.locator("#t").screenshot({ type: "jpeg", quality: 60 });
+}
+
+function contextIdOf(args: any): string {
+  return args?.context_id ? String(args.context_id) : DEFAULT_CONTEXT;
+}
+
+function contextOptionsOf(args: any): ContextOptions {
+  return {
+    headless: Boolean(args?.headless),
+    blockResources: Array.isArray(args?.block_resources) ? args.block_resources.map(String) : [],
+    disableAnimations: Boolean(args?.disable_animations),
+    timeoutMs: args?.timeout_ms ? Number(args.timeout_ms) : undefined,
+    navigationTimeoutMs: args?.navigation_timeout_ms ? Number(args.navigation_timeout_ms) : undefined,
+  };
+}
+
+function browserRunning(): boolean {
+  return [...browsers.values()].some((b) => b.isConnected());
+}
+
+function contextAlive(slot: ContextSlot | undefined): slot is ContextSlot {
+  return Boolean(slot && !slot.page.isClosed() && slot.context.browser()?.isConnected());
+}
+
+// Starts Chromium in the requested mode unless it is already up. Returns true when an existing browser was reused.
+async function ensureBrowser(headless: boolean): Promise<boolean> {
+  const existing = browsers.get(headless);
+  if (existing && existing.isConnected()) return true;
+  let launch = launches.get(headless);
+  if (!launch) {
+    launch = chromium
+      .launch({ headless }) // headless=false: visible window
+      .then((browser) => {
+        browsers.set(headless, browser);
+        return browser;
+      })
+      .finally(() => launches.delete(headless));
+    launches.set(headless, launch);
+  }
+  await launch;
+  return false;
+}
+
+// Fresh context + page on the running browser (cheap compared to a relaunch)
+async function openContext(id: string, options: ContextOptions): Promise<ContextSlot> {
+  await closeContext(id);
+  const context = await browsers.get(options.headless)!.newContext(
+    options.disableAnimations ? { reducedMotion: "reduce" } : {}
+  );
+  if (options.blockResources.length) {
+    const blocked = new Set(options.blockResources);
+    await context.route("**/*", (route) =>
+      blocked.has(route.request().resourceType()) ? route.abort() : route.continue()
+    );
+  }
+  if (options.disableAnimations) {
+    await context.addInitScript(
+      `addEventListener("DOMContentLoaded", () => {
+        const style = document.createElement("style");
+        style.textContent = ${JSON.stringify(NO_ANIMATIONS_CSS)};
+        document.head.appendChild(style);
+      });`
+    );
+  }
+  if (options.timeoutMs) context.setDefaultTimeout(options.timeoutMs);
+  if (options.navigationTimeoutMs) context.setDefaultNavigationTimeout(options.navigationTimeoutMs);
+  const slot = { context, page: await context.newPage() };
+  contexts.set(id, slot);
+  return slot;
+}
+
+async function closeContext(id: string): Promise<boolean> {
+  const slot = contexts.get(id);
+  if (!slot) return false;
+  contexts.delete(id);
+  await slot.context.close().catch(() => {});
+  return true;
+}
+
+const CONTEXT_OPTION_PROPERTIES = {
+  headless: { type: "boolean", description: "Run without a visible window (default false)" },
+  block_resources: {
+    type: "array",
+    items: { type: "string" },
+    description: "Resource types to abort, e.g. ['image', 'font', 'media']",
+  },
+  disable_animations: { type: "boolean", description: "Reduced motion and no CSS animations/transitions" },
+  timeout_ms: { type: "number", description: "Default action timeout" },
+  navigation_timeout_ms: { type: "number", description: "Default navigation timeout" },
+};
+const CONTEXT_SETUP_TOOLS = new Set(["launch_browser", "create_context", "reset_session"]);
+
+// Every tool can target a specific context; context-setup tools also take the execution profile
+function withContextId(tool: any) {
+  const schema = tool.inputSchema;
+  return {
+    ...tool,
+    inputSchema: {
+      ...schema,
+      properties: {
+        ...schema.properties,
+        ...(CONTEXT_SETUP_TOOLS.has(tool.name) ? CONTEXT_OPTION_PROPERTIES : {}),
+        context_id: { type: "string", description: "Browser context to act on (omit for the default one)" },
+      },
+    },
+  };
+}
 
 const server = new Server(
   {
@@ -13,6 +294,8 @@ const server = new Server(
   },
   {
     capabilities: {
+      // The tool list is fixed for the server's lifetime (no tools/list_changed is ever sent),
+      // so clients can cache it per session
       tools: {},
     },
   }
@@ -23,7 +306,22 @@ server.setRequestHandler(ListToolsRequestSchema, async () => {
     tools: [
       {
         name: "launch_browser",
-        description: "Launches a visible browser window. Must be called first.",
+        description: "Launches the browser (a visible window unless running headless). Must be called first.",
+        inputSchema: { type: "object", properties: {} },
+      },
+      {
+        name: "create_context",
+        description: "Creates an isolated browser context (own cookies, storage and page) on the shared browser.",
+        inputSchema: { type: "object", properties: {} },
+      },
+      {
+        name: "close_context",
+        description: "Closes a browser context and everything open in it.",
+        inputSchema: { type: "object", properties: {} },
+      },
+      {
+        name: "reset_session",
+        description: "Discards cookies, storage and open pages and starts a fresh page on the running browser.",
         inputSchema: { type: "object", properties: {} },
       },
       {
@@ -39,25 +337,36 @@ server.setRequestHandler(ListToolsRequestSchema, async () => {
       },
       {
         name: "click",
-        description: "Click an element on the page using a CSS selector",
+        description: "Click an element, by its snapshot ref (preferred) or a CSS selector",
         inputSchema: {
           type: "object",
           properties: {
+            ref: { type: "string", description: "Element ref from the snapshot tool (e.g., e12)" },
             selector: { type: "string", description: "CSS selector (e.g., #login-button)" },
           },
-          required: ["selector"],
         },
       },
       {
         name: "fill",
-        description: "Fill a text input field",
+        description: "Fill a text input field, by its snapshot ref (preferred) or a CSS selector",
         inputSchema: {
           type: "object",
           properties: {
+            ref: { type: "string", description: "Element ref from the snapshot tool (e.g., e7)" },
             selector: { type: "string", description: "CSS selector (e.g., #username)" },
             value: { type: "string", description: "The text to type" },
           },
-          required: ["selector", "value"],
+          required: ["value"],
+        },
+      },
+      {
+        name: "snapshot",
+        description: "Compact accessibility snapshot of the page: one line per visible interactive element with a ref (e.g. [e12] button \"Sign in\") to use with click/fill. After the first call on a page only the changes are returned.",
+        inputSchema: {
+          type: "object",
+          properties: {
+            full: { type: "boolean", description: "Return the whole snapshot instead of the changes" },
+          },
         },
       },
       {
@@ -67,29 +376,55 @@ server.setRequestHandler(ListToolsRequestSchema, async () => {
       },
       {
         name: "screenshot",
-        description: "Take a screenshot. Returns the image for AI analysis.",
+        description: "Take a screenshot. Returns a link to the stored image and a small preview.",
         inputSchema: {
           type: "object",
           properties: {
             name: { type: "string", description: "Filename (e.g., 'error.png')" },
-            fullPage: { type: "boolean", description: "True for full scrollable page" }
+            fullPage: { type: "boolean", description: "True for full scrollable page" },
+            thumbnail: { type: "boolean", description: "Include a small JPEG preview (default true)" }
           },
           required: ["name"],
         },
       },
-    ],
+    ].map(withContextId),
   };
 });
 
 server.setRequestHandler(CallToolRequestSchema, async (request) => {
   try {
     const { name, arguments: args } = request.params;
+    const contextId = contextIdOf(args);
+    const options = contextOptionsOf(args);
     if (name === "launch_browser") {
-        if (browser) await browser.close();
-        browser = await chromium.launch({ headless: false }); // Visible window
-        page = await browser.newPage();
-        return { content: [{ type: "text", text: "Browser launched successfully." }] };
+        // Reuse a warm browser (e.g. from the Python session pool), only the context is renewed
+        const reused = await ensureBrowser(options.headless);
+        await openContext(contextId, options);
+        return { content: [{ type: "text", text: reused ? "Browser ready (fresh page)." : "Browser launched successfully." }] };
+    }
+    if (name === "create_context") {
+        const id = args?.context_id ? contextId : randomUUID();
+        await ensureBrowser(options.headless);
+        await openContext(id, options);
+        return { content: [{ type: "text", text: `Context ${id} created.` }] };
     }
+    if (name === "close_context") {
+        const closed = await closeContext(contextId);
+        return { content: [{ type: "text", text: closed ? `Context ${contextId} closed.` : `Context ${contextId} not found.` }] };
+    }
+    if (name === "reset_session") {
+        if (!browserRunning()) {
+          return {
+            content: [{ type: "text", text: "Error: Browser not running. Call launch_browser first." }],
+            isError: true
+          };
+        }
+        await ensureBrowser(options.headless);
+        await openContext(contextId, options);
+        return { content: [{ type: "text", text: "Session reset." }] };
+    }
+    const slot = contexts.get(contextId);
+    const page = contextAlive(slot) ? slot.page : null;
     if (!page) {
       return { 
         content: [{ type: "text", text: "Error: Browser not running. Call launch_browser first." }],
@@ -103,15 +438,19 @@ server.setRequestHandler(CallToolRequestSchema, async (request) => {
         return { content: [{ type: "text", text: `Navigated to ${url}` }] };
       }
       case "click": {
-        const selector = String(args?.selector);
-        await page.click(selector);
-        return { content: [{ type: "text", text: `Clicked element: ${selector}` }] };
+        const { target, label, durable } = await resolveTarget(page, args);
+        await page.click(target);
+        return { content: [{ type: "text", text: `Clicked element: ${label}${targetNote(durable)}` }] };
       }
       case "fill": {
-        const selector = String(args?.selector);
+        const { target, label, durable } = await resolveTarget(page, args);
         const value = String(args?.value);
-        await page.fill(selector, value);
-        return { content: [{ type: "text", text: `Filled ${selector} with '${value}'` }] };
+        await page.fill(target, value);
+        return { content: [{ type: "text", text: `Filled ${label} with '${value}'${targetNote(durable)}` }] };
+      }
+      case "snapshot": {
+        const text = await takeSnapshot(slot!, Boolean(args?.full));
+        return { content: [{ type: "text", text }] };
       }
       case "get_content": {
         const text = await page.innerText("body");
@@ -121,15 +460,20 @@ server.setRequestHandler(CallToolRequestSchema, async (request) => {
       case "screenshot": {
         const name = String(args?.name || "screenshot.png");
         const fullPage = Boolean(args?.fullPage);
+        const withThumbnail = args?.thumbnail !== false;
         const path = process.cwd() + "/" + name;
         const buffer = await page.screenshot({ path: path, fullPage: fullPage });
-        const base64Image = buffer.toString("base64");
-        return { 
-            content: [
-                { type: "text", text: `Screenshot saved locally to: ${path}` },
-                { type: "text", text: `IMAGE_BASE64:${base64Image}` } 
-            ] 
-        };
+        // Only a reference crosses the stdio pipe; clients fetch the PNG by hash
+        const { digest, file } = storeScreenshot(buffer);
+        const content: any[] = [
+            { type: "text", text: `Screenshot saved locally to: ${path}` },
+            { type: "resource_link", uri: `file://${file}`, name: `${digest}.png`, mimeType: "image/png" }
+        ];
+        if (withThumbnail) {
+            const thumb = await makeThumbnail(buffer);
+            content.push({ type: "image", data: thumb.toString("base64"), mimeType: "image/jpeg" });
+        }
+        return { content };
       }
       default:
         throw new Error(`Unknown tool: ${name}`);
@@ -0,0 +1,112 @@
+// Long-lived TypeScript language service for validating generated POM/spec files.
+// Protocol: one JSON object per line.
+//   stdin:  {"id": 1, "files": [{"path": "tests/pages/LoginPage.ts", "code": "..."}]}
+//   stdout: {"id": 1, "results": {"tests/pages/LoginPage.ts": [{"code", "category", "line", "column", "message"}]}}
+// Checked code is an in-memory overlay for the length of its request only, so files
+// of one batch can import each other. Everything else (e.g. a POM a spec imports)
+// is read from disk: rejected drafts and heal candidates never shadow the real file.
+import ts from "typescript";
+import { createInterface } from "node:readline";
+import { existsSync, readFileSync, statSync } from "node:fs";
+import { resolve } from "node:path";
+import { fileURLToPath } from "node:url";
+
+const SERVER_ROOT = fileURLToPath(new URL("..", import.meta.url));
+
+// Playwright transpiles tests without type-checking, so only flag what would break at runtime
+// or is plainly wrong, not style (implicit any, unused locals).
+const COMPILER_OPTIONS: ts.CompilerOptions = {
+  target: ts.ScriptTarget.ES2020,
+  module: ts.ModuleKind.ESNext,
+  moduleResolution: ts.ModuleResolutionKind.Bundler,
+  strict: false,
+  skipLibCheck: true,
+  noEmit: true,
+  esModuleInterop: true,
+  types: ["node"],
+};
+
+type FileEntry = { version: number; code: string };
+type Diagnostic = { code: number; category: string; line: number; column: number; message: string };
+
+const overlays = new Map<string, FileEntry>();
+// Never reused, so an overlay never looks like an earlier parse of the same path
+let nextVersion = 0;
+
+const host: ts.LanguageServiceHost = {
+  getCompilationSettings: () => COMPILER_OPTIONS,
+  getScriptFileNames: () => [...overlays.keys()],
+  getScriptVersion: (file) => {
+    const overlay = overlays.get(file);
+    if (overlay) return `overlay-${overlay.version}`;
+    // Files on disk are re-parsed when they change
+    return existsSync(file) ? String(statSync(file).mtimeMs) : "0";
+  },
+  getScriptSnapshot: (file) => {
+    const overlay = overlays.get(file);
+    if (overlay) return ts.ScriptSnapshot.fromString(overlay.code);
+    if (!existsSync(file)) return undefined;
+    return ts.ScriptSnapshot.fromString(readFileSync(file, "utf8"));
+  },
+  getCurrentDirectory: () => SERVER_ROOT,
+  getDefaultLibFileName: (options) => ts.getDefaultLibFilePath(options),
+  fileExists: (file) => overlays.has(file) || ts.sys.fileExists(file),
+  readFile: (file) => overlays.get(file)?.code ?? ts.sys.readFile(file),
+  readDirectory: ts.sys.readDirectory,
+  directoryExists: ts.sys.directoryExists,
+  getDirectories: ts.sys.getDirectories,
+};
+
+// Reused across requests: only changed files are re-parsed and re-checked
+const service = ts.createLanguageService(host, ts.createDocumentRegistry());
+
+function toDiagnostic(d: ts.Diagnostic): Diagnostic {
+  const { line, character } = d.file && d.start !== undefined
+    ? d.file.getLineAndCharacterOfPosition(d.start)
+    : { line: 0, character: 0 };
+  return {
+    code: d.code,
+    category: ts.DiagnosticCategory[d.category].toLowerCase(),
+    line: line + 1,
+    column: character + 1,
+    message: ts.flattenDiagnosticMessageText(d.messageText, "\n"),
+  };
+}
+
+function check(files: { path: string; code: string }[]): Record<string, Diagnostic[]> {
+  // Register the whole batch first, so files in one request can import each other
+  const paths = files.map(({ path, code }) => {
+    const file = resolve(SERVER_ROOT, path);
+    overlays.set(file, { version: ++nextVersion, code });
+    return [path, file];
+  });
+  const results: Record<string, Diagnostic[]> = {};
+  try {
+    for (const [path, file] of paths) {
+      results[path] = [
+        ...service.getSyntacticDiagnostics(file),
+        ...service.getSemanticDiagnostics(file),
+      ].map(toDiagnostic);
+    }
+  } finally {
+    for (const [, file] of paths) overlays.delete(file);
+  }
+  return results;
+}
+
+const lines = createInterface({ input: process.stdin });
+lines.on("line", (line) => {
+  if (!line.trim()) return;
+  let id: unknown = null;
+  try {
+    const request = JSON.parse(line);
+    id = request.id;
+    process.stdout.write(JSON.stringify({ id, results: check(request.files ?? []) }) + "\n");
+  } catch (error) {
+    process.stdout.write(JSON.stringify({ id, error: String(error) }) + "\n");
+  }
+});
+lines.on("close", () => process.exit(0));
+
+// Ready signal: the client waits for it before sending the first batch
+process.stdout.write(JSON.stringify({ ready: true, typescript: ts.version }) + "\n");
@@ -1,11 +1,19 @@
 import os
+import re
+import json
+import time
+import shutil
+import signal
+import asyncio
 import subprocess
-from mcp import ClientSession, StdioServerParameters
-from mcp.client.stdio import stdio_client
 from core.ai import get_ai_response
-from utils.generators import generate_manual_test_proposal, generate_pom_code, generate_spec_code
-from utils.healer import heal_code
-from core.mcp_client import create_mcp_connection
+from utils.generators import generate_manual_test_proposal, generate_pom_code, generate_spec_code, pom_class_name
+from utils.healer import heal_code, propose_fixes, locator_fixes, HEAL_CANDIDATES
+from utils.optimizer import optimizer_queue
+from core.selector_memory import get_selector_memory
+from utils.reporter import collect_failures
+from core.mcp_pool import McpSessionPool
+from core.execution_profile import get_profile
 
 # Paths
 BASE_DIR = os.path.dirname(os.path.dirname(os.getcwd())) # Adjust based on depth
@@ -13,20 +21,25 @@ SERVER_DIR = os.path.abspath(os.path.join(os.getcwd(), "../playwright-server"))
 MANUAL_DIR = os.path.join(SERVER_DIR, "manual_cases")
 PAGES_DIR = os.path.join(SERVER_DIR, "tests", "pages")
 SPECS_DIR = os.path.join(SERVER_DIR, "tests", "specs")
+# Artifacts (traces, error-context snapshots, .last-run.json) of healing runs
+HEAL_OUTPUT_DIR = os.path.join(SERVER_DIR, "heal-results")
 
-async def run_architect_flow():
+# --- CONFIGURATION FROM ENV ---
+HEAL_MAX_ROUNDS = int(os.getenv("HEAL_MAX_ROUNDS", "2"))
+# Upper bound for one round of racing candidates
+HEAL_RACE_TIMEOUT_SECONDS = float(os.getenv("HEAL_RACE_TIMEOUT_SECONDS", "300"))
+
+async def run_architect_flow(config=None, pool=None, profile=None):
     print("\n🚀 Starting Autonomous Architect Agent...")
-    
-    # Connect to Server
-    server_script = os.path.join(SERVER_DIR, "src/index.ts")
-    server_params = StdioServerParameters(command="npx", args=["tsx", server_script], env=os.environ)
+    profile = get_profile(profile)
 
     url = input("🌐 Enter URL to Automate: ").strip()
     page_safe_name = url.replace("https://", "").replace(".", "_").replace("/", "_")
 
-    async with stdio_client(server_params) as (read, write):
-        async with ClientSession(read, write) as session:
-            await session.initialize()
+    # Lease a browser context (shared pool, or a one-off on-demand one)
+    session_pool = pool or McpSessionPool(size=0, profile=profile)
+    try:
+        async with session_pool.lease(profile=profile) as session:
             
             # 1. VISUALIZATION
             print("--- Phase 1: Visualization ---")
@@ -40,7 +53,7 @@ async def run_architect_flow():
             json_path = os.path.join(MANUAL_DIR, f"{page_safe_name}.json")
             
             if not os.path.exists(json_path):
-                proposal = generate_manual_test_proposal(url, page_text)
+                proposal = await asyncio.to_thread(generate_manual_test_proposal, url, page_text, config=config)
                 print(f"AI Proposal:\n{proposal}")
                 if input("Approve? (y/n): ").lower() == 'y':
                     if not os.path.exists(MANUAL_DIR): os.makedirs(MANUAL_DIR)
@@ -53,8 +66,11 @@ async def run_architect_flow():
 
             # 3. CODE GENERATION
             print("--- Phase 3: Architecture Generation ---")
-            pom_name, pom_code = generate_pom_code(manual_data)
-            spec_code = generate_spec_code(manual_data, pom_name)
+            # The spec only needs the POM class name (derived from the title): generate both at once
+            (pom_name, pom_code), spec_code = await asyncio.gather(
+                asyncio.to_thread(generate_pom_code, manual_data, config=config),
+                asyncio.to_thread(generate_spec_code, manual_data, pom_class_name(json.loads(manual_data)["title"]), config=config),
+            )
             
             if not os.path.exists(PAGES_DIR): os.makedirs(PAGES_DIR)
             if not os.path.exists(SPECS_DIR): os.makedirs(SPECS_DIR)
@@ -66,24 +82,204 @@ async def run_architect_flow():
             with open(spec_path, "w") as f: f.write(spec_code)
             
             print(f"✅ Generated: {pom_name}Page.ts & {page_safe_name}.spec.ts")
+    finally:
+        if session_pool is not pool:
+            await session_pool.close()
 
     # 4. EXECUTION & HEALING (Outside MCP loop)
     print("--- Phase 4: Execution & Healing ---")
-    run_test_with_healing(spec_path, pom_path)
+    run_test_with_healing(spec_path, pom_path, config=config, profile=profile, url=url)
+
+def _run_playwright(spec_path, headed, last_failed=False):
+    """One Playwright run with a JSON report; returns (returncode, report or None, stderr)."""
+    report_path = os.path.join(HEAL_OUTPUT_DIR, "report.json")
+    if os.path.exists(report_path): os.remove(report_path)
+    cmd = ["npx", "playwright", "test", spec_path,
+           "--reporter=json", "--trace=retain-on-failure", f"--output={HEAL_OUTPUT_DIR}"]
+    if last_failed:
+        cmd.append("--last-failed")
+    if headed:
+        cmd.append("--headed")
+    env = {**os.environ, "PLAYWRIGHT_JSON_OUTPUT_NAME": report_path}
+    res = subprocess.run(cmd, cwd=SERVER_DIR, capture_output=True, text=True, env=env)
+
+    report = None
+    if os.path.exists(report_path):
+        try:
+            with open(report_path, "r") as f: report = json.load(f)
+        except ValueError:
+            pass
+    return res.returncode, report, res.stderr or res.stdout
+
+def _read_report(report_path):
+    if not os.path.exists(report_path):
+        return None
+    try:
+        with open(report_path, "r") as f: return json.load(f)
+    except ValueError:
+        return None
+
+def _stop(process):
+    """Stops npx and the Playwright workers it started."""
+    if process.poll() is not None:
+        return
+    try:
+        if os.name == 'nt':
+            process.kill()
+        else:
+            os.killpg(process.pid, signal.SIGTERM)
+    except OSError:
+        pass
+
+def _race_candidates(spec_path, pom_path, candidates, failures):
+    """
+    Runs every candidate POM in its own copy of the tests tree, all at once and
+    headless, restricted to the failed tests. Returns (label, code) of the first
+    candidate that passes, or None plus what the others failed on.
+    """
+    race_dir = os.path.join(HEAL_OUTPUT_DIR, "candidates")
+    tests_dir = os.path.join(SERVER_DIR, "tests")
+    rel_spec = os.path.relpath(spec_path, tests_dir)
+    rel_pom = os.path.relpath(pom_path, tests_dir)
+    titles = [f["title"] for f in failures if f.get("title")]
+
+    shutil.rmtree(race_dir, ignore_errors=True)
+    runs = []
+    try:
+        for i, (label, code) in enumerate(candidates, 1):
+            candidate_dir = os.path.join(race_dir, f"c{i}")
+            # Relative imports ('../pages/...') resolve inside the copy
+            shutil.copytree(tests_dir, os.path.join(candidate_dir, "tests"))
+            with open(os.path.join(candidate_dir, "tests", rel_pom), "w") as f: f.write(code)
+
+            report_path = os.path.join(candidate_dir, "report.json")
+            cmd = ["npx", "playwright", "test", os.path.join(candidate_dir, "tests", rel_spec),
+                   "--reporter=json", "--trace=retain-on-failure", "--workers=1",
+                   f"--output={os.path.join(candidate_dir, 'results')}"]
+            if titles:
+                cmd += ["--grep", "|".join(re.escape(t) for t in titles)]
+            process = subprocess.Popen(
+                cmd, cwd=SERVER_DIR, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+                env={**os.environ, "PLAYWRIGHT_JSON_OUTPUT_NAME": report_path},
+                start_new_session=os.name != 'nt',
+            )
+            runs.append((label, code, process, report_path))
+        print(f"🏁 Racing {len(runs)} candidates...")
+
+        winner = None
+        deadline = time.monotonic() + HEAL_RACE_TIMEOUT_SECONDS
+        while winner is None and time.monotonic() < deadline:
+            running = False
+            for label, code, process, _ in runs:
+                returncode = process.poll()
+                if returncode is None:
+                    running = True
+                elif returncode == 0:
+                    winner = (label, code)
+                    break
+            if not running:
+                break
+            time.sleep(0.2)
+
+        for _, _, process, _ in runs:
+            _stop(process)
+
+        if winner:
+            print(f"🏆 Candidate {winner[0]} passed.")
+            return winner, None
 
-def run_test_with_healing(spec_path, pom_path):
-    for attempt in range(1, 3):
+        # What each losing candidate tried, for the next round's prompt
+        tried = []
+        for label, _, process, report_path in runs:
+            process.wait()
+            report = _read_report(report_path)
+            for failure in collect_failures(report) if report else []:
+                first_line = failure["error"].splitlines()[0] if failure["error"] else ""
+                tried.append(f"{failure.get('locator') or label}: {first_line}")
+        return None, "\n    ".join(tried) or None
+    finally:
+        # Never leave copies behind for a plain 'npx playwright test' to pick up
+        for _, _, process, _ in runs:
+            _stop(process)
+            process.wait()
+        shutil.rmtree(race_dir, ignore_errors=True)
+
+def _remember_heal(url, old_code, failures, pom_path):
+    """A heal that made the test pass: keep its locator swaps for future POMs."""
+    with open(pom_path, "r") as f: new_code = f.read()
+    memory = get_selector_memory()
+    for broken, fixed in locator_fixes(old_code, new_code, failures):
+        memory.record_heal(url, broken, fixed)
+        print(f"   🧠 Remembered fix: {broken} -> {fixed}")
+
+def _heal_speculatively(spec_path, pom_path, log, failures, config, k, rounds):
+    """
+    Up to `rounds` rounds of k raced candidate fixes. Every round tells the model
+    what the previous losers tried. True once a candidate passed; it is applied.
+    """
+    tried = None
+    for round_no in range(1, rounds + 1):
+        print(f"🚑 Speculative healing, round {round_no}...")
+        candidates = propose_fixes(pom_path, log[-2000:], config=config, failures=failures, k=k,
+                                   previous_attempts=tried)
+        if not candidates:
+            return False
+        winner, tried = _race_candidates(spec_path, pom_path, candidates, failures)
+        if winner:
+            with open(pom_path, "w") as f: f.write(winner[1])
+            print("✅ POM Patched.")
+            return True
+    return False
+
+def run_test_with_healing(spec_path, pom_path, config=None, profile=None, candidates=HEAL_CANDIDATES, url=None):
+    """
+    Runs the spec, and while it fails: captures the failure (error, failing
+    locator, page snapshot, trace), heals the POM from it and re-runs only the
+    failed tests, headless. At most HEAL_MAX_ROUNDS heals.
+    candidates > 1: each heal races that many alternative fixes instead (speculative healing).
+    Locator swaps of a heal that made the test pass go to the selector memory (under url).
+    """
+    # Headless profiles run without a display (CI / build boxes); reruns are always headless
+    headed = not get_profile(profile).headless
+    if not os.path.exists(HEAL_OUTPUT_DIR): os.makedirs(HEAL_OUTPUT_DIR)
+    healed_from = None  # (POM before the last heal, failures it fixed)
+
+    for attempt in range(1, HEAL_MAX_ROUNDS + 2):
         print(f"▶️ Execution Attempt {attempt}...")
-        res = subprocess.run(
-            ["npx", "playwright", "test", spec_path, "--headed"],
-            cwd=SERVER_DIR, capture_output=True, text=True
-        )
-        
-        if res.returncode == 0:
+        # A background optimizer write must not land mid-run or overwrite a heal
+        optimizer_queue.drain()
+        returncode, report, log = _run_playwright(spec_path, headed=headed and attempt == 1, last_failed=attempt > 1)
+
+        if returncode == 0:
             print("🎉 Test Passed!")
+            if healed_from:
+                _remember_heal(url, *healed_from, pom_path=pom_path)
+            return True
+
+        print("❌ Test Failed.")
+        failures = collect_failures(report) if report else []
+        for failure in failures:
+            print(f"   ↳ {failure['title']}: {failure['error'].splitlines()[0] if failure['error'] else ''}")
+            if failure.get("locator"): print(f"     Locator: {failure['locator']}")
+            if failure.get("trace_path"): print(f"     Trace: npx playwright show-trace {failure['trace_path']}")
+        if not failures:
+            # No report (compile error, crash): the raw log is all there is
+            print(log[-300:])
+
+        if attempt > HEAL_MAX_ROUNDS:
             break
-        else:
-            print("❌ Test Failed.")
-            print(res.stderr[-300:])
-            print("🚑 Healing...")
-            heal_code(pom_path, res.stderr)
\ No newline at end of file
+        with open(pom_path, "r") as f: healed_from = (f.read(), failures)
+        if candidates > 1:
+            # The winner already passed the failed tests in its copy of the tree
+            if _heal_speculatively(spec_path, pom_path, log, failures, config, candidates, HEAL_MAX_ROUNDS):
+                print("🎉 Test Passed!")
+                _remember_heal(url, *healed_from, pom_path=pom_path)
+                return True
+            break
+        print("🚑 Healing...")
+        if not heal_code(pom_path, log[-2000:], config=config, failures=failures):
+            # Same code would fail the same way
+            break
+
+    print("💀 Healing did not converge. See the traces above.")
+    return False
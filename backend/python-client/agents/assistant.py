@@ -2,30 +2,20 @@ import asyncio
 import os
 import sys
 import json
-from mcp import ClientSession, StdioServerParameters
-from mcp.client.stdio import stdio_client
-from core.ai import get_ai_response, parse_ai_response, set_active_model, get_current_model_info
-from core.mcp_client import create_mcp_connection
+from core.ai import get_ai_response_async, parse_ai_response, ModelConfig
+from core.mcp_client import create_mcp_connection, create_client_session, get_tools_schema
+from core.screenshots import split_tool_result
 
-async def run_chat_assistant():
-    print(f"\n💬 Starting Interactive Assistant ({get_current_model_info()})")
+async def run_chat_assistant(config=None):
+    config = config or ModelConfig()
+    print(f"\n💬 Starting Interactive Assistant ({config.describe()})")
     print("ℹ️  Type '/switch' to change models.")
     print("ℹ️  Type 'exit' to quit.\n")
 
     try:
         async with create_mcp_connection() as (read, write):
-            async with ClientSession(read, write) as session:
+            async with create_client_session(read, write) as session:
                 await session.initialize()
-                
-                tools = await session.list_tools()
-                tools_schema = []
-                for t in tools.tools:
-                    schema = getattr(t, 'inputSchema', getattr(t, 'input_schema', {}))
-                    tools_schema.append({
-                        "name": t.name,
-                        "description": t.description,
-                        "inputSchema": schema 
-                    })
 
                 # STRONGER SYSTEM PROMPT to prevent loops
                 messages = [{
@@ -34,6 +24,7 @@ async def run_chat_assistant():
                     1. If you successfully execute a tool (like navigate), DO NOT call it again immediately.
                     2. Instead, describe what you see or ask the user for the next step.
                     3. If the browser is not open, call launch_browser first.
+                    4. To find elements call snapshot, then click/fill with its ref (e.g. ref="e12") instead of guessing selectors.
                     """
                 }]
 
@@ -49,9 +40,10 @@ async def run_chat_assistant():
                     if user_input.lower().startswith("/switch"):
                         print("\n🔄 Select Model: 1. Gemini Flash  2. Llama 3.3 (Groq)  3. GPT-4o")
                         sel = input("Choice: ").strip()
-                        if sel == "1": set_active_model("gemini", "models/gemini-1.5-flash")
-                        elif sel == "2": set_active_model("groq", "llama-3.3-70b-versatile")
-                        elif sel == "3": set_active_model("openai", "gpt-4o")
+                        if sel == "1": config = ModelConfig("gemini", "models/gemini-1.5-flash")
+                        elif sel == "2": config = ModelConfig("groq", "llama-3.3-70b-versatile")
+                        elif sel == "3": config = ModelConfig("openai", "gpt-4o")
+                        print(f"\n🔄 Switched AI to: {config.describe()}")
                         continue
 
                     messages.append({"role": "user", "content": user_input})
@@ -61,7 +53,8 @@ async def run_chat_assistant():
                     while loop_count < 5: # Safety break
                         loop_count += 1
                         try:
-                            raw_response = get_ai_response(messages, tools_schema)
+                            tools_schema = await get_tools_schema(session)
+                            raw_response = await get_ai_response_async(messages, tools_schema, config=config)
                             intent = parse_ai_response(raw_response)
 
                             if intent["type"] == "text":
@@ -85,13 +78,7 @@ async def run_chat_assistant():
                                 print(f"⚙️  Action: {t_name} {t_args}")
                                 result = await session.call_tool(t_name, arguments=t_args)
                                 
-                                result_text = ""
-                                for content in result.content:
-                                    if content.type == "text":
-                                        if content.text.startswith("IMAGE_BASE64:"):
-                                            result_text += "[Screenshot Taken]"
-                                        else:
-                                            result_text += content.text
+                                result_text, _ = split_tool_result(result)
 
                                 print(f"   ✅ Result: {result_text[:100]}...")
                                 messages.append({"role": "model", "content": f"Call {t_name}."})
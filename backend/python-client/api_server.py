@@ -1,15 +1,32 @@
 import asyncio
 import json
 import os
-from fastapi import FastAPI, WebSocket, WebSocketDisconnect, HTTPException
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, WebSocket, WebSocketDisconnect, HTTPException, Request
+from fastapi.responses import FileResponse, Response
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
 
 # --- IMPORTS FROM YOUR CORE LOGIC ---
 from core.agent_engine import AgentEngine
-from core.ai import get_ai_response, parse_ai_response, set_active_model
+from core.ai import ModelConfig
+from core.llm_cache import get_ai_text_async, get_cache
+from core.mcp_pool import McpSessionPool
+from core.rate_limiter import limiter_stats
+from core.circuit_breaker import breaker_stats
+from core.screenshots import screenshot_file
 
-app = FastAPI()
+# --- WARM MCP SESSION POOL ---
+# Spawning 'npx tsx' + Chromium per websocket takes seconds: keep a server warm
+# and give each websocket its own browser context on it.
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    app.state.mcp_pool = McpSessionPool()
+    await app.state.mcp_pool.start()
+    yield
+    await app.state.mcp_pool.close()
+
+app = FastAPI(lifespan=lifespan)
 
 # Enable CORS for Next.js
 app.add_middleware(
@@ -24,6 +41,7 @@ class StepGenRequest(BaseModel):
     prompt: str
     provider: str = "gemini"
     model: str = "models/gemini-2.5-flash"
+    bypass_cache: bool = False
 
 class TestCaseSaveRequest(BaseModel):
     filename: str
@@ -37,8 +55,8 @@ async def websocket_endpoint(websocket: WebSocket):
     await websocket.accept()
     print("🔌 Client connected")
 
-    # Initialize the Agent
-    agent = AgentEngine() 
+    # Initialize the Agent (leases a browser context; ?profile=fast|headless|headed, default EXECUTION_PROFILE)
+    agent = AgentEngine(pool=app.state.mcp_pool, profile=websocket.query_params.get("profile"))
     success = await agent.initialize()
     
     if not success:
@@ -84,8 +102,8 @@ async def generate_test_steps(request: StepGenRequest):
     """
     print(f"✨ Generating steps using {request.provider}...")
     
-    # 1. Configure Model
-    set_active_model(request.provider, request.model)
+    # 1. Configure Model (request-scoped)
+    config = ModelConfig(request.provider, request.model)
     
     # 2. Construct Prompt
     prompt = f"""
@@ -110,10 +128,10 @@ async def generate_test_steps(request: StepGenRequest):
     messages = [{"role": "user", "content": prompt}]
     
     try:
-        # 3. Call AI
-        raw_response = get_ai_response(messages)
-        parsed = parse_ai_response(raw_response)
-        content = parsed["content"]
+        # 3. Call AI (identical prompts are served from the response cache)
+        content = await get_ai_text_async(messages, config=config, bypass_cache=request.bypass_cache)
+        if not content:
+            raise ValueError("AI returned an empty response.")
         
         # 4. Clean Markdown Code Blocks
         if "```json" in content:
@@ -129,6 +147,37 @@ async def generate_test_steps(request: StepGenRequest):
         print(f"❌ Generation Error: {e}")
         return {"steps": [], "error": str(e)}
 
+@app.get("/api/screenshots/{digest}")
+async def get_screenshot(digest: str, request: Request):
+    """
+    Serves screenshots from the content-addressed store.
+    The digest is the content hash, so it doubles as a permanent ETag.
+    """
+    path = screenshot_file(digest)
+    if not path:
+        raise HTTPException(status_code=404, detail="Screenshot not found")
+
+    etag = f'"{digest}"'
+    headers = {"ETag": etag, "Cache-Control": "public, max-age=31536000, immutable"}
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=headers)
+    return FileResponse(path, media_type="image/png", headers=headers)
+
+@app.get("/api/ai-cache/stats")
+async def ai_cache_stats():
+    """Hit/miss counters of the LLM response cache since server start."""
+    return get_cache().stats
+
+@app.get("/api/ai-rate-limits")
+async def ai_rate_limits():
+    """Per provider/model admission counters of the shared rate limiter."""
+    return limiter_stats()
+
+@app.get("/api/ai-circuits")
+async def ai_circuits():
+    """Circuit breaker state per provider/model (closed / open / half_open)."""
+    return breaker_stats()
+
 @app.post("/api/save-testcase")
 async def save_testcase(request: TestCaseSaveRequest):
     """
@@ -1,28 +1,43 @@
 import asyncio
-from mcp import ClientSession
-from core.ai import get_ai_response, parse_ai_response, set_active_model
-from core.mcp_client import create_mcp_connection
+from contextlib import aclosing
+from core.ai import stream_ai_response_async, ModelConfig
+from core.mcp_client import create_mcp_connection, create_client_session, get_tools_schema, ContextSession
+from core.execution_profile import get_profile
+from core.memory import ConversationMemory
+from core.screenshots import split_tool_result
 
 class AgentEngine:
-    def __init__(self):
+    def __init__(self, pool=None, profile=None):
         self.session = None
         self.conn_ctx = None
         self.sess_ctx = None
-        self.history = [{
+        self.pool = pool
+        self.lease_ctx = None
+        # Browser settings for our context (ExecutionProfile or name, env default)
+        self.profile = get_profile(profile)
+        # Token-budgeted history: system prompt + current request are always sent
+        self.memory = ConversationMemory(system=[{
             "role": "system",
             "content": "You are a QA Assistant. If you navigate/act, take a screenshot."
-        }]
+        }])
 
     async def initialize(self):
-        """Starts the MCP Client connection."""
+        """Leases a browser context on a pooled server, or starts a dedicated MCP Client connection."""
         try:
+            if self.pool:
+                self.lease_ctx = self.pool.lease(profile=self.profile)
+                self.session = await self.lease_ctx.__aenter__()
+                return True
+
             self.conn_ctx = create_mcp_connection()
             read, write = await self.conn_ctx.__aenter__()
             
-            self.sess_ctx = ClientSession(read, write)
-            self.session = await self.sess_ctx.__aenter__()
+            self.sess_ctx = create_client_session(read, write)
+            client_session = await self.sess_ctx.__aenter__()
             
-            await self.session.initialize()
+            await client_session.initialize()
+            # Default context, but launch_browser still gets the profile options
+            self.session = ContextSession(client_session, profile=self.profile)
             return True
         except Exception as e:
             print(f"Connection Failed: {e}")
@@ -30,6 +45,11 @@ class AgentEngine:
 
     async def shutdown(self):
         """Clean up resources."""
+        if self.lease_ctx:
+            # Closes our browser context; the server stays up for other agents
+            await self.lease_ctx.__aexit__(None, None, None)
+            self.lease_ctx = None
+            return
         if self.sess_ctx: await self.sess_ctx.__aexit__(None, None, None)
         if self.conn_ctx: await self.conn_ctx.__aexit__(None, None, None)
 
@@ -37,17 +57,13 @@ class AgentEngine:
         """
         Runs the AI Loop and YIELDS events to the API Server.
         """
-        # Set the model dynamically based on UI selection
-        set_active_model(provider, model)
+        # Per-message model config based on UI selection (no global state)
+        config = ModelConfig(provider, model)
 
-        self.history.append({"role": "user", "content": user_input})
+        self.memory.add({"role": "user", "content": user_input}, current=True)
         
-        # Fetch available tools
-        tools = await self.session.list_tools()
-        tools_schema = []
-        for t in tools.tools:
-            schema = getattr(t, 'inputSchema', getattr(t, 'input_schema', {}))
-            tools_schema.append({"name": t.name, "description": t.description, "inputSchema": schema})
+        # Available tools (cached per session, refreshed on tools/list_changed)
+        tools_schema = await get_tools_schema(self.session)
 
         # Loop (Prevent infinite loops with range)
         for _ in range(5):
@@ -55,14 +71,29 @@ class AgentEngine:
                 # 1. Yield Thinking Status
                 yield {"type": "log", "content": f"🧠 Thinking ({provider})..."}
                 
-                # 2. Get AI Response
-                raw_response = get_ai_response(self.history, tools_schema)
-                intent = parse_ai_response(raw_response)
+                # 2. Stream AI Response (text deltas go straight to the UI)
+                messages = self.memory.window(config.model_name)
+                saved = self.memory.last_stats["saved_tokens"]
+                if saved:
+                    yield {"type": "log", "content": f"🧹 Context: {self.memory.last_stats['sent_tokens']} tokens sent ({saved} saved)"}
+
+                intent = None
+                async with aclosing(stream_ai_response_async(messages, tools_schema, config=config)) as events:
+                    async for event in events:
+                        if event["type"] == "delta":
+                            yield {"type": "delta", "content": event["content"]}
+                        else:
+                            # Complete text or tool call: stop reading, act on it now
+                            intent = event
+                            break
+
+                if intent is None:
+                    intent = {"type": "text", "content": ""}
 
                 # 3. Handle Text (Stop)
                 if intent["type"] == "text":
                     response_text = intent["content"]
-                    self.history.append({"role": "model", "content": response_text})
+                    self.memory.add({"role": "model", "content": response_text})
                     yield {"type": "response", "content": response_text}
                     break 
 
@@ -76,22 +107,16 @@ class AgentEngine:
                     # Execute on Server
                     result = await self.session.call_tool(t_name, arguments=t_args)
                     
-                    # Process Results (Look for Images)
-                    result_text_clean = ""
-                    for content in result.content:
-                        if content.type == "text":
-                            if content.text.startswith("IMAGE_BASE64:"):
-                                base64_data = content.text.replace("IMAGE_BASE64:", "")
-                                yield {"type": "image", "content": base64_data}
-                                result_text_clean += "[Screenshot Captured]"
-                            else:
-                                result_text_clean += content.text
+                    # Process Results (screenshots travel as links + small previews)
+                    result_text_clean, images = split_tool_result(result)
+                    for image in images:
+                        yield {"type": "image", "url": image["url"], "thumbnail": image["thumbnail"]}
 
                     yield {"type": "log", "content": f"✅ Result: {result_text_clean[:100]}..."}
 
                     # Update History
-                    self.history.append({"role": "model", "content": f"Call {t_name}"})
-                    self.history.append({"role": "user", "content": f"Tool Output: {result_text_clean}"})
+                    self.memory.add({"role": "model", "content": f"Call {t_name}"})
+                    self.memory.add({"role": "user", "content": f"Tool Output: {result_text_clean}"})
                     
             except Exception as e:
                 yield {"type": "error", "content": str(e)}
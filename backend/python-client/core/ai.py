@@ -2,12 +2,17 @@ import os
 import time
 import json
 import re
+import asyncio
+import copy
+import contextvars
+from contextlib import aclosing
 from types import SimpleNamespace
 from dotenv import load_dotenv
-import google.generativeai as genai
 from google.generativeai.types import FunctionDeclaration, Tool
-from groq import Groq
-from openai import OpenAI
+from core.clients import get_gemini_model, get_groq_client, get_openai_client, tools_schema_hash
+from core.memory import count_tokens, message_text
+from core.rate_limiter import get_limiter, retry_after_from_error, EXPECTED_OUTPUT_TOKENS
+from core.circuit_breaker import get_breaker
 
 load_dotenv()
 
@@ -16,34 +21,78 @@ ENV_GEMINI_MODEL = os.getenv("GEMINI_MODEL_NAME", "models/gemini-1.5-flash")
 ENV_OPENAI_MODEL = os.getenv("OPENAI_MODEL_NAME", "gpt-4o")
 ENV_GROQ_MODEL = os.getenv("GROQ_MODEL_NAME", "llama-3.3-70b-versatile")
 ENV_PROVIDER = os.getenv("AI_PROVIDER", "gemini")
+# Tried in order after the requested model fails, e.g.
+#   AI_FALLBACK_CHAIN="gemini:models/gemini-1.5-flash,groq:llama-3.3-70b-versatile,openai:gpt-4o"
+ENV_FALLBACK_CHAIN = os.getenv("AI_FALLBACK_CHAIN", "")
+ATTEMPT_TIMEOUT_SECONDS = float(os.getenv("AI_ATTEMPT_TIMEOUT_SECONDS", "60"))
+# A fallback is preferred over waiting longer than this for a rate-limited model
+FAILOVER_MAX_WAIT_SECONDS = float(os.getenv("AI_FAILOVER_MAX_WAIT_SECONDS", "2"))
+PROVIDER_API_KEYS = {"gemini": "GOOGLE_API_KEY", "groq": "GROQ_API_KEY", "openai": "OPENAI_API_KEY"}
 
-# --- DYNAMIC CONFIGURATION STATE ---
-_CURRENT_CONFIG = {
-    "provider": ENV_PROVIDER,
-    "model_name": {
+def default_model_for(provider):
+    return {
         "gemini": ENV_GEMINI_MODEL,
         "openai": ENV_OPENAI_MODEL,
         "groq": ENV_GROQ_MODEL
-    }.get(ENV_PROVIDER, ENV_GEMINI_MODEL)
-}
+    }.get(provider, ENV_GEMINI_MODEL)
+
+class ModelConfig:
+    """
+    Which provider/model a request should use.
+    Passed explicitly through get_ai_response and its callers so concurrent
+    sessions can use different providers without touching shared state.
+    """
+    def __init__(self, provider=None, model_name=None):
+        self.provider = provider or ENV_PROVIDER
+        self.model_name = model_name or default_model_for(self.provider)
+
+    def describe(self):
+        return f"{self.provider.upper()} : {self.model_name}"
+
+    def __repr__(self):
+        return f"ModelConfig({self.provider!r}, {self.model_name!r})"
+
+# --- PROCESS DEFAULT (CLI only) ---
+# Used when a caller does not pass a config. Servers should always pass one.
+_DEFAULT_CONFIG = ModelConfig(ENV_PROVIDER)
 
 def set_active_model(provider, model_name=None):
-    global _CURRENT_CONFIG
-    _CURRENT_CONFIG["provider"] = provider
-    
-    if not model_name:
-        if provider == "gemini":
-            model_name = os.getenv("GEMINI_MODEL_NAME", "models/gemini-1.5-flash")
-        elif provider == "openai":
-            model_name = os.getenv("OPENAI_MODEL_NAME", "gpt-4o")
-        elif provider == "groq":
-            model_name = os.getenv("GROQ_MODEL_NAME", "llama-3.3-70b-versatile")
-            
-    _CURRENT_CONFIG["model_name"] = model_name
-    print(f"\n🔄 Switched AI to: {provider.upper()} ({model_name})")
+    """Changes the process-wide default config. Interactive CLI use only."""
+    global _DEFAULT_CONFIG
+    _DEFAULT_CONFIG = ModelConfig(provider, model_name)
+    print(f"\n🔄 Switched AI to: {provider.upper()} ({_DEFAULT_CONFIG.model_name})")
 
 def get_current_model_info():
-    return f"{_CURRENT_CONFIG['provider'].upper()} : {_CURRENT_CONFIG['model_name']}"
+    return _DEFAULT_CONFIG.describe()
+
+def get_default_config():
+    return _DEFAULT_CONFIG
+
+# --- FAILOVER ---
+def _parse_fallback_chain(spec):
+    chain = []
+    for entry in spec.split(","):
+        provider, _, model_name = entry.strip().partition(":")
+        if not provider:
+            continue
+        if provider not in PROVIDER_API_KEYS:
+            print(f"⚠️ Ignoring unknown provider in AI_FALLBACK_CHAIN: {provider}")
+            continue
+        chain.append(ModelConfig(provider, model_name or None))
+    return chain
+
+FALLBACK_CHAIN = _parse_fallback_chain(ENV_FALLBACK_CHAIN)
+
+def failover_chain(config):
+    """The requested model first, then the configured fallbacks that have an API key."""
+    chain = [config]
+    for fallback in FALLBACK_CHAIN:
+        if (fallback.provider, fallback.model_name) == (config.provider, config.model_name):
+            continue
+        if not os.getenv(PROVIDER_API_KEYS[fallback.provider]):
+            continue
+        chain.append(fallback)
+    return chain
 
 def clean_schema(schema):
     if isinstance(schema, dict):
@@ -57,59 +106,189 @@ def clean_schema(schema):
             clean_schema(item)
     return schema
 
-def get_ai_response(messages, tools_schema=None):
+def _is_rate_limit_error(error_str):
+    return "429" in error_str or "quota" in error_str.lower() or "ResourceExhausted" in error_str
+
+_SCHEMA_TOKENS = {}
+
+def _estimate_tokens(messages, tools_schema, model_name):
+    """Tokens to reserve with the rate limiter: prompt + tool declarations + expected answer."""
+    prompt = sum(count_tokens(message_text(m), model_name) for m in messages)
+    if tools_schema:
+        key = tools_schema_hash(tools_schema)
+        if key not in _SCHEMA_TOKENS:
+            _SCHEMA_TOKENS[key] = count_tokens(json.dumps(tools_schema), model_name)
+        prompt += _SCHEMA_TOKENS[key]
+    return prompt + EXPECTED_OUTPUT_TOKENS
+
+def _rate_limit_wait(e, attempt):
+    # Provider hint first, otherwise short exponential backoff
+    return retry_after_from_error(e) or min(2 ** attempt, 30)
+
+def _is_timeout_error(e):
+    return isinstance(e, (asyncio.TimeoutError, TimeoutError)) or "timed out" in str(e).lower() \
+        or "timeout" in type(e).__name__.lower() or "DeadlineExceeded" in type(e).__name__
+
+def _route(config, messages, tools_schema):
+    """
+    Yields (config, reserved_tokens) to try this round, in failover order.
+    Models with an open circuit are skipped (all open: fail fast); a fallback
+    is preferred over waiting on a rate-limited model. The last usable
+    candidate is always tried. Without fallbacks there is nothing to fail over
+    to: the model is always tried and the rate limiter's backoff paces the retries.
+    """
+    chain = failover_chain(config)
+    if len(chain) == 1:
+        yield config, _estimate_tokens(messages, tools_schema, config.model_name)
+        return
+    usable = [c for c in chain if get_breaker(c.provider, c.model_name).allow()]
+    if not usable:
+        raise RuntimeError(f"No AI provider available, circuit open for: {', '.join(c.describe() for c in chain)}")
+    tried = False
+    for i, candidate in enumerate(usable):
+        reserved = _estimate_tokens(messages, tools_schema, candidate.model_name)
+        is_last = i == len(usable) - 1
+        if not is_last and get_limiter(candidate.provider, candidate.model_name).estimated_wait(reserved) > FAILOVER_MAX_WAIT_SECONDS:
+            print(f"⏭️  {candidate.describe()} is rate limited, trying the next provider.")
+            continue
+        # Half-open: another call may have taken the probe since the check above
+        if not get_breaker(candidate.provider, candidate.model_name).admit():
+            continue
+        tried = True
+        yield candidate, reserved
+    if not tried:
+        raise RuntimeError(f"No AI provider available, recovering: {', '.join(c.describe() for c in usable)}")
+
+# Model that answered the last call of this thread / task (a fallback after a failover)
+_ANSWERED_BY = contextvars.ContextVar("answered_by", default=None)
+
+def answered_by():
+    return _ANSWERED_BY.get()
+
+def _attempt_succeeded(candidate, config, started, latency=None):
+    _ANSWERED_BY.set(candidate)
+    if latency is None:
+        latency = time.monotonic() - started
+    get_breaker(candidate.provider, candidate.model_name).record_success(latency)
+    if candidate is not config:
+        print(f"🔀 Answered by fallback {candidate.describe()}")
+
+def _attempt_failed(e, candidate, attempt, started):
+    """Breaker/limiter bookkeeping for a failed call. True if the error is worth another round."""
+    get_breaker(candidate.provider, candidate.model_name).record_failure()
+    error_str = str(e)
+    if _is_rate_limit_error(error_str):
+        wait_time = _rate_limit_wait(e, attempt)
+        print(f"\n⏳ Rate Limit Hit on {candidate.describe()}. Holding its requests for {wait_time:.1f}s...")
+        get_limiter(candidate.provider, candidate.model_name).penalize(wait_time)
+        return True
+    if _is_timeout_error(e):
+        print(f"\n⌛ {candidate.describe()} timed out after {time.monotonic() - started:.1f}s.")
+        return True
+    if "404" in error_str:
+        print(f"\n❌ Model '{candidate.model_name}' not found.")
+    elif candidate.provider != "groq":
+        # Groq errors are logged in _call_groq
+        print(f"❌ API Error: {e}")
+    return False
+
+def get_ai_response(messages, tools_schema=None, config=None):
     if tools_schema is None:
         tools_schema = []
+    if config is None:
+        config = _DEFAULT_CONFIG
+    if config.provider not in PROVIDER_API_KEYS:
+        raise ValueError(f"Unknown provider: {config.provider}")
 
-    active_provider = _CURRENT_CONFIG["provider"]
-    model_name = _CURRENT_CONFIG["model_name"]
+    print(f"🧠 Thinking ({config.provider} : {config.model_name})...")
+
+    max_retries = 5
+    last_error = None
 
-    print(f"🧠 Thinking ({active_provider} : {model_name})...")
+    for attempt in range(1, max_retries + 1):
+        retryable = False
+        # Requested model, then fallbacks; each waits only as long as its quota requires
+        for candidate, reserved in _route(config, messages, tools_schema):
+            get_limiter(candidate.provider, candidate.model_name).acquire(reserved)
+            started = time.monotonic()
+            try:
+                if candidate.provider == "gemini":
+                    response = _call_gemini(messages, tools_schema, candidate.model_name, reserved)
+                elif candidate.provider == "groq":
+                    response = _call_groq(messages, tools_schema, candidate.model_name, reserved)
+                else:
+                    response = _call_openai(messages, tools_schema, candidate.model_name, reserved)
+            except Exception as e:
+                last_error = e
+                retryable = _attempt_failed(e, candidate, attempt, started) or retryable
+                continue
+            _attempt_succeeded(candidate, config, started)
+            return response
+
+        if not retryable:
+            raise last_error
+        print(f"🔁 No provider available, retrying ({attempt}/{max_retries})...")
+
+    return None
+
+async def get_ai_response_async(messages, tools_schema=None, config=None):
+    """
+    Awaitable twin of get_ai_response for code running on the event loop
+    (AgentEngine, workflow nodes, FastAPI handlers). Uses the async provider
+    clients and the async side of the rate limiter, so a slow call or a 429
+    only suspends the calling session instead of the whole server.
+    """
+    if tools_schema is None:
+        tools_schema = []
+    if config is None:
+        config = _DEFAULT_CONFIG
+    if config.provider not in PROVIDER_API_KEYS:
+        raise ValueError(f"Unknown provider: {config.provider}")
+
+    print(f"🧠 Thinking ({config.provider} : {config.model_name})...")
 
     max_retries = 5
-    attempt = 0
-
-    while attempt < max_retries:
-        try:
-            if active_provider == "gemini":
-                return _call_gemini(messages, tools_schema, model_name)
-            elif active_provider == "groq":
-                return _call_groq(messages, tools_schema, model_name)
-            elif active_provider == "openai":
-                return _call_openai(messages, tools_schema, model_name)
-            
-            raise ValueError(f"Unknown provider: {active_provider}")
-
-        except Exception as e:
-            error_str = str(e)
-            if "429" in error_str or "quota" in error_str.lower() or "ResourceExhausted" in error_str:
-                attempt += 1
-                wait_time = 10 * attempt 
-                print(f"\n⏳ Rate Limit Hit. Waiting {wait_time}s before retry ({attempt}/{max_retries})...")
-                time.sleep(wait_time)
-            elif "404" in error_str:
-                print(f"\n❌ Model '{model_name}' not found.")
-                raise e
-            else:
-                # Only log non-groq errors here, Groq errors handled in _call_groq
-                if active_provider != "groq":
-                    print(f"❌ API Error: {e}")
-                raise e
+    last_error = None
+
+    for attempt in range(1, max_retries + 1):
+        retryable = False
+        for candidate, reserved in _route(config, messages, tools_schema):
+            await get_limiter(candidate.provider, candidate.model_name).acquire_async(reserved)
+            started = time.monotonic()
+            try:
+                if candidate.provider == "gemini":
+                    call = _call_gemini_async(messages, tools_schema, candidate.model_name, reserved)
+                elif candidate.provider == "groq":
+                    call = _call_groq_async(messages, tools_schema, candidate.model_name, reserved)
+                else:
+                    call = _call_openai_async(messages, tools_schema, candidate.model_name, reserved)
+                response = await asyncio.wait_for(call, ATTEMPT_TIMEOUT_SECONDS)
+            except Exception as e:
+                last_error = e
+                retryable = _attempt_failed(e, candidate, attempt, started) or retryable
+                continue
+            _attempt_succeeded(candidate, config, started)
+            return response
+
+        if not retryable:
+            raise last_error
+        print(f"🔁 No provider available, retrying ({attempt}/{max_retries})...")
 
     return None
 
-def _call_gemini(messages, tools_schema, model_name):
-    genai.configure(api_key=os.getenv("GOOGLE_API_KEY"))
+def _build_gemini_tools(tools_schema):
     tools = []
     if tools_schema:
         gemini_funcs = []
         for t in tools_schema:
             raw_schema = t.get("inputSchema", t.get("parameters", {}))
-            sanitized_schema = clean_schema(raw_schema.copy()) 
+            # Deep copy: clean_schema mutates nested dicts and the source list is shared/cached
+            sanitized_schema = clean_schema(copy.deepcopy(raw_schema))
             gemini_funcs.append(FunctionDeclaration(name=t["name"], description=t["description"], parameters=sanitized_schema))
         tools = [Tool(function_declarations=gemini_funcs)]
-    
-    model = genai.GenerativeModel(model_name=model_name, tools=tools)
+    return tools
+
+def _to_gemini_history(messages):
     gemini_history = []
     for msg in messages:
         role = "user" if msg["role"] in ["user", "system"] else "model"
@@ -125,83 +304,46 @@ def _call_gemini(messages, tools_schema, model_name):
                     if item.get("type") == "text": parts.append(item["text"])
                     elif item.get("type") == "image": parts.append({"mime_type": "image/png", "data": item["data"]})
         gemini_history.append({"role": role, "parts": parts})
+    return gemini_history
+
+def _start_gemini_chat(messages, tools_schema, model_name):
+    """Returns (chat, parts_to_send) ready for send_message / send_message_async."""
+    model = get_gemini_model(model_name, tools_schema, _build_gemini_tools)
+    gemini_history = _to_gemini_history(messages)
     
     if len(gemini_history) > 1:
         chat = model.start_chat(history=gemini_history[:-1])
-        response = chat.send_message(gemini_history[-1]["parts"])
-    else:
-        chat = model.start_chat(history=[])
-        response = chat.send_message(gemini_history[0]["parts"])
+        return chat, gemini_history[-1]["parts"]
+    chat = model.start_chat(history=[])
+    return chat, gemini_history[0]["parts"]
+
+def _record_gemini_usage(response, model_name, reserved):
+    usage = getattr(response, "usage_metadata", None)
+    get_limiter("gemini", model_name).record_usage(reserved, getattr(usage, "total_token_count", None))
     return response
 
-def _call_groq(messages, tools_schema, model_name):
-    client = Groq(api_key=os.getenv("GROQ_API_KEY"))
-    groq_tools = []
-    if tools_schema:
-        for t in tools_schema:
-            groq_tools.append({
-                "type": "function",
-                "function": {
-                    "name": t["name"],
-                    "description": t["description"],
-                    "parameters": t.get("inputSchema", t.get("parameters", {}))
-                }
-            })
+def _call_gemini(messages, tools_schema, model_name, reserved=0):
+    chat, parts = _start_gemini_chat(messages, tools_schema, model_name)
+    response = chat.send_message(parts, request_options={"timeout": ATTEMPT_TIMEOUT_SECONDS})
+    return _record_gemini_usage(response, model_name, reserved)
 
-    groq_messages = []
-    for m in messages:
-        role = m["role"]
-        if role == "model": role = "assistant"
-        content = ""
-        if "content" in m:
-            if isinstance(m["content"], str): content = m["content"]
-            elif isinstance(m["content"], list): content = " ".join([x["text"] for x in m["content"] if x.get("type") == "text"])
-        elif "parts" in m:
-            content = " ".join([p for p in m["parts"] if isinstance(p, str)])
-        groq_messages.append({"role": role, "content": content})
+async def _call_gemini_async(messages, tools_schema, model_name, reserved=0):
+    chat, parts = _start_gemini_chat(messages, tools_schema, model_name)
+    return _record_gemini_usage(await chat.send_message_async(parts), model_name, reserved)
 
-    try:
-        response = client.chat.completions.create(
-            model=model_name,
-            messages=groq_messages,
-            tools=groq_tools if groq_tools else None,
-            tool_choice="auto" if groq_tools else None
-        )
-        return response.choices[0].message
+# Provider tool payloads keyed by schema hash (Gemini's live in its cached model)
+_OPENAI_TOOLS_CACHE = {}
 
-    except Exception as e:
-        error_str = str(e)
-        # --- GROQ ERROR AUTO-FIX v3 (ROBUST) ---
-        if "tool_use_failed" in error_str or "failed_generation" in error_str:
-            print("   ⚠️ Groq raw tool output detected. Attempting auto-fix...")
-            
-            # Regex: <function=NAME ... {JSON} ... </function>
-            # Matches optional parens ( ) around JSON, allows loose spacing
-            match = re.search(r"<function=(\w+)[^\}\{]*(\{.*?\})[^\}\{]*</function>", error_str, re.DOTALL)
-            
-            if match:
-                func_name = match.group(1)
-                func_args_str = match.group(2)
-                try:
-                    json.loads(func_args_str) # Validate
-                    print(f"   ✅ Auto-fixed tool call: {func_name}")
-                    return SimpleNamespace(
-                        role="assistant",
-                        content=None,
-                        tool_calls=[SimpleNamespace(
-                            id="call_autofix_" + str(int(time.time())),
-                            type="function",
-                            function=SimpleNamespace(name=func_name, arguments=func_args_str)
-                        )]
-                    )
-                except:
-                    print("   ❌ Auto-fix failed: Invalid JSON.")
-            else:
-                print("   ❌ Auto-fix failed: Regex did not match.")
-        raise e
+def _to_openai_tools(tools_schema):
+    """Groq and OpenAI share the same function-calling payload."""
+    if not tools_schema:
+        return []
+    key = tools_schema_hash(tools_schema)
+    if key not in _OPENAI_TOOLS_CACHE:
+        _OPENAI_TOOLS_CACHE[key] = _build_openai_tools(tools_schema)
+    return _OPENAI_TOOLS_CACHE[key]
 
-def _call_openai(messages, tools_schema, model_name):
-    client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+def _build_openai_tools(tools_schema):
     openai_tools = []
     for t in tools_schema:
         openai_tools.append({
@@ -212,24 +354,359 @@ def _call_openai(messages, tools_schema, model_name):
                 "parameters": t.get("inputSchema", t.get("parameters", {}))
             }
         })
-    openai_messages = []
+    return openai_tools
+
+def _to_chat_messages(messages):
+    chat_messages = []
     for m in messages:
         role = m["role"]
         if role == "model": role = "assistant"
         content = ""
         if "content" in m:
-            content = m["content"]
-            if isinstance(content, list): content = " ".join([x["text"] for x in content if x.get("type") == "text"])
-        elif "parts" in m: content = " ".join([p for p in m["parts"] if isinstance(p, str)])
-        openai_messages.append({"role": role, "content": content})
+            if isinstance(m["content"], str): content = m["content"]
+            elif isinstance(m["content"], list): content = " ".join([x["text"] for x in m["content"] if x.get("type") == "text"])
+        elif "parts" in m:
+            content = " ".join([p for p in m["parts"] if isinstance(p, str)])
+        chat_messages.append({"role": role, "content": content})
+    return chat_messages
+
+def _recover_groq_tool_call(e):
+    """
+    Groq sometimes rejects its own tool call and puts the raw
+    <function=...> text in the error. Rebuild the tool call from it,
+    or return None if it cannot be salvaged.
+    """
+    error_str = str(e)
+    # --- GROQ ERROR AUTO-FIX v3 (ROBUST) ---
+    if "tool_use_failed" in error_str or "failed_generation" in error_str:
+        print("   ⚠️ Groq raw tool output detected. Attempting auto-fix...")
+        
+        # Regex: <function=NAME ... {JSON} ... </function>
+        # Matches optional parens ( ) around JSON, allows loose spacing
+        match = re.search(r"<function=(\w+)[^\}\{]*(\{.*?\})[^\}\{]*</function>", error_str, re.DOTALL)
+        
+        if match:
+            func_name = match.group(1)
+            func_args_str = match.group(2)
+            try:
+                json.loads(func_args_str) # Validate
+                print(f"   ✅ Auto-fixed tool call: {func_name}")
+                return SimpleNamespace(
+                    role="assistant",
+                    content=None,
+                    tool_calls=[SimpleNamespace(
+                        id="call_autofix_" + str(int(time.time())),
+                        type="function",
+                        function=SimpleNamespace(name=func_name, arguments=func_args_str)
+                    )]
+                )
+            except:
+                print("   ❌ Auto-fix failed: Invalid JSON.")
+        else:
+            print("   ❌ Auto-fix failed: Regex did not match.")
+    return None
+
+def _finish_chat_completion(provider, model_name, raw, reserved):
+    """Feeds rate-limit headers and real usage to the limiter, returns the message."""
+    limiter = get_limiter(provider, model_name)
+    limiter.update_from_headers(raw.headers)
+    response = raw.parse()
+    usage = getattr(response, "usage", None)
+    limiter.record_usage(reserved, getattr(usage, "total_tokens", None))
+    return response.choices[0].message
 
-    response = client.chat.completions.create(
+def _call_groq(messages, tools_schema, model_name, reserved=0):
+    client = get_groq_client(model_name)
+    groq_tools = _to_openai_tools(tools_schema)
+
+    try:
+        raw = client.chat.completions.with_raw_response.create(
+            model=model_name,
+            messages=_to_chat_messages(messages),
+            tools=groq_tools if groq_tools else None,
+            tool_choice="auto" if groq_tools else None,
+            timeout=ATTEMPT_TIMEOUT_SECONDS
+        )
+        return _finish_chat_completion("groq", model_name, raw, reserved)
+
+    except Exception as e:
+        recovered = _recover_groq_tool_call(e)
+        if recovered: return recovered
+        raise e
+
+async def _call_groq_async(messages, tools_schema, model_name, reserved=0):
+    client = get_groq_client(model_name, is_async=True)
+    groq_tools = _to_openai_tools(tools_schema)
+
+    try:
+        raw = await client.chat.completions.with_raw_response.create(
+            model=model_name,
+            messages=_to_chat_messages(messages),
+            tools=groq_tools if groq_tools else None,
+            tool_choice="auto" if groq_tools else None,
+            timeout=ATTEMPT_TIMEOUT_SECONDS
+        )
+        return _finish_chat_completion("groq", model_name, raw, reserved)
+
+    except Exception as e:
+        recovered = _recover_groq_tool_call(e)
+        if recovered: return recovered
+        raise e
+
+def _call_openai(messages, tools_schema, model_name, reserved=0):
+    client = get_openai_client(model_name)
+    openai_tools = _to_openai_tools(tools_schema)
+
+    raw = client.chat.completions.with_raw_response.create(
         model=model_name,
-        messages=openai_messages,
+        messages=_to_chat_messages(messages),
         tools=openai_tools if openai_tools else None,
-        tool_choice="auto" if openai_tools else None
+        tool_choice="auto" if openai_tools else None,
+        timeout=ATTEMPT_TIMEOUT_SECONDS
     )
-    return response.choices[0].message
+    return _finish_chat_completion("openai", model_name, raw, reserved)
+
+async def _call_openai_async(messages, tools_schema, model_name, reserved=0):
+    client = get_openai_client(model_name, is_async=True)
+    openai_tools = _to_openai_tools(tools_schema)
+
+    raw = await client.chat.completions.with_raw_response.create(
+        model=model_name,
+        messages=_to_chat_messages(messages),
+        tools=openai_tools if openai_tools else None,
+        tool_choice="auto" if openai_tools else None,
+        timeout=ATTEMPT_TIMEOUT_SECONDS
+    )
+    return _finish_chat_completion("openai", model_name, raw, reserved)
+
+# --- STREAMING ---
+
+async def stream_ai_response_async(messages, tools_schema=None, config=None):
+    """
+    Streaming variant of get_ai_response_async. Async generator yielding:
+      {"type": "delta", "content": "..."}                      text as it arrives
+      {"type": "tool_call", "tool_name", "tool_args", "raw"}   as soon as a call is complete
+      {"type": "text", "content": full_text, "raw": None}      once, when a text answer ends
+    Intents have the same shape as parse_ai_response output. Callers that act on
+    a tool call should stop iterating (use contextlib.aclosing) to drop the stream.
+    """
+    if tools_schema is None:
+        tools_schema = []
+    if config is None:
+        config = _DEFAULT_CONFIG
+    if config.provider not in PROVIDER_API_KEYS:
+        raise ValueError(f"Unknown provider: {config.provider}")
+
+    print(f"🧠 Thinking ({config.provider} : {config.model_name}, streaming)...")
+
+    max_retries = 5
+    last_error = None
+
+    for attempt in range(1, max_retries + 1):
+        retryable = False
+        for candidate, reserved in _route(config, messages, tools_schema):
+            if candidate.provider == "gemini":
+                stream_fn = _stream_gemini
+            elif candidate.provider == "groq":
+                stream_fn = _stream_groq
+            else:
+                stream_fn = _stream_openai
+
+            limiter = get_limiter(candidate.provider, candidate.model_name)
+            await limiter.acquire_async(reserved)
+            started = time.monotonic()
+            first_latency = None    # set once something reached the caller
+            usage = {}              # filled by stream_fn from the final chunk
+            try:
+                async with aclosing(stream_fn(messages, tools_schema, candidate.model_name, usage)) as events:
+                    while True:
+                        # Every chunk is bounded: a stream that stalls midway is a timeout too
+                        try:
+                            event = await asyncio.wait_for(events.__anext__(), ATTEMPT_TIMEOUT_SECONDS)
+                        except StopAsyncIteration:
+                            break
+                        if first_latency is None:
+                            first_latency = time.monotonic() - started
+                        yield event
+            except GeneratorExit:
+                # The caller got what it needed (e.g. a tool call) and dropped the stream
+                _attempt_succeeded(candidate, config, started, first_latency)
+                raise
+            except Exception as e:
+                retryable = _attempt_failed(e, candidate, attempt, started) or retryable
+                # Once something reached the caller we cannot switch provider
+                if first_latency is not None:
+                    raise e
+                last_error = e
+                continue
+            finally:
+                # Unknown when the stream was dropped before its last chunk: the estimate stands
+                limiter.record_usage(reserved, usage.get("total_tokens"))
+            _attempt_succeeded(candidate, config, started, first_latency)
+            return
+
+        if not retryable:
+            raise last_error
+        print(f"🔁 No provider available, retrying ({attempt}/{max_retries})...")
+
+def _try_parse_args(arguments):
+    """Tool-call arguments are complete once they parse as a JSON object."""
+    if not arguments:
+        return None
+    try:
+        args = json.loads(arguments)
+    except ValueError:
+        return None
+    return args if isinstance(args, dict) else None
+
+async def _stream_chat_completions(client, messages, tools_schema, model_name, usage, **options):
+    """
+    Shared OpenAI/Groq streaming loop, assembling tool-call fragments by index.
+    Token usage of the final chunk goes to usage["total_tokens"].
+    """
+    openai_tools = _to_openai_tools(tools_schema)
+    stream = await client.chat.completions.create(
+        model=model_name,
+        messages=_to_chat_messages(messages),
+        tools=openai_tools if openai_tools else None,
+        tool_choice="auto" if openai_tools else None,
+        stream=True,
+        **options
+    )
+
+    text = ""
+    calls = {}      # index -> {"id", "name", "arguments"}
+    emitted = set()
+
+    def _tool_event(index):
+        call = calls[index]
+        emitted.add(index)
+        return {
+            "type": "tool_call",
+            "tool_name": call["name"],
+            "tool_args": _try_parse_args(call["arguments"]) or {},
+            "raw": SimpleNamespace(
+                role="assistant",
+                content=None,
+                tool_calls=[SimpleNamespace(
+                    id=call["id"],
+                    type="function",
+                    function=SimpleNamespace(name=call["name"], arguments=call["arguments"])
+                )]
+            )
+        }
+
+    try:
+        async for chunk in stream:
+            # OpenAI sends usage in a last chunk without choices, Groq in x_groq of the final one
+            chunk_usage = getattr(chunk, "usage", None) or getattr(getattr(chunk, "x_groq", None), "usage", None)
+            if chunk_usage is not None:
+                usage["total_tokens"] = getattr(chunk_usage, "total_tokens", None)
+            if not chunk.choices:
+                continue
+            choice = chunk.choices[0]
+            delta = choice.delta
+
+            if delta and delta.content:
+                text += delta.content
+                yield {"type": "delta", "content": delta.content}
+
+            for tc in (delta.tool_calls if delta and delta.tool_calls else []):
+                call = calls.setdefault(tc.index, {"id": None, "name": "", "arguments": ""})
+                if tc.id: call["id"] = tc.id
+                if tc.function and tc.function.name: call["name"] += tc.function.name
+                if tc.function and tc.function.arguments: call["arguments"] += tc.function.arguments
+                # Hand the call over the moment its arguments form a full JSON object
+                if tc.index not in emitted and call["name"] and _try_parse_args(call["arguments"]) is not None:
+                    yield _tool_event(tc.index)
+
+            if choice.finish_reason:
+                for index in sorted(calls):
+                    if index not in emitted and calls[index]["name"]:
+                        yield _tool_event(index)
+    finally:
+        # Release the HTTP connection even if the caller stopped early
+        await stream.close()
+
+    if not calls:
+        yield {"type": "text", "content": text, "raw": None}
+
+async def _stream_openai(messages, tools_schema, model_name, usage):
+    client = get_openai_client(model_name, is_async=True)
+    stream = _stream_chat_completions(client, messages, tools_schema, model_name, usage,
+                                      stream_options={"include_usage": True})
+    async with aclosing(stream) as events:
+        async for event in events:
+            yield event
+
+async def _stream_groq(messages, tools_schema, model_name, usage):
+    client = get_groq_client(model_name, is_async=True)
+    try:
+        async with aclosing(_stream_chat_completions(client, messages, tools_schema, model_name, usage)) as events:
+            async for event in events:
+                yield event
+    except Exception as e:
+        recovered = _recover_groq_tool_call(e)
+        if not recovered: raise e
+        call = recovered.tool_calls[0]
+        yield {
+            "type": "tool_call",
+            "tool_name": call.function.name,
+            "tool_args": json.loads(call.function.arguments),
+            "raw": recovered
+        }
+
+async def _stream_gemini(messages, tools_schema, model_name, usage):
+    chat, parts = _start_gemini_chat(messages, tools_schema, model_name)
+    response = await chat.send_message_async(parts, stream=True)
+
+    text = ""
+    async for chunk in response:
+        # Running totals, the last chunk has the full count
+        total = getattr(getattr(chunk, "usage_metadata", None), "total_token_count", None)
+        if total:
+            usage["total_tokens"] = total
+        if not chunk.candidates:
+            continue
+        for part in chunk.candidates[0].content.parts:
+            # Gemini sends function calls as whole parts, never fragmented
+            if part.function_call:
+                yield {
+                    "type": "tool_call",
+                    "tool_name": part.function_call.name,
+                    "tool_args": dict(part.function_call.args),
+                    "raw": part
+                }
+                return
+            if part.text:
+                text += part.text
+                yield {"type": "delta", "content": part.text}
+
+    yield {"type": "text", "content": text, "raw": None}
+
+# --- HELPER: Handle different AI response formats dynamically ---
+def extract_ai_text(resp):
+    """
+    Automatically detects if response is from Gemini (has .text) 
+    or OpenAI/Claude (has .content).
+    """
+    try:
+        # Gemini
+        if hasattr(resp, 'text'):
+            return resp.text
+        
+        # OpenAI / Claude
+        if hasattr(resp, 'content'):
+            # Claude returns a list of content blocks
+            if isinstance(resp.content, list):
+                return resp.content[0].text
+            # OpenAI returns a string
+            return resp.content
+            
+    except Exception as e:
+        print(f"⚠️ Error extracting text: {e}")
+        
+    return str(resp)
 
 def parse_ai_response(response):
     try:
@@ -0,0 +1,119 @@
+import os
+import time
+import threading
+from collections import deque
+
+# --- CONFIGURATION FROM ENV ---
+BREAKER_FAILURE_RATE = float(os.getenv("AI_BREAKER_FAILURE_RATE", "0.5"))
+BREAKER_WINDOW = int(os.getenv("AI_BREAKER_WINDOW", "10"))
+BREAKER_MIN_CALLS = int(os.getenv("AI_BREAKER_MIN_CALLS", "3"))
+BREAKER_COOLDOWN_SECONDS = float(os.getenv("AI_BREAKER_COOLDOWN_SECONDS", "30"))
+# Successful calls slower than this still count against the provider
+SLOW_CALL_SECONDS = float(os.getenv("AI_SLOW_CALL_SECONDS", "20"))
+
+class CircuitBreaker:
+    """
+    Tracks the last `window` calls to one provider/model.
+
+    closed    -> open       when at least `min_calls` were seen and the share of
+                            failures (errors, timeouts, 429s, slow calls) reaches `failure_rate`
+    open      -> half_open  after `cooldown` seconds; a single probe call is let through
+    half_open -> closed     when the probe succeeds, back to open when it fails
+    """
+    def __init__(self, name, failure_rate=BREAKER_FAILURE_RATE, window=BREAKER_WINDOW,
+                 min_calls=BREAKER_MIN_CALLS, cooldown=BREAKER_COOLDOWN_SECONDS, slow_call_seconds=SLOW_CALL_SECONDS):
+        self.name = name
+        self.failure_rate = failure_rate
+        self.min_calls = min_calls
+        self.cooldown = cooldown
+        self.slow_call_seconds = slow_call_seconds
+        self.opened_at = None
+        self.half_open = False
+        self.probe_at = None    # when the half-open probe call was admitted
+        self.stats = {"successes": 0, "failures": 0, "slow": 0, "trips": 0}
+        self._results = deque(maxlen=window)    # True = ok
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        with self._lock:
+            return self._state(time.monotonic())
+
+    def _state(self, now):
+        if self.opened_at is None:
+            return "closed"
+        if self.half_open or now - self.opened_at >= self.cooldown:
+            self.half_open = True
+            return "half_open"
+        return "open"
+
+    def allow(self):
+        """False while open, or half-open with its probe still out: skip this provider."""
+        with self._lock:
+            return self._admits(time.monotonic())
+
+    def admit(self):
+        """allow() for a call about to be made. In half-open it takes the single probe slot."""
+        with self._lock:
+            now = time.monotonic()
+            if not self._admits(now):
+                return False
+            if self._state(now) == "half_open":
+                self.probe_at = now
+            return True
+
+    def _admits(self, now):
+        state = self._state(now)
+        if state == "open":
+            return False
+        # A probe that never reported back (caller cancelled) frees its slot after a cooldown
+        return state == "closed" or self.probe_at is None or now - self.probe_at >= self.cooldown
+
+    def record_success(self, latency):
+        if latency > self.slow_call_seconds:
+            with self._lock: self.stats["slow"] += 1
+            self.record_failure()
+            return
+        with self._lock:
+            self.stats["successes"] += 1
+            self._results.append(True)
+            if self.opened_at is not None:
+                print(f"✅ Circuit closed: {self.name}")
+            self.opened_at = None
+            self.half_open = False
+            self.probe_at = None
+
+    def record_failure(self):
+        with self._lock:
+            now = time.monotonic()
+            self.stats["failures"] += 1
+            self._results.append(False)
+            if self._state(now) == "half_open":
+                self._trip(now)
+                return
+            failures = self._results.count(False)
+            if self.opened_at is None and len(self._results) >= self.min_calls \
+                    and failures / len(self._results) >= self.failure_rate:
+                self._trip(now)
+
+    def _trip(self, now):
+        self.opened_at = now
+        self.half_open = False
+        self.probe_at = None
+        self._results.clear()
+        self.stats["trips"] += 1
+        print(f"⚡ Circuit open: {self.name} (retry in {self.cooldown:.0f}s)")
+
+_BREAKERS = {}
+_BREAKERS_LOCK = threading.Lock()
+
+def get_breaker(provider, model_name):
+    key = (provider, model_name)
+    with _BREAKERS_LOCK:
+        if key not in _BREAKERS:
+            _BREAKERS[key] = CircuitBreaker(f"{provider}/{model_name}")
+        return _BREAKERS[key]
+
+def breaker_stats():
+    with _BREAKERS_LOCK:
+        return {b.name: {"state": b.state, **b.stats} for b in _BREAKERS.values()}
@@ -0,0 +1,155 @@
+import os
+import json
+import asyncio
+import hashlib
+import threading
+from collections import OrderedDict
+import httpx
+import google.generativeai as genai
+from groq import Groq, AsyncGroq
+from openai import OpenAI, AsyncOpenAI
+
+# --- CONFIGURATION FROM ENV ---
+MAX_CACHED_CLIENTS = int(os.getenv("AI_CLIENT_CACHE_SIZE", "16"))
+KEEPALIVE_EXPIRY = float(os.getenv("AI_KEEPALIVE_SECONDS", "120"))
+
+# One pool per client: a handful of warm connections is plenty for chat traffic
+HTTP_LIMITS = httpx.Limits(max_connections=20, max_keepalive_connections=10, keepalive_expiry=KEEPALIVE_EXPIRY)
+
+# Tool lists come from the per-session cache and are reused every turn, so
+# remember the hash per list object (kept alive here so ids are not reused)
+_HASH_MEMO = OrderedDict()
+_HASH_MEMO_SIZE = 64
+
+def tools_schema_hash(tools_schema):
+    """Stable hash of a tools schema list, used to key per-tool-set objects."""
+    if not tools_schema:
+        return "no-tools"
+    memo = _HASH_MEMO.get(id(tools_schema))
+    if memo and memo[0] is tools_schema:
+        return memo[1]
+    raw = json.dumps(tools_schema, sort_keys=True, default=str)
+    digest = hashlib.sha256(raw.encode("utf-8")).hexdigest()[:16]
+    _HASH_MEMO[id(tools_schema)] = (tools_schema, digest)
+    while len(_HASH_MEMO) > _HASH_MEMO_SIZE:
+        _HASH_MEMO.popitem(last=False)
+    return digest
+
+class ClientRegistry:
+    """
+    Bounded LRU of provider clients / model objects.
+    Reusing a client keeps its HTTP connection pool (and TLS sessions) warm
+    across LLM turns and websocket sessions. Evicted clients are closed.
+    """
+    def __init__(self, max_size=MAX_CACHED_CLIENTS):
+        self.max_size = max_size
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, factory):
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                return self._entries[key]
+
+        # Build outside the lock, clients can be slow to construct
+        client = factory()
+
+        evicted = []
+        with self._lock:
+            if key in self._entries:
+                # Another thread won the race, keep theirs
+                evicted.append(client)
+                client = self._entries[key]
+                self._entries.move_to_end(key)
+            else:
+                self._entries[key] = client
+                while len(self._entries) > self.max_size:
+                    _, old = self._entries.popitem(last=False)
+                    evicted.append(old)
+
+        for old in evicted:
+            _close_client(old)
+        return client
+
+    def clear(self):
+        with self._lock:
+            entries = list(self._entries.values())
+            self._entries.clear()
+        for client in entries:
+            _close_client(client)
+
+    def __len__(self):
+        return len(self._entries)
+
+def _close_client(client):
+    close = getattr(client, "close", None)
+    if close is None:
+        return  # Gemini model objects hold no sockets of their own
+    try:
+        result = close()
+        if asyncio.iscoroutine(result):
+            try:
+                asyncio.get_running_loop().create_task(result)
+            except RuntimeError:
+                # Owning loop is gone, its sockets went with it
+                result.close()
+    except Exception as e:
+        print(f"⚠️ Failed to close evicted client: {e}")
+
+_REGISTRY = ClientRegistry()
+
+def _loop_key():
+    # Async clients are bound to the loop that first used them
+    try:
+        return id(asyncio.get_running_loop())
+    except RuntimeError:
+        return None
+
+# --- OPENAI / GROQ ---
+
+def get_openai_client(model_name, is_async=False):
+    api_key = os.getenv("OPENAI_API_KEY")
+    if is_async:
+        key = ("openai", api_key, model_name, "async", _loop_key())
+        return _REGISTRY.get(key, lambda: AsyncOpenAI(
+            api_key=api_key, http_client=httpx.AsyncClient(limits=HTTP_LIMITS)))
+    key = ("openai", api_key, model_name, "sync")
+    return _REGISTRY.get(key, lambda: OpenAI(
+        api_key=api_key, http_client=httpx.Client(limits=HTTP_LIMITS)))
+
+def get_groq_client(model_name, is_async=False):
+    api_key = os.getenv("GROQ_API_KEY")
+    if is_async:
+        key = ("groq", api_key, model_name, "async", _loop_key())
+        return _REGISTRY.get(key, lambda: AsyncGroq(
+            api_key=api_key, http_client=httpx.AsyncClient(limits=HTTP_LIMITS)))
+    key = ("groq", api_key, model_name, "sync")
+    return _REGISTRY.get(key, lambda: Groq(
+        api_key=api_key, http_client=httpx.Client(limits=HTTP_LIMITS)))
+
+# --- GEMINI ---
+
+_gemini_lock = threading.Lock()
+_gemini_configured_key = None
+
+def _configure_gemini(api_key):
+    """genai.configure is process-global, only redo it when the key changes."""
+    global _gemini_configured_key
+    with _gemini_lock:
+        if _gemini_configured_key != api_key:
+            genai.configure(api_key=api_key)
+            _gemini_configured_key = api_key
+
+def get_gemini_model(model_name, tools_schema, build_tools):
+    """
+    Returns a cached GenerativeModel for (key, model, tool set).
+    build_tools(tools_schema) is only called on a cache miss.
+    """
+    api_key = os.getenv("GOOGLE_API_KEY")
+    _configure_gemini(api_key)
+    key = ("gemini", api_key, model_name, tools_schema_hash(tools_schema))
+    return _REGISTRY.get(key, lambda: genai.GenerativeModel(model_name=model_name, tools=build_tools(tools_schema)))
+
+def clear_client_cache():
+    _REGISTRY.clear()
@@ -0,0 +1,58 @@
+import os
+
+# --- CONFIGURATION FROM ENV ---
+# Default profile for agent runs: "headed" (visible window), "headless" or "fast"
+DEFAULT_PROFILE_NAME = os.getenv("EXECUTION_PROFILE", "headed")
+
+class ExecutionProfile:
+    """
+    How the browser runs for an agent/workflow session.
+    Sent to the Playwright server with launch_browser/create_context/reset_session,
+    so every browser context gets its own settings.
+    """
+    def __init__(self, name, headless=False, block_resources=None, disable_animations=False,
+                 timeout_ms=None, navigation_timeout_ms=None):
+        self.name = name
+        self.headless = headless
+        self.block_resources = list(block_resources or [])   # Playwright resource types, e.g. "image"
+        self.disable_animations = disable_animations
+        self.timeout_ms = timeout_ms
+        self.navigation_timeout_ms = navigation_timeout_ms
+
+    def tool_args(self):
+        """Arguments for the server's context-setup tools."""
+        args = {"headless": self.headless}
+        if self.block_resources: args["block_resources"] = self.block_resources
+        if self.disable_animations: args["disable_animations"] = True
+        if self.timeout_ms: args["timeout_ms"] = self.timeout_ms
+        if self.navigation_timeout_ms: args["navigation_timeout_ms"] = self.navigation_timeout_ms
+        return args
+
+    def __repr__(self):
+        return f"ExecutionProfile({self.name!r}, headless={self.headless})"
+
+PROFILES = {
+    # Visible window, Playwright defaults (local debugging)
+    "headed": ExecutionProfile("headed"),
+    # Same behaviour, no display needed
+    "headless": ExecutionProfile("headless", headless=True),
+    # Build boxes: headless, no images/fonts/media, no animations, fail fast
+    "fast": ExecutionProfile(
+        "fast",
+        headless=True,
+        block_resources=["image", "font", "media"],
+        disable_animations=True,
+        timeout_ms=int(os.getenv("FAST_PROFILE_TIMEOUT_MS", "5000")),
+        navigation_timeout_ms=int(os.getenv("FAST_PROFILE_NAV_TIMEOUT_MS", "15000")),
+    ),
+}
+
+def get_profile(profile=None):
+    """Accepts a profile, a profile name or None (env default)."""
+    if isinstance(profile, ExecutionProfile):
+        return profile
+    name = profile or DEFAULT_PROFILE_NAME
+    if name not in PROFILES:
+        print(f"⚠️ Unknown execution profile '{name}', using 'headed'.")
+        name = "headed"
+    return PROFILES[name]
@@ -0,0 +1,202 @@
+import os
+import json
+import time
+import sqlite3
+import asyncio
+import hashlib
+import threading
+from core.ai import get_ai_response, get_ai_response_async, extract_ai_text, get_default_config, answered_by
+from core.memory import message_text
+
+# --- CONFIGURATION FROM ENV ---
+_CLIENT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CACHE_PATH = os.getenv("AI_CACHE_PATH", os.path.join(_CLIENT_ROOT, ".ai_cache", "responses.sqlite3"))
+CACHE_TTL_SECONDS = int(os.getenv("AI_CACHE_TTL_SECONDS", str(7 * 24 * 3600)))
+CACHE_MAX_ENTRIES = int(os.getenv("AI_CACHE_MAX_ENTRIES", "2000"))
+CACHE_DISABLED = os.getenv("AI_CACHE_DISABLED", "0") == "1"
+
+def cache_key(config, messages):
+    """(provider, model, normalized prompt) -> hex key. Whitespace-only differences hit the same entry."""
+    normalized = [[m.get("role"), " ".join(message_text(m).split())] for m in messages]
+    raw = json.dumps([config.provider, config.model_name, normalized], ensure_ascii=False)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+# Result handed to async waiters when the call they joined was cancelled
+_ABANDONED = object()
+
+class ResponseCache:
+    """
+    On-disk (SQLite) cache of LLM text responses with TTL and LRU size limits.
+    Concurrent identical requests are coalesced: one caller computes, the rest wait for it.
+    compute returns (text, cacheable); answers from a fallback model are not cacheable
+    under the requested model's key.
+    """
+    def __init__(self, path=CACHE_PATH, ttl=CACHE_TTL_SECONDS, max_entries=CACHE_MAX_ENTRIES):
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.stats = {"hits": 0, "misses": 0, "coalesced": 0, "bypassed": 0, "evicted": 0, "uncacheable": 0}
+        self._lock = threading.Lock()
+        self._conn = None
+        self._inflight = {}         # key -> threading.Event (sync callers)
+        self._inflight_async = {}   # (loop id, key) -> asyncio.Future
+
+    def _db(self):
+        if self._conn is None:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                " key TEXT PRIMARY KEY, provider TEXT, model TEXT, text TEXT,"
+                " created_at REAL, last_access REAL)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_last_access ON responses(last_access)")
+        return self._conn
+
+    def get(self, key):
+        now = time.time()
+        with self._lock:
+            db = self._db()
+            row = db.execute("SELECT text, created_at FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            if now - row[1] > self.ttl:
+                db.execute("DELETE FROM responses WHERE key = ?", (key,))
+                db.commit()
+                return None
+            db.execute("UPDATE responses SET last_access = ? WHERE key = ?", (now, key))
+            db.commit()
+            return row[0]
+
+    def put(self, key, config, text):
+        now = time.time()
+        with self._lock:
+            db = self._db()
+            db.execute(
+                "INSERT OR REPLACE INTO responses (key, provider, model, text, created_at, last_access) VALUES (?, ?, ?, ?, ?, ?)",
+                (key, config.provider, config.model_name, text, now, now)
+            )
+            # Expired first, then least recently used beyond the size limit
+            cur = db.execute("DELETE FROM responses WHERE created_at < ?", (now - self.ttl,))
+            evicted = cur.rowcount
+            cur = db.execute(
+                "DELETE FROM responses WHERE key IN ("
+                " SELECT key FROM responses ORDER BY last_access DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,)
+            )
+            evicted += cur.rowcount
+            db.commit()
+            self.stats["evicted"] += max(evicted, 0)
+
+    def clear(self):
+        with self._lock:
+            self._db().execute("DELETE FROM responses")
+            self._db().commit()
+
+    def _store(self, key, config, text, cacheable):
+        if not text:
+            return
+        if cacheable:
+            self.put(key, config, text)
+        else:
+            self.stats["uncacheable"] += 1
+
+    def get_or_compute(self, key, config, compute, bypass=False):
+        if bypass or CACHE_DISABLED:
+            self.stats["bypassed"] += 1
+            return compute()[0]
+
+        while True:
+            cached = self.get(key)
+            if cached is not None:
+                self.stats["hits"] += 1
+                return cached
+            with self._lock:
+                waiter = self._inflight.get(key)
+                if waiter is None:
+                    self._inflight[key] = threading.Event()
+                    break
+            # Someone else is already asking the same thing
+            self.stats["coalesced"] += 1
+            waiter.wait()
+
+        self.stats["misses"] += 1
+        try:
+            text, cacheable = compute()
+            self._store(key, config, text, cacheable)
+            return text
+        finally:
+            with self._lock:
+                self._inflight.pop(key).set()
+
+    async def get_or_compute_async(self, key, config, compute, bypass=False):
+        if bypass or CACHE_DISABLED:
+            self.stats["bypassed"] += 1
+            return (await compute())[0]
+
+        flight_key = (id(asyncio.get_running_loop()), key)
+        while True:
+            # SQLite I/O runs in a worker thread so it never stalls the event loop
+            cached = await asyncio.to_thread(self.get, key)
+            if cached is not None:
+                self.stats["hits"] += 1
+                return cached
+            pending = self._inflight_async.get(flight_key)
+            if pending is None:
+                break
+            self.stats["coalesced"] += 1
+            result = await asyncio.shield(pending)
+            if result is not _ABANDONED:
+                return result
+            # The caller computing it was cancelled, not us: ask again (maybe as the new owner)
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight_async[flight_key] = future
+        self.stats["misses"] += 1
+        try:
+            text, cacheable = await compute()
+            await asyncio.to_thread(self._store, key, config, text, cacheable)
+            future.set_result(text)
+            return text
+        except asyncio.CancelledError:
+            # Cancelling the future would cancel every waiter with it
+            future.set_result(_ABANDONED)
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            future.exception()  # Mark retrieved, waiters still get it
+            raise
+        finally:
+            self._inflight_async.pop(flight_key, None)
+
+_CACHE = ResponseCache()
+
+def _response_text(resp, config):
+    """(text, cacheable) for the cache. A fallback's answer would stay stored under the
+    requested model's key after that model recovers, so only its own answers are kept."""
+    # get_ai_response returns None when retries ran out: nothing to cache
+    if resp is None:
+        return None, False
+    responder = answered_by()
+    cacheable = responder is None or (responder.provider, responder.model_name) == (config.provider, config.model_name)
+    return extract_ai_text(resp), cacheable
+
+def get_cache():
+    return _CACHE
+
+def get_ai_text(messages, config=None, bypass_cache=False):
+    """Text answer for a tool-less prompt, served from the response cache when possible."""
+    config = config or get_default_config()
+    key = cache_key(config, messages)
+    return _CACHE.get_or_compute(
+        key, config, lambda: _response_text(get_ai_response(messages, config=config), config), bypass=bypass_cache
+    )
+
+async def get_ai_text_async(messages, config=None, bypass_cache=False):
+    config = config or get_default_config()
+    key = cache_key(config, messages)
+
+    async def compute():
+        return _response_text(await get_ai_response_async(messages, config=config), config)
+
+    return await _CACHE.get_or_compute_async(key, config, compute, bypass=bypass_cache)
@@ -1,6 +1,8 @@
 import os
 import sys
-from mcp import StdioServerParameters
+import asyncio
+import weakref
+from mcp import ClientSession, StdioServerParameters, types
 from mcp.client.stdio import stdio_client
 
 def get_server_params():
@@ -45,4 +47,95 @@ def create_mcp_connection():
                 ...
     """
     params = get_server_params()
-    return stdio_client(params)
\ No newline at end of file
+    return stdio_client(params)
+
+# Context plumbing is handled by ContextSession, never by the model
+CONTEXT_ADMIN_TOOLS = {"create_context", "close_context"}
+# Tools that (re)build a browser context and take the execution profile options
+CONTEXT_SETUP_TOOLS = {"launch_browser", "create_context", "reset_session"}
+HIDDEN_TOOL_ARGS = {"context_id", "headless", "block_resources", "disable_animations", "timeout_ms", "navigation_timeout_ms"}
+DEFAULT_CONTEXT_ID = "default"
+
+class ContextSession:
+    """
+    One isolated browser context on a shared server session.
+    Behaves like a ClientSession for tool calls; context_id is added to every call,
+    and the ExecutionProfile options to calls that set a context up.
+    """
+    def __init__(self, session, context_id=DEFAULT_CONTEXT_ID, profile=None):
+        self.session = session
+        self.context_id = context_id
+        self.profile = profile
+
+    async def call_tool(self, name, arguments=None):
+        arguments = dict(arguments or {})
+        if name in CONTEXT_SETUP_TOOLS and self.profile:
+            arguments.update(self.profile.tool_args())
+        arguments["context_id"] = self.context_id
+        return await self.session.call_tool(name, arguments=arguments)
+
+    async def list_tools(self):
+        return await self.session.list_tools()
+
+def _llm_tool_schema(schema):
+    # context_id and profile options are injected by ContextSession, the model does not pick them
+    if not isinstance(schema, dict) or not HIDDEN_TOOL_ARGS & set(schema.get("properties") or {}):
+        return schema
+    properties = {k: v for k, v in schema["properties"].items() if k not in HIDDEN_TOOL_ARGS}
+    return {**schema, "properties": properties}
+
+class ToolSchemaCache:
+    """
+    Caches one session's tool list in the provider-neutral format
+    ({name, description, inputSchema}). Only cleared when the server sends
+    notifications/tools/list_changed.
+    """
+    def __init__(self):
+        self.tools_schema = None
+        self._lock = asyncio.Lock()
+
+    async def handle_message(self, message):
+        # ClientSession message_handler: sees every server notification
+        if isinstance(message, types.ServerNotification) and isinstance(message.root, types.ToolListChangedNotification):
+            print("🔄 Server tool list changed, refreshing on next turn.")
+            self.tools_schema = None
+
+    async def get(self, session):
+        if self.tools_schema is not None:
+            return self.tools_schema
+        async with self._lock:
+            if self.tools_schema is None:
+                tools = await session.list_tools()
+                tools_schema = []
+                for t in tools.tools:
+                    if t.name in CONTEXT_ADMIN_TOOLS:
+                        continue
+                    # Handle PyDantic vs Dictionary schema structure
+                    schema = getattr(t, 'inputSchema', getattr(t, 'input_schema', {}))
+                    tools_schema.append({"name": t.name, "description": t.description, "inputSchema": _llm_tool_schema(schema)})
+                self.tools_schema = tools_schema
+        return self.tools_schema
+
+_TOOL_CACHES = weakref.WeakKeyDictionary()
+
+def create_client_session(read, write):
+    """
+    ClientSession wired to a ToolSchemaCache, so list_changed notifications
+    invalidate the cached tool list. Use as:
+        async with create_client_session(read, write) as session: ...
+    """
+    cache = ToolSchemaCache()
+    session = ClientSession(read, write, message_handler=cache.handle_message)
+    _TOOL_CACHES[session] = cache
+    return session
+
+async def get_tools_schema(session):
+    """Cached tool list for a session (one list_tools round trip per session)."""
+    if isinstance(session, ContextSession):
+        # All contexts of a server share its tool list
+        session = session.session
+    cache = _TOOL_CACHES.get(session)
+    if cache is None:
+        # Session was not created by create_client_session: cache without invalidation
+        cache = _TOOL_CACHES.setdefault(session, ToolSchemaCache())
+    return await cache.get(session)
@@ -0,0 +1,236 @@
+import os
+import uuid
+import asyncio
+from contextlib import asynccontextmanager
+from core.mcp_client import create_mcp_connection, create_client_session, get_tools_schema, ContextSession
+from core.execution_profile import get_profile
+
+# Number of warm (initialized + browser launched) servers kept ready
+POOL_SIZE = int(os.getenv("MCP_POOL_SIZE", "2"))
+# Isolated browser contexts (= concurrent leases) hosted by one server
+CONTEXTS_PER_SERVER = int(os.getenv("MCP_CONTEXTS_PER_SERVER", "8"))
+
+class PooledSession:
+    """
+    One Playwright MCP server process with a launched browser.
+    The stdio transport must be entered and exited from the same task,
+    so each member lives inside its own owner task until closed.
+    """
+    def __init__(self, profile=None):
+        self.profile = get_profile(profile)
+        self.session = None
+        self.error = None
+        self.leases = 0         # Open browser contexts handed out
+        self.retiring = False
+        self._ready = asyncio.Event()
+        self._closing = asyncio.Event()
+        self._task = None
+
+    async def start(self):
+        self._task = asyncio.create_task(self._run())
+        await self._ready.wait()
+        if self.error:
+            raise self.error
+
+    async def _run(self):
+        try:
+            async with create_mcp_connection() as (read, write):
+                async with create_client_session(read, write) as session:
+                    await session.initialize()
+                    result = await session.call_tool("launch_browser", arguments=self.profile.tool_args())
+                    if result.isError:
+                        # Not ready: the pool must not hand out a server without a browser
+                        raise RuntimeError(f"launch_browser failed: {result.content[0].text if result.content else ''}")
+                    # Prime the tool cache so the first lease skips list_tools
+                    await get_tools_schema(session)
+                    self.session = session
+                    self._ready.set()
+                    await self._closing.wait()
+        except Exception as e:
+            self.error = e
+        finally:
+            self.session = None
+            self._ready.set()
+
+    @property
+    def alive(self):
+        return self.session is not None and self._task is not None and not self._task.done()
+
+    async def open_context(self, profile=None):
+        """New isolated browser context on this server, as a ContextSession."""
+        context_session = ContextSession(self.session, uuid.uuid4().hex[:12], profile or self.profile)
+        result = await context_session.call_tool("create_context")
+        if result.isError:
+            raise RuntimeError(f"create_context failed: {result.content[0].text if result.content else ''}")
+        return context_session
+
+    async def close_context(self, context_session):
+        """Tears the context down. Returns False if the server is unusable."""
+        if not self.alive:
+            return False
+        try:
+            result = await self.session.call_tool("close_context", arguments={"context_id": context_session.context_id})
+            return not result.isError
+        except Exception as e:
+            print(f"⚠️ MCP context close failed: {e}")
+            return False
+
+    async def close(self):
+        self._closing.set()
+        if self._task:
+            await asyncio.gather(self._task, return_exceptions=True)
+
+class McpSessionPool:
+    """
+    Multiplexes agents over a few warm Playwright MCP servers.
+
+    Usage:
+        async with McpSessionPool(size=1) as pool:
+            async with pool.lease() as session:
+                await session.call_tool("navigate", arguments={...})
+
+    Every lease is its own BrowserContext (cookies, storage, page) on a shared
+    browser, so one Node+Chromium process serves up to `contexts_per_server`
+    agents at once. `size` servers are kept warm; when all are full another
+    one is started, and extra servers are shut down once their last lease ends.
+    Broken servers are discarded. size=0 starts servers only on demand.
+
+    `profile` (ExecutionProfile or name) is the default for leases and warm
+    browsers; lease(profile=...) overrides it per context.
+    """
+    def __init__(self, size=POOL_SIZE, contexts_per_server=CONTEXTS_PER_SERVER, profile=None):
+        self.size = size
+        self.profile = get_profile(profile)
+        self.contexts_per_server = max(1, contexts_per_server)
+        self._members = []
+        self._members_changed = asyncio.Condition()
+        self._starting = 0
+        self._waiting = 0
+        self._spawn_failures = 0
+        self._spawn_tasks = set()
+        self._closed = False
+
+    async def __aenter__(self):
+        await self.start()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
+
+    async def start(self):
+        """Starts the warm servers and waits until they are ready."""
+        self._refill()
+        if self._spawn_tasks:
+            await asyncio.gather(*list(self._spawn_tasks), return_exceptions=True)
+        print(f"🔥 MCP pool ready ({len(self._members)}/{self.size} warm servers, {self.contexts_per_server} contexts each)")
+
+    async def close(self):
+        self._closed = True
+        for task in list(self._spawn_tasks):
+            task.cancel()
+        async with self._members_changed:
+            # Servers with open leases are closed when those leases end
+            idle = [m for m in self._members if m.leases == 0]
+            self._members = [m for m in self._members if m.leases > 0]
+            self._members_changed.notify_all()
+        await asyncio.gather(*(m.close() for m in idle), return_exceptions=True)
+
+    def _refill(self):
+        if self._closed:
+            return
+        missing = self.size - (len(self._members) + self._starting)
+        for _ in range(max(missing, 0)):
+            self._start_spawn()
+
+    def _start_spawn(self):
+        self._starting += 1
+        task = asyncio.create_task(self._spawn())
+        self._spawn_tasks.add(task)
+        task.add_done_callback(self._spawn_tasks.discard)
+
+    async def _spawn(self):
+        member = PooledSession(self.profile)
+        try:
+            await member.start()
+        except asyncio.CancelledError:
+            self._starting -= 1
+            await member.close()
+            raise
+        except Exception as e:
+            print(f"❌ Failed to start pooled MCP session: {e}")
+            member = None
+
+        async with self._members_changed:
+            self._starting -= 1
+            if member is None:
+                self._spawn_failures += 1
+            # Keep it if someone is waiting for it or we are below target
+            keep = member and not self._closed and (self._waiting > 0 or len(self._members) < self.size)
+            if keep:
+                self._members.append(member)
+            self._members_changed.notify_all()
+        if member and not keep:
+            await member.close()
+
+    def _free_member(self):
+        # Least loaded live server with a free context slot
+        free = [m for m in self._members if m.alive and not m.retiring and m.leases < self.contexts_per_server]
+        return min(free, key=lambda m: m.leases) if free else None
+
+    async def _acquire(self, profile=None):
+        while True:
+            async with self._members_changed:
+                dead = [m for m in self._members if not m.alive and m.leases == 0]
+                self._members = [m for m in self._members if m not in dead]
+                failures = self._spawn_failures
+                self._waiting += 1
+                try:
+                    while True:
+                        member = self._free_member()
+                        if member:
+                            break
+                        if self._closed:
+                            raise RuntimeError("MCP session pool is closed.")
+                        if self._spawn_failures > failures:
+                            raise RuntimeError("Could not start a Playwright MCP session.")
+                        # All servers full: make sure every waiter has capacity on the way
+                        if self._starting * self.contexts_per_server < self._waiting:
+                            self._start_spawn()
+                        await self._members_changed.wait()
+                finally:
+                    self._waiting -= 1
+                member.leases += 1
+
+            await asyncio.gather(*(m.close() for m in dead), return_exceptions=True)
+            if dead:
+                self._refill()
+            try:
+                return member, await member.open_context(get_profile(profile) if profile else None)
+            except Exception as e:
+                print(f"⚠️ Could not open a browser context: {e}")
+                await self._release(member, None)
+                if member.alive:
+                    raise
+
+    async def _release(self, member, context_session):
+        ok = context_session is not None and await member.close_context(context_session)
+        async with self._members_changed:
+            member.leases -= 1
+            if not ok or not member.alive:
+                # Unusable: no new leases, closed once the others are done
+                member.retiring = True
+            drop = member.leases == 0 and (member.retiring or self._closed or len(self._members) > self.size)
+            if drop and member in self._members:
+                self._members.remove(member)
+            self._members_changed.notify_all()
+        if drop:
+            await member.close()
+            self._refill()
+
+    @asynccontextmanager
+    async def lease(self, profile=None):
+        member, context_session = await self._acquire(profile)
+        try:
+            yield context_session
+        finally:
+            await self._release(member, context_session)
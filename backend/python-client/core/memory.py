@@ -0,0 +1,144 @@
+import os
+from functools import lru_cache
+
+# Optional: exact counts for OpenAI models. Everything else uses an estimate.
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
+
+# --- CONFIGURATION FROM ENV ---
+DEFAULT_TOKEN_BUDGET = int(os.getenv("AI_CONTEXT_TOKEN_BUDGET", "12000"))
+
+@lru_cache(maxsize=16)
+def _get_encoding(model_name):
+    try:
+        return tiktoken.encoding_for_model(model_name)
+    except KeyError:
+        return tiktoken.get_encoding("cl100k_base")
+
+def count_tokens(text, model_name=None):
+    """
+    Token count for a piece of text under the given model.
+    Exact via tiktoken for OpenAI models when installed, otherwise ~4 chars/token
+    (close enough for Gemini and Llama, and only used for budgeting).
+    """
+    if not text:
+        return 0
+    if tiktoken and model_name and not model_name.startswith("models/") and "llama" not in model_name:
+        return len(_get_encoding(model_name).encode(text))
+    return len(text) // 4 + 1
+
+def message_text(message):
+    content = message.get("content")
+    if isinstance(content, str):
+        return content
+    if isinstance(content, list):
+        return " ".join(x.get("text", "") for x in content if isinstance(x, dict))
+    if "parts" in message:
+        return " ".join(p for p in message["parts"] if isinstance(p, str))
+    return ""
+
+def _clip(text, max_chars):
+    # Keep head and tail: page dumps put the useful bits at both ends
+    if len(text) <= max_chars:
+        return text
+    half = max_chars // 2
+    return f"{text[:half]}\n...[{len(text) - max_chars} chars trimmed]...\n{text[-half:]}"
+
+def extractive_summary(previous_summary, evicted, max_chars):
+    """Default summarizer: one short line per evicted turn, newest kept when over size."""
+    lines = previous_summary.splitlines() if previous_summary else []
+    for m in evicted:
+        text = " ".join(message_text(m).split())
+        if text:
+            lines.append(f"- {m['role']}: {text[:160]}")
+    while lines and sum(len(l) + 1 for l in lines) > max_chars:
+        lines.pop(0)
+    return "\n".join(lines)
+
+class ConversationMemory:
+    """
+    Token-budgeted chat history.
+
+    - System messages are always sent.
+    - The current step (add(..., current=True)) is always sent.
+    - Other turns form a sliding window, newest first, within `budget` tokens.
+    - Turns that fall out of the window are folded into a running summary
+      (extractive by default, or `summarizer(previous_summary, evicted)`).
+
+    window() returns the list to send; last_stats reports what was saved.
+    """
+    def __init__(self, system=None, budget=DEFAULT_TOKEN_BUDGET, model_name=None, summarizer=None, max_message_tokens=None):
+        self.budget = budget
+        self.model_name = model_name
+        self.system = list(system or [])
+        self.summarizer = summarizer
+        # A single tool dump may not eat more than a third of the budget
+        self.max_message_tokens = max_message_tokens or budget // 3
+        self.turns = []
+        self.current = None
+        self.summary = ""
+        self.evicted_count = 0
+        self.last_stats = {"sent_tokens": 0, "full_tokens": 0, "saved_tokens": 0}
+        self._full_tokens = 0
+
+    def add(self, message, current=False):
+        """Appends a turn. current=True pins it as the step being worked on."""
+        message = dict(message)
+        text = message_text(message)
+        # Track what the unbounded history would have cost, for last_stats
+        self._full_tokens += count_tokens(text, self.model_name)
+        if isinstance(message.get("content"), str):
+            message["content"] = _clip(text, self.max_message_tokens * 4)
+        self.turns.append(message)
+        if current:
+            self.current = message
+        return message
+
+    def window(self, model_name=None):
+        """Messages to send this turn. model_name switches the token counter (per-request model)."""
+        if model_name:
+            self.model_name = model_name
+        def tokens(m): return count_tokens(message_text(m), self.model_name)
+
+        fixed = sum(tokens(m) for m in self.system)
+        if self.current is not None:
+            fixed += tokens(self.current)
+        # Leave room for the summary itself
+        available = self.budget - fixed - count_tokens(self.summary, self.model_name) - 64
+
+        used, cut = 0, 0
+        for i in range(len(self.turns) - 1, -1, -1):
+            m = self.turns[i]
+            if m is self.current:
+                continue
+            t = tokens(m)
+            if used + t > available:
+                cut = i + 1
+                break
+            used += t
+
+        if cut:
+            self._evict(cut)
+
+        messages = list(self.system)
+        if self.summary:
+            messages.append({"role": "user", "content": f"Summary of earlier conversation:\n{self.summary}"})
+        messages.extend(self.turns)
+
+        sent = sum(tokens(m) for m in messages)
+        full = self._full_tokens + sum(tokens(m) for m in self.system)
+        self.last_stats = {"sent_tokens": sent, "full_tokens": full, "saved_tokens": max(full - sent, 0)}
+        return messages
+
+    def _evict(self, cut):
+        # Everything before `cut` leaves the window for good (current step stays)
+        evicted = [m for m in self.turns[:cut] if m is not self.current]
+        self.turns = [m for m in self.turns[:cut] if m is self.current] + self.turns[cut:]
+        self.evicted_count += len(evicted)
+        max_chars = max(self.budget // 8, 100) * 4
+        if self.summarizer:
+            self.summary = self.summarizer(self.summary, evicted)
+        else:
+            self.summary = extractive_summary(self.summary, evicted, max_chars)
@@ -0,0 +1,183 @@
+import os
+import re
+import time
+import asyncio
+import threading
+
+# --- CONFIGURATION FROM ENV ---
+# Requests/tokens per minute. Override with e.g.
+#   AI_RATE_LIMITS="gemini=15:1000000;groq/llama-3.3-70b-versatile=30:12000"
+DEFAULT_LIMITS = {
+    "gemini": (15, 1_000_000),
+    "groq": (30, 12_000),
+    "openai": (500, 30_000),
+}
+RATE_LIMITS_ENV = os.getenv("AI_RATE_LIMITS", "")
+# Assumed completion size when reserving tokens; corrected once usage is known
+EXPECTED_OUTPUT_TOKENS = int(os.getenv("AI_EXPECTED_OUTPUT_TOKENS", "512"))
+
+def _parse_limits(spec):
+    limits = {}
+    for entry in re.split(r"[;,]", spec):
+        if "=" not in entry:
+            continue
+        key, _, value = entry.strip().rpartition("=")
+        rpm, _, tpm = value.partition(":")
+        try:
+            limits[key.strip()] = (int(rpm), int(tpm) if tpm else None)
+        except ValueError:
+            print(f"⚠️ Ignoring bad AI_RATE_LIMITS entry: {entry}")
+    return limits
+
+_LIMIT_OVERRIDES = _parse_limits(RATE_LIMITS_ENV)
+
+def _parse_duration(value):
+    """'1.5', '20s', '6m0s', '120ms' (OpenAI/Groq reset headers) -> seconds."""
+    if value is None:
+        return None
+    value = str(value).strip()
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    total = 0.0
+    for amount, unit in re.findall(r"([\d.]+)(ms|h|m|s)", value):
+        total += float(amount) * {"ms": 0.001, "s": 1, "m": 60, "h": 3600}[unit]
+    return total or None
+
+def retry_after_from_error(e):
+    """Server-suggested wait of a 429, from the Retry-After header or the error text (Gemini)."""
+    headers = getattr(getattr(e, "response", None), "headers", None)
+    if headers is not None:
+        wait = _parse_duration(headers.get("retry-after"))
+        if wait:
+            return wait
+    match = (re.search(r"retry (?:in|after) ([\d.]+)\s*s", str(e), re.I)
+             or re.search(r"retry_delay\s*\{\s*seconds:\s*(\d+)", str(e)))
+    return float(match.group(1)) if match else None
+
+class _Bucket:
+    def __init__(self, per_minute):
+        self.capacity = float(per_minute)
+        self.rate = per_minute / 60.0
+        self.level = self.capacity
+
+    def refill(self, elapsed):
+        self.level = min(self.capacity, self.level + elapsed * self.rate)
+
+    def wait_time(self):
+        return -self.level / self.rate if self.level < 0 else 0.0
+
+class RateLimiter:
+    """
+    Token bucket for one provider/model: requests per minute and tokens per minute.
+
+    acquire() reserves its request + tokens right away and returns once that
+    reservation is covered, so concurrent callers (threads or coroutines) are
+    admitted in order, as fast as the quota refills. Rate-limit headers and
+    Retry-After tighten the buckets when the provider knows better.
+    """
+    def __init__(self, rpm, tpm=None):
+        self.requests = _Bucket(rpm)
+        self.tokens = _Bucket(tpm) if tpm else None
+        self.blocked_until = 0.0
+        self.stats = {"admitted": 0, "delayed": 0, "waited_seconds": 0.0, "throttled": 0}
+        self._lock = threading.Lock()
+        self._last = time.monotonic()
+
+    def _refill(self, now):
+        elapsed = now - self._last
+        self._last = now
+        self.requests.refill(elapsed)
+        if self.tokens: self.tokens.refill(elapsed)
+
+    def _reserve(self, tokens):
+        """Takes a slot now, returns how long the caller must wait for it."""
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            self.requests.level -= 1
+            wait = self.requests.wait_time()
+            if self.tokens:
+                # A single oversized request may not wait longer than one full window
+                self.tokens.level -= min(tokens, self.tokens.capacity)
+                wait = max(wait, self.tokens.wait_time())
+            wait = max(wait, self.blocked_until - now)
+            self.stats["admitted"] += 1
+            if wait > 0:
+                self.stats["delayed"] += 1
+                self.stats["waited_seconds"] += wait
+            return wait
+
+    def estimated_wait(self, tokens=0):
+        """What acquire() would wait right now, without reserving anything."""
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            wait = max(-(self.requests.level - 1) / self.requests.rate, 0.0)
+            if self.tokens:
+                level = self.tokens.level - min(tokens, self.tokens.capacity)
+                wait = max(wait, -level / self.tokens.rate)
+            return max(wait, self.blocked_until - now)
+
+    async def acquire_async(self, tokens=0):
+        wait = self._reserve(tokens)
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+    def acquire(self, tokens=0):
+        wait = self._reserve(tokens)
+        if wait > 0:
+            time.sleep(wait)
+
+    def record_usage(self, reserved, actual):
+        """Corrects the token bucket once the real usage of a call is known."""
+        if not self.tokens or actual is None:
+            return
+        with self._lock:
+            self.tokens.level -= actual - reserved
+
+    def update_from_headers(self, headers):
+        """Syncs with x-ratelimit-remaining-* / reset-* headers (OpenAI, Groq)."""
+        if headers is None:
+            return
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            for bucket, kind in ((self.requests, "requests"), (self.tokens, "tokens")):
+                remaining = headers.get(f"x-ratelimit-remaining-{kind}")
+                if bucket is None or remaining is None:
+                    continue
+                try:
+                    remaining = float(remaining)
+                except ValueError:
+                    continue
+                bucket.level = min(bucket.level, remaining)
+                reset = _parse_duration(headers.get(f"x-ratelimit-reset-{kind}"))
+                if remaining <= 0 and reset:
+                    self.blocked_until = max(self.blocked_until, now + reset)
+
+    def penalize(self, retry_after):
+        """After a 429: nobody is admitted until retry_after seconds from now."""
+        with self._lock:
+            self.blocked_until = max(self.blocked_until, time.monotonic() + retry_after)
+            self.stats["throttled"] += 1
+
+_LIMITERS = {}
+_LIMITERS_LOCK = threading.Lock()
+
+def get_limiter(provider, model_name):
+    """Shared limiter for a provider/model, across all sessions and threads."""
+    key = (provider, model_name)
+    with _LIMITERS_LOCK:
+        limiter = _LIMITERS.get(key)
+        if limiter is None:
+            rpm, tpm = (_LIMIT_OVERRIDES.get(f"{provider}/{model_name}")
+                        or _LIMIT_OVERRIDES.get(provider)
+                        or DEFAULT_LIMITS.get(provider, (60, None)))
+            limiter = _LIMITERS[key] = RateLimiter(rpm, tpm)
+        return limiter
+
+def limiter_stats():
+    with _LIMITERS_LOCK:
+        return {f"{p}/{m}": dict(l.stats) for (p, m), l in _LIMITERS.items()}
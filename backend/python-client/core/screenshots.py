@@ -0,0 +1,37 @@
+import os
+import re
+
+# Same store the Playwright server writes to (playwright-server/screenshots/<sha256>.png)
+_PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+SCREENSHOT_DIR = os.getenv("SCREENSHOT_DIR") or os.path.join(_PROJECT_ROOT, "playwright-server", "screenshots")
+
+_DIGEST_RE = re.compile(r"^[0-9a-f]{64}$")
+
+def screenshot_file(digest):
+    """Path of a stored screenshot, or None for unknown/malformed digests."""
+    if not _DIGEST_RE.match(digest):
+        return None
+    path = os.path.join(SCREENSHOT_DIR, f"{digest}.png")
+    return path if os.path.exists(path) else None
+
+def split_tool_result(result):
+    """
+    Separates an MCP tool result into the text the LLM should see and the
+    screenshots to show the user, as (text, [{"url", "digest", "thumbnail"}]).
+    Screenshots arrive as a resource_link to the store plus an optional JPEG preview.
+    """
+    text = ""
+    images = []
+    thumbnail = None
+    for content in result.content:
+        if content.type == "text":
+            text += content.text
+        elif content.type == "resource_link" and str(content.name).endswith(".png"):
+            digest = str(content.name)[:-len(".png")]
+            images.append({"url": f"/api/screenshots/{digest}", "digest": digest, "thumbnail": None})
+            text += "[Screenshot Captured]"
+        elif content.type == "image":
+            thumbnail = content.data
+    if images and thumbnail:
+        images[-1]["thumbnail"] = thumbnail
+    return text, images
@@ -0,0 +1,190 @@
+import os
+import re
+import time
+import sqlite3
+import threading
+from urllib.parse import urlparse
+
+# --- CONFIGURATION FROM ENV ---
+_CLIENT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SELECTOR_MEMORY_PATH = os.getenv("SELECTOR_MEMORY_PATH", os.path.join(_CLIENT_ROOT, ".ai_cache", "selectors.sqlite3"))
+SELECTOR_MEMORY_DISABLED = os.getenv("SELECTOR_MEMORY_DISABLED", "0") == "1"
+
+# Browser tools whose selector is worth remembering
+MEMORY_ACTIONS = ("click", "fill")
+
+_QUOTED = re.compile(r"""(['"`])(.*?)\1""")
+_ID_SEGMENT = re.compile(r"^(\d+|[0-9a-f]{8,}|[0-9a-f-]{36})$", re.I)
+
+def url_pattern(url):
+    """'https://shop.io/orders/123?x=1' -> 'shop.io/orders/*' (ids and query dropped)."""
+    if not url:
+        return "*"
+    parsed = urlparse(url if "//" in url else f"//{url}")
+    segments = ["*" if _ID_SEGMENT.match(s) else s for s in parsed.path.split("/") if s]
+    return "/".join([parsed.netloc.lower()] + segments) or "*"
+
+def quoted_values(step):
+    return [m.group(2) for m in _QUOTED.finditer(step)]
+
+def intent_key(step, action):
+    """
+    Normalized 'what the step wants' for an action. Typed values are dropped for
+    fill ("Enter 'bob' in the username field" == "Enter 'alice' in ..."), clicked
+    labels are kept ("Click 'Login'" != "Click 'Cancel'").
+    """
+    text = step.lower()
+    if action == "fill":
+        text = _QUOTED.sub("<value>", text)
+    return f"{action}:{' '.join(re.findall(r'[a-z0-9<>_#.-]+', text))}"
+
+def page_bound(intent):
+    """click/fill intents only mean something on their page; heals ('heal:...') may apply anywhere."""
+    return not intent.startswith("heal:")
+
+class SelectorMemory:
+    """
+    SQLite store of locators that worked: (URL pattern, intent) -> selector,
+    with success/failure counts. Fed by successful agent steps and heals.
+    Heals are stored as intent 'heal:<broken locator>' -> working locator; a heal
+    without a known page is stored under '*' and matches on every page.
+    """
+    def __init__(self, path=SELECTOR_MEMORY_PATH):
+        self.path = path
+        self.stats = {"hits": 0, "misses": 0, "learned": 0}
+        self._lock = threading.Lock()
+        self._conn = None
+
+    def _db(self):
+        if self._conn is None:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS selectors ("
+                " url_pattern TEXT, intent TEXT, action TEXT, selector TEXT, source TEXT,"
+                " successes INTEGER DEFAULT 0, failures INTEGER DEFAULT 0, updated_at REAL,"
+                " PRIMARY KEY (url_pattern, intent, selector))"
+            )
+        return self._conn
+
+    def lookup(self, url, intent):
+        """Best known selector for this intent on this page: {action, selector, ...} or None."""
+        if SELECTOR_MEMORY_DISABLED:
+            return None
+        pattern = url_pattern(url)
+        # A click/fill intent ("click submit") collides across sites: only its own page counts
+        where = "url_pattern = ?" if page_bound(intent) else "url_pattern IN (?, '*')"
+        with self._lock:
+            row = None
+            if pattern != "*" or not page_bound(intent):
+                row = self._db().execute(
+                    "SELECT action, selector, source, successes, failures FROM selectors"
+                    f" WHERE {where} AND intent = ? AND successes > failures"
+                    " ORDER BY url_pattern = '*', successes - 2 * failures DESC, updated_at DESC LIMIT 1",
+                    (pattern, intent)
+                ).fetchone()
+            self.stats["hits" if row else "misses"] += 1
+        if row is None:
+            return None
+        return {"action": row[0], "selector": row[1], "source": row[2], "successes": row[3], "failures": row[4]}
+
+    def record_success(self, url, intent, action, selector, source="recorded"):
+        if SELECTOR_MEMORY_DISABLED or not selector:
+            return
+        if page_bound(intent) and url_pattern(url) == "*":
+            # Page unknown: it would match this intent on every site
+            return
+        with self._lock:
+            db = self._db()
+            db.execute(
+                "INSERT INTO selectors (url_pattern, intent, action, selector, source, successes, updated_at)"
+                " VALUES (?, ?, ?, ?, ?, 1, ?)"
+                " ON CONFLICT (url_pattern, intent, selector) DO UPDATE SET"
+                " successes = successes + 1, updated_at = excluded.updated_at",
+                (url_pattern(url), intent, action, selector, source, time.time())
+            )
+            db.commit()
+            self.stats["learned"] += 1
+
+    def record_failure(self, url, intent, selector):
+        if SELECTOR_MEMORY_DISABLED:
+            return
+        with self._lock:
+            db = self._db()
+            db.execute(
+                "UPDATE selectors SET failures = failures + 1, updated_at = ?"
+                " WHERE url_pattern = ? AND intent = ? AND selector = ?",
+                (time.time(), url_pattern(url), intent, selector)
+            )
+            db.commit()
+
+    def record_heal(self, url, broken, fixed):
+        self.record_success(url, f"heal:{broken}", "heal", fixed, source="healed")
+
+    def healed_locator(self, url, broken):
+        known = self.lookup(url, f"heal:{broken}")
+        return known["selector"] if known else None
+
+    def learn_from_history(self, history):
+        """
+        Stores the selectors of a successful run's recorded_history. Only steps done
+        by a single click/fill: a lookup then stands for the whole step.
+        """
+        per_step = {}
+        for entry in history:
+            per_step[entry.get("description")] = per_step.get(entry.get("description"), 0) + 1
+        url = None
+        for entry in history:
+            params = entry.get("params") or {}
+            if entry.get("action") == "navigate":
+                url = params.get("url")
+            elif entry.get("action") in MEMORY_ACTIONS and params.get("selector") \
+                    and per_step[entry.get("description")] == 1:
+                self.record_success(url, intent_key(entry.get("description", ""), entry["action"]),
+                                    entry["action"], params["selector"])
+
+    def resolve_step(self, url, step):
+        """Tool calls for a step from memory ([{tool, args}]) or None."""
+        known = self.lookup(url, intent_key(step, "click"))
+        if known:
+            return [{"tool": "click", "args": {"selector": known["selector"]}}]
+        values = quoted_values(step)
+        if len(values) == 1:
+            known = self.lookup(url, intent_key(step, "fill"))
+            if known:
+                return [{"tool": "fill", "args": {"selector": known["selector"], "value": values[0]}}]
+        return None
+
+    def forget_step(self, url, step, actions):
+        """The remembered selector failed on this page."""
+        for action in actions:
+            self.record_failure(url, intent_key(step, action["tool"]), action["args"].get("selector"))
+
+    def known_fixes(self, history):
+        """[(step description, broken locator, verified fix)] for the selectors of a recorded history."""
+        url, fixes = None, []
+        for entry in history:
+            params = entry.get("params") or {}
+            if entry.get("action") == "navigate":
+                url = params.get("url")
+                continue
+            selector = params.get("selector")
+            if not selector:
+                continue
+            # Playwright reports CSS selectors as locator('...')
+            for broken in (selector, f"locator('{selector}')", f'locator("{selector}")'):
+                healed = self.healed_locator(url, broken)
+                if healed:
+                    fixes.append((entry.get("description"), broken, healed))
+                    break
+        return fixes
+
+_MEMORY = None
+_MEMORY_LOCK = threading.Lock()
+
+def get_selector_memory():
+    global _MEMORY
+    with _MEMORY_LOCK:
+        if _MEMORY is None:
+            _MEMORY = SelectorMemory()
+        return _MEMORY
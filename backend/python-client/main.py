@@ -2,14 +2,15 @@ import asyncio
 import sys
 import os
 import subprocess
+import argparse
 
 from agents.assistant import run_chat_assistant
 from utils.file_parser import get_test_files
 from utils.reporter import parse_test_results, open_html_report
 
-# Update imports to include the Generation Nodes
-from workflow.engine import WorkflowEngine
-from workflow.nodes import (FixtureLoaderNode, PlaywrightAgentNode, VerifiedPomNode, VerifiedSpecNode)
+# Workflow pipeline (single fixture + parallel batch)
+from workflow.batch import build_fixture_workflow, run_batch, BATCH_CONCURRENCY
+from utils.optimizer import optimizer_queue
 
 def clear_screen():
     os.system('cls' if os.name == 'nt' else 'clear')
@@ -20,10 +21,11 @@ def main_menu():
     print("="*50)
     print("1. Interactive Chat Assistant (Manual Control)")
     print("2. Autonomous Architect (N8N Style Workflow)")
-    print("3. Exit")
+    print("3. Batch Architect (All Fixtures, Parallel)")
+    print("4. Exit")
     print("="*50)
     
-    choice = input("\nEnter your choice (1-3): ").strip()
+    choice = input("\nEnter your choice (1-4): ").strip()
     if choice == "1":
         print("\n💬 Starting Interactive Chat... (Type 'quit' to exit chat)")
         try:
@@ -59,20 +61,14 @@ def main_menu():
             print("❌ Invalid input. Please enter a number.")
             return
 
+        # Completed nodes of an earlier run of this fixture are resumed from their checkpoint
+        rerun_from = input("Force re-run from node (e.g. PlaywrightAgentNode, Enter = resume): ").strip() or None
+
         # 4. Initialize N8N Style Workflow Engine
         print(f"\n🚀 Initializing Autonomous Architect for: {os.path.basename(selected_file_path)}")
         
-        engine = WorkflowEngine()
-        
         # --- Define the Architecture (The "Flow") ---
-        # Node 1: Load the File
-        engine.add_node(FixtureLoaderNode(selected_file_path))
-        # Node 2: AI Agent Execution (Drives Browser & Records Actions)
-        engine.add_node(PlaywrightAgentNode())
-        # Node 3: Generate Verified POM (From Recorded Actions)
-        engine.add_node(VerifiedPomNode())
-        # Node 4: Generate Verified Spec (From POM)
-        engine.add_node(VerifiedSpecNode())
+        engine = build_fixture_workflow(selected_file_path, rerun_from=rerun_from)
         # 5. Execute Workflow
         try:
             asyncio.run(engine.run())
@@ -83,6 +79,11 @@ def main_menu():
             print("="*50)
             
             server_dir = os.path.abspath(os.path.join(os.getcwd(), "../playwright-server"))
+
+            # Background optimizer rewrites must land before Playwright reads the files
+            if optimizer_queue.pending():
+                print(f"⏳ Waiting for {optimizer_queue.pending()} optimizer jobs...")
+            optimizer_queue.drain()
             
             # Run Playwright (Headless or Headed based on preference)
             # We use the JSON reporter for our Python parser
@@ -109,12 +110,45 @@ def main_menu():
         input("\nPress Enter to return to menu...")
 
     elif choice == "3":
+        files = get_test_files()
+        if not files:
+            print("❌ No Markdown (.md) files found.")
+            input("Press Enter to return to menu...")
+            return
+        try:
+            asyncio.run(run_batch(files))
+        except Exception as e:
+            print(f"🔥 Batch Critical Error: {e}")
+        input("\nPress Enter to return to menu...")
+
+    elif choice == "4":
         print("\n👋 Goodbye!")
         sys.exit()
     else:
         print("\n❌ Invalid choice. Please try again.")
 
+def run_batch_cli(argv):
+    """Non-interactive: python main.py --batch [fixture.md ...] [--concurrency N] [--report-dir DIR] [--profile fast] [--rerun-from NODE] [--no-wait-optimizer]"""
+    parser = argparse.ArgumentParser(description="Run the fixture workflow over many fixtures in parallel.")
+    parser.add_argument("--batch", nargs="*", metavar="FIXTURE", help="Fixture files (default: all in fixture/tests)")
+    parser.add_argument("--concurrency", type=int, default=BATCH_CONCURRENCY)
+    parser.add_argument("--report-dir", default=None)
+    parser.add_argument("--profile", default=None, help="Execution profile: headed, headless or fast (default: EXECUTION_PROFILE)")
+    parser.add_argument("--rerun-from", default=None, metavar="NODE", help="Ignore checkpoints from this workflow node on (e.g. PlaywrightAgentNode)")
+    parser.add_argument("--no-wait-optimizer", action="store_true", help="Finish without waiting for the code optimizer (it completes in the background)")
+    args = parser.parse_args(argv)
+
+    files = args.batch or get_test_files()
+    kwargs = {"concurrency": args.concurrency, "profile": args.profile, "rerun_from": args.rerun_from}
+    if args.no_wait_optimizer: kwargs["wait_for_optimizer"] = False
+    if args.report_dir: kwargs["report_dir"] = os.path.abspath(args.report_dir)
+    summary = asyncio.run(run_batch(files, **kwargs))
+    # Non-zero exit for CI when anything failed
+    sys.exit(0 if summary and summary["failed"] == 0 else 1)
+
 if __name__ == "__main__":
+    if "--batch" in sys.argv[1:]:
+        run_batch_cli(sys.argv[1:])
     while True:
         try:
             main_menu()
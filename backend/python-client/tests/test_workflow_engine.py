@@ -0,0 +1,45 @@
+import asyncio
+import unittest
+from workflow.engine import WorkflowEngine
+
+class FakeNode:
+    """Minimal node: sleeps, then sets its outputs or raises."""
+    timeout = None
+    version = 1
+
+    def __init__(self, name, inputs=(), outputs=(), delay=0.0, error=None):
+        self.name = name
+        self.inputs = inputs
+        self.outputs = outputs
+        self.delay = delay
+        self.error = error
+
+    def checkpoint_valid(self, context):
+        return True
+
+    async def execute(self, context, session=None):
+        await asyncio.sleep(self.delay)
+        if self.error:
+            raise RuntimeError(self.error)
+        for field in self.outputs:
+            setattr(context, field, self.name)
+
+class WorkflowEngineGraphTest(unittest.IsolatedAsyncioTestCase):
+    async def test_failing_branch_does_not_cancel_sibling_branch(self):
+        engine = WorkflowEngine()
+        engine.add_node(FakeNode("Loader", outputs=("recorded_history",)))
+        engine.add_node(FakeNode("Pom", inputs=("recorded_history",), outputs=("pom_path",), error="boom"))
+        engine.add_node(FakeNode("Spec", inputs=("recorded_history",), outputs=("spec_path",), delay=0.1))
+        # Join node: cancelled when Pom fails, while still waiting on Spec
+        engine.add_node(FakeNode("Run", inputs=("pom_path", "spec_path")))
+
+        await engine._run_graph(None)
+
+        status = {t["node"]: t["status"] for t in engine.context.node_timings}
+        self.assertEqual(status["Pom"], "failed")
+        self.assertEqual(status["Spec"], "ok")
+        self.assertEqual(status["Run"], "cancelled")
+        self.assertEqual(engine.context.spec_path, "Spec")
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,7 +1,9 @@
 import json
 import os
-from core.ai import get_ai_response  # Removed ACTIVE_MODEL import
+from core.ai import extract_ai_text  # Re-exported for the healer
+from core.llm_cache import get_ai_text
 from utils.validator import PlaywrightValidator
+from core.selector_memory import get_selector_memory
 
 # Setup paths relative to this file
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -9,33 +11,7 @@ SERVER_DIR = os.path.join(BASE_DIR, "ai-browser-automation", "playwright-server"
 
 validator = PlaywrightValidator(SERVER_DIR)
 
-# --- HELPER: Handle different AI response formats dynamically ---
-def extract_ai_text(resp):
-    """
-    Automatically detects if response is from Gemini (has .text) 
-    or OpenAI/Claude (has .content).
-    """
-    try:
-        # Gemini
-        if hasattr(resp, 'text'):
-            return resp.text
-        
-        # OpenAI / Claude
-        if hasattr(resp, 'content'):
-            # Claude returns a list of content blocks
-            if isinstance(resp.content, list):
-                return resp.content[0].text
-            # OpenAI returns a string
-            return resp.content
-            
-    except Exception as e:
-        print(f"⚠️ Error extracting text: {e}")
-        
-    return str(resp)
-
-# ---------------------------------------------------------------
-
-def fix_code_with_ai(bad_code, error_messages, context):
+def fix_code_with_ai(bad_code, error_messages, context, config=None, bypass_cache=False):
     print(f"   🔧 Fixing {context} errors...")
     prompt = f"""
     Fix this Playwright code based on errors.
@@ -44,17 +20,38 @@ def fix_code_with_ai(bad_code, error_messages, context):
     CODE: {bad_code}
     RETURN ONLY FIXED TYPESCRIPT CODE.
     """
-    resp = get_ai_response([{"role": "user", "content": prompt}])
-    
-    # Use helper instead of checking model name
-    text = extract_ai_text(resp)
+    # Cached: identical code + errors + model give the identical fix
+    text = get_ai_text([{"role": "user", "content": prompt}], config=config, bypass_cache=bypass_cache) or ""
     
     return text.replace("```typescript", "").replace("```", "").strip()
 
-def generate_pom_code(manual_test_json):
+def pom_class_name(title):
+    """POM class name (without the 'Page' suffix) for a test title. Deterministic, so
+    the spec can be generated without waiting for the POM."""
+    return title.replace(" ", "")
+
+def apply_known_fixes(code, fixes):
+    """Swaps locators that were healed before for their verified replacement, no heal cycle needed."""
+    for _, broken, healed in fixes:
+        if broken.startswith(("locator(", "getBy")) and broken in code:
+            code = code.replace(broken, healed)
+            print(f"   🧠 Applied known fix: {broken} -> {healed}")
+    return code
+
+def generate_pom_code(manual_test_json, config=None, bypass_cache=False):
     data = json.loads(manual_test_json)
-    name = data['title'].replace(" ", "")
-    
+    name = pom_class_name(data['title'])
+
+    # Locators that broke before and how they were fixed (recorded steps only)
+    recorded_steps = [s for s in data.get("steps", []) if isinstance(s, dict)]
+    fixes = get_selector_memory().known_fixes(recorded_steps)
+    known = ""
+    if fixes:
+        lines = "\n    ".join(f"- '{desc}': use {healed} instead of {broken}" for desc, broken, healed in fixes)
+        known = f"""
+    Verified locators (use these, the recorded selectors broke before):
+    {lines}"""
+
     prompt = f"""
     Create Playwright POM (TypeScript).
     Class: {name}Page
@@ -63,24 +60,22 @@ def generate_pom_code(manual_test_json):
     1. Import {{ type Page }} from "playwright/test";
     2. Export default class {name}Page.
     3. Define selectors as readonly.
-    4. Async methods for steps.
+    4. Async methods for steps.{known}
     RETURN ONLY CODE.
     """
     
-    resp = get_ai_response([{"role": "user", "content": prompt}])
-    
-    # Use helper
-    code = extract_ai_text(resp)
+    code = get_ai_text([{"role": "user", "content": prompt}], config=config, bypass_cache=bypass_cache) or ""
     code = code.replace("```typescript", "").replace("```", "").strip()
+    code = apply_known_fixes(code, fixes)
 
     # Validation
     is_valid, msg = validator.validate_pom(code, name)
     if not is_valid:
-        code = fix_code_with_ai(code, msg, "POM")
+        code = fix_code_with_ai(code, msg, "POM", config=config, bypass_cache=bypass_cache)
     
     return name, code
 
-def generate_spec_code(manual_test_json, pom_class_name):
+def generate_spec_code(manual_test_json, pom_class_name, config=None, bypass_cache=False):
     data = json.loads(manual_test_json)
     
     prompt = f"""
@@ -94,29 +89,23 @@ def generate_spec_code(manual_test_json, pom_class_name):
     RETURN ONLY CODE.
     """
     
-    resp = get_ai_response([{"role": "user", "content": prompt}])
-    
-    # Use helper
-    code = extract_ai_text(resp)
+    code = get_ai_text([{"role": "user", "content": prompt}], config=config, bypass_cache=bypass_cache) or ""
     code = code.replace("```typescript", "").replace("```", "").strip()
 
     # Validation
     is_valid, msg = validator.validate_spec(code, pom_class_name)
     if not is_valid:
-        code = fix_code_with_ai(code, msg, "Spec")
+        code = fix_code_with_ai(code, msg, "Spec", config=config, bypass_cache=bypass_cache)
     
     return code
 
-def generate_manual_test_proposal(url, page_content):
+def generate_manual_test_proposal(url, page_content, config=None, bypass_cache=False):
     prompt = f"""
     Analyze page ({url}). Generate 1 Happy Path test JSON.
     Format: {{ "id": "..", "title": "..", "steps": [..], "verification": ".." }}
     Content: {page_content[:1500]}
     RETURN ONLY JSON.
     """
-    resp = get_ai_response([{"role": "user", "content": prompt}])
-    
-    # Use helper
-    text = extract_ai_text(resp)
+    text = get_ai_text([{"role": "user", "content": prompt}], config=config, bypass_cache=bypass_cache) or ""
     
     return text.replace("```json", "").replace("```", "").strip()
\ No newline at end of file
@@ -1,20 +1,145 @@
-from core.ai import get_ai_response, ACTIVE_MODEL
+import os
+import re
+import difflib
+from concurrent.futures import ThreadPoolExecutor
+from core.ai import get_ai_response, failover_chain, get_default_config
+from utils.generators import extract_ai_text, validator
 
-def heal_code(pom_path, error_log):
-    print(f"❤️‍🩹 Healing POM: {pom_path}")
-    with open(pom_path, "r") as f: code = f.read()
+# --- CONFIGURATION FROM ENV ---
+# >1: speculative healing, that many alternative fixes are raced per round
+HEAL_CANDIDATES = int(os.getenv("HEAL_CANDIDATES", "1"))
+# One hint per candidate so the alternatives actually differ
+HEAL_STRATEGIES = [
+    "Prefer getByRole with the exact accessible name shown in the page snapshot.",
+    "Prefer getByLabel/getByPlaceholder for inputs and getByText for links and buttons.",
+    "Prefer stable attributes (data-testid, id, name) through locator('[attr=\"...\"]').",
+    "Scope the locator to its nearest landmark/container (e.g. getByRole('form').getByRole(...)).",
+]
+
+_LOCATOR_EXPR = re.compile(r"((?:locator|getBy\w+)\((?:[^()]|\([^()]*\))*\))")
+
+def locator_fixes(old_code, new_code, failures=None):
+    """
+    [(broken locator, replacement)] from the lines a heal changed. With failures,
+    only the locators Playwright reported as failing count.
+    """
+    broken = {f["locator"].replace('"', "'") for f in failures or [] if f.get("locator")}
+    old_lines, new_lines = old_code.splitlines(), new_code.splitlines()
+    fixes = []
+    for tag, i1, i2, j1, j2 in difflib.SequenceMatcher(None, old_lines, new_lines).get_opcodes():
+        if tag != "replace":
+            continue
+        old_exprs = [e for line in old_lines[i1:i2] for e in _LOCATOR_EXPR.findall(line)]
+        new_exprs = [e for line in new_lines[j1:j2] for e in _LOCATOR_EXPR.findall(line)]
+        for old, new in zip(old_exprs, new_exprs):
+            if old != new and (not broken or old.replace('"', "'") in broken):
+                fixes.append((old, new))
+    return fixes
+
+def format_failure(failure):
+    """Prompt section for one failure from utils.reporter.collect_failures."""
+    parts = [f"TEST: {failure.get('title')} ({failure.get('status')})", f"ERROR: {failure.get('error')}"]
+    if failure.get("locator"):
+        parts.append(f"FAILING LOCATOR: {failure['locator']}")
+    location = failure.get("location")
+    if location:
+        parts.append(f"FAILED AT: {location.get('file')}:{location.get('line')}:{location.get('column')}")
+    if failure.get("snippet"):
+        parts.append(f"SOURCE:\n{failure['snippet']}")
+    if failure.get("page_snapshot"):
+        parts.append(f"PAGE ACCESSIBILITY SNAPSHOT AT FAILURE:\n{failure['page_snapshot']}")
+    return "\n".join(parts)
 
-    prompt = f"""
+def _heal_prompt(code, error_log, failures=None, strategy=None, previous_attempts=None):
+    hints = ""
+    if strategy:
+        hints += f"\n    STRATEGY: {strategy}"
+    if previous_attempts:
+        hints += f"\n    ALREADY TRIED (failed, do not repeat):\n    {previous_attempts}"
+    if not failures:
+        return f"""
     Fix Playwright Selector Errors.
     ERROR: {error_log}
     CODE: {code}
-    Task: Update selectors to be more robust (text/accessibility).
+    Task: Update selectors to be more robust (text/accessibility).{hints}
     RETURN ONLY FULL FIXED CODE.
     """
-    
-    resp = get_ai_response([{"role": "user", "content": prompt}])
-    fixed_code = resp.text if ACTIVE_MODEL == "gemini" else resp.content
-    fixed_code = fixed_code.replace("```typescript", "").replace("```", "").strip()
-    
+    details = "\n\n".join(format_failure(f) for f in failures)
+    return f"""
+    Fix Playwright Selector Errors.
+    FAILURES:
+    {details}
+    CODE: {code}
+    Task: Replace the failing locator with one that matches an element in the page snapshot
+    (prefer getByRole/getByLabel/getByText with the exact accessible name). Keep everything else.{hints}
+    RETURN ONLY FULL FIXED CODE.
+    """
+
+def _fixed_code(prompt, config):
+    resp = get_ai_response([{"role": "user", "content": prompt}], config=config)
+    fixed_code = extract_ai_text(resp) or ""
+    return fixed_code.replace("```typescript", "").replace("```", "").strip()
+
+def heal_code(pom_path, error_log, config=None, failures=None):
+    """
+    Rewrites the POM to fix the failing selectors.
+    failures: structured details (see utils.reporter.collect_failures); with them the
+    model picks locators that exist in the captured page snapshot instead of guessing.
+    Returns True if the file changed.
+    """
+    print(f"❤️‍🩹 Healing POM: {pom_path}")
+    with open(pom_path, "r") as f: code = f.read()
+
+    fixed_code = _fixed_code(_heal_prompt(code, error_log, failures), config)
+
+    if not fixed_code or fixed_code == code.strip():
+        print("⚠️ Healer returned no changes.")
+        return False
+
     with open(pom_path, "w") as f: f.write(fixed_code)
-    print("✅ POM Patched.")
\ No newline at end of file
+    print("✅ POM Patched.")
+    return True
+
+def propose_fixes(pom_path, error_log, config=None, failures=None, k=HEAL_CANDIDATES, previous_attempts=None):
+    """
+    Speculative healing: asks for k alternative fixes at once, spread over the
+    configured providers (see core.ai.failover_chain) and HEAL_STRATEGIES, and
+    type-checks them together in one request. Returns [(label, code)] of the valid, distinct
+    candidates; the POM itself is not touched.
+    """
+    with open(pom_path, "r") as f: code = f.read()
+    class_name = os.path.basename(pom_path).replace("Page.ts", "").replace(".ts", "")
+    configs = failover_chain(config or get_default_config())
+    print(f"❤️‍🩹 Requesting {k} candidate fixes for {os.path.basename(pom_path)}...")
+
+    def candidate(i):
+        cfg = configs[i % len(configs)]
+        strategy = HEAL_STRATEGIES[i % len(HEAL_STRATEGIES)]
+        label = f"#{i + 1} {cfg.provider}/{cfg.model_name}"
+        try:
+            fixed = _fixed_code(_heal_prompt(code, error_log, failures, strategy, previous_attempts), cfg)
+        except Exception as e:
+            print(f"   ⚠️ Candidate {label} failed: {e}")
+            return None
+        if not fixed or fixed == code.strip():
+            return None
+        return label, fixed
+
+    with ThreadPoolExecutor(max_workers=k) as pool:
+        results = list(pool.map(candidate, range(k)))
+
+    proposed, seen = [], set()
+    for result in results:
+        if result and result[1] not in seen:
+            seen.add(result[1])
+            proposed.append(result)
+
+    candidates = []
+    checks = validator.validate_pom_candidates([fixed for _, fixed in proposed], class_name) if proposed else []
+    for (label, fixed), (is_valid, msg) in zip(proposed, checks):
+        if is_valid:
+            candidates.append((label, fixed))
+        else:
+            print(f"   ⚠️ Candidate {label} rejected: {msg.splitlines()[0]}")
+    print(f"   ✅ {len(candidates)}/{k} candidates passed validation.")
+    return candidates
@@ -1,6 +1,12 @@
 import os
 import re
-from core.ai import get_ai_response, set_active_model
+import json
+import time
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from core.ai import ModelConfig
+from core.llm_cache import get_ai_text
 from utils.validator import PlaywrightValidator
 
 # Setup Path to Server
@@ -10,27 +16,108 @@ SERVER_DIR = os.path.join(BASE_DIR, "ai-browser-automation", "playwright-server"
 
 validator = PlaywrightValidator(SERVER_DIR)
 
-def optimize_code(file_path, file_type="POM"):
+# Optimization requires reasoning, not just speed.
+# Ensure you have 'models/gemini-1.5-pro' in your list_models() capabilities
+OPTIMIZER_MODEL_CONFIG = ModelConfig("gemini", "models/gemini-1.5-pro")
+
+# --- CONFIGURATION FROM ENV ---
+_CLIENT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+OPTIMIZED_RECORD_PATH = os.getenv("OPTIMIZER_RECORD_PATH", os.path.join(_CLIENT_ROOT, ".ai_cache", "optimized.json"))
+OPTIMIZER_WORKERS = int(os.getenv("OPTIMIZER_WORKERS", "2"))
+# "0": workflows hand files to the queue and finish without waiting for the optimizer
+OPTIMIZER_WAIT = os.getenv("OPTIMIZER_WAIT", "1") == "1"
+
+def content_hash(code):
+    return hashlib.sha256(code.encode("utf-8")).hexdigest()
+
+class OptimizedRecord:
+    """
+    Applied optimizations by input sha256, stored as one JSON file:
+        {"<input sha256>":  {"file": "LoginPage.ts", "output": "<optimized code>", "at": 1700000000.0},
+         "<output sha256>": {"file": "LoginPage.ts", "output": null, "at": 1700000000.0}}
+    A regenerated, byte-identical input gets its stored output back without the
+    model; output null marks code that already is an optimizer result.
+    """
+    def __init__(self, path=OPTIMIZED_RECORD_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._hashes = None
+
+    def _load(self):
+        if self._hashes is None:
+            try:
+                with open(self.path, "r") as f:
+                    self._hashes = json.load(f)
+            except (OSError, ValueError):
+                self._hashes = {}
+        return self._hashes
+
+    def get(self, code):
+        """Entry for this exact content or None."""
+        with self._lock:
+            return self._load().get(content_hash(code))
+
+    def add(self, original_code, optimized_code, file_name):
+        with self._lock:
+            now = time.time()
+            self._load()[content_hash(original_code)] = {"file": file_name, "output": optimized_code, "at": now}
+            self._hashes[content_hash(optimized_code)] = {"file": file_name, "output": None, "at": now}
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            tmp_path = self.path + ".tmp"
+            with open(tmp_path, "w") as f:
+                json.dump(self._hashes, f, indent=2)
+            os.replace(tmp_path, self.path)
+
+optimized_record = OptimizedRecord()
+
+# (provider, model, input sha256) whose answer failed validation. The cached answer
+# would fail the same way, so it is not asked again, but only for this process.
+_discarded = set()
+_discarded_lock = threading.Lock()
+
+def optimize_code(file_path, file_type="POM", config=None, bypass_cache=False):
     """
     Reads a file, sends it to the AI for a 'Senior QA Code Review',
     validates the output, and overwrites the file if improved.
     
     file_type: "POM" or "Spec"
+    config: ModelConfig to use, defaults to the Pro model (OPTIMIZER_MODEL_CONFIG)
+    bypass_cache: always ask the model, even if this exact file was optimized before
+
+    Returns "skipped", "reused" (stored output of an earlier run written back),
+    "applied", "discarded", "stale" (file changed meanwhile, left alone) or None
+    (missing file / AI error).
     """
     if not os.path.exists(file_path):
         print(f"❌ Error: File not found at {file_path}")
         return
 
     filename = os.path.basename(file_path)
-    print(f"\n✨ QA Optimizer is analyzing: {filename}...")
-    
+
     with open(file_path, "r") as f:
         original_code = f.read()
 
-    # 1. Switch to Smart Model (Pro) for Refactoring
-    # Optimization requires reasoning, not just speed.
-    # Ensure you have 'models/gemini-1.5-pro' in your list_models() capabilities
-    set_active_model("gemini", "models/gemini-1.5-pro")
+    # 0. Byte-identical to an optimizer result, or to an input it already optimized
+    known = None if bypass_cache else optimized_record.get(original_code)
+    if known and not known.get("output"):
+        print(f"\n⏭️  QA Optimizer: {filename} is already optimized.")
+        return "skipped"
+    if known:
+        # Validated when it was first applied: no model call, no re-validation
+        with open(file_path, "w") as f:
+            f.write(known["output"])
+        print(f"\n♻️  QA Optimizer: reused the earlier optimization of {filename}.")
+        return "reused"
+
+    # 1. Use the Smart Model (Pro) for Refactoring unless the caller picked one
+    config = config or OPTIMIZER_MODEL_CONFIG
+    discard_key = (config.provider, config.model_name, content_hash(original_code))
+    with _discarded_lock:
+        if not bypass_cache and discard_key in _discarded:
+            print(f"\n⏭️  QA Optimizer: {filename} was already tried with {config.model_name} in this run.")
+            return "skipped"
+
+    print(f"\n✨ QA Optimizer is analyzing: {filename}...")
 
     # 2. Define the Persona and Rules based on file type
     if file_type == "POM":
@@ -67,25 +154,15 @@ def optimize_code(file_path, file_type="POM"):
         {"role": "user", "content": f"CURRENT CODE:\n{original_code}"}
     ]
 
-    # 3. Get Optimized Code
+    # 3. Get Optimized Code (cached per model + exact input code)
     try:
-        resp = get_ai_response(messages)
-        
-        # Handle different response structures safely
-        if hasattr(resp, 'text'):
-            optimized_code = resp.text
-        elif hasattr(resp, 'content'):
-            if isinstance(resp.content, list):
-                optimized_code = resp.content[0].text
-            else:
-                optimized_code = str(resp.content)
-        else:
-            # Fallback
-            optimized_code = str(resp)
-
+        optimized_code = get_ai_text(messages, config=config, bypass_cache=bypass_cache)
     except Exception as e:
         print(f"   ❌ AI Error during optimization: {e}")
-        set_active_model("gemini", "models/gemini-1.5-flash") # Reset
+        return
+
+    if not optimized_code:
+        print("   ⚠️ Optimization skipped. AI returned no code.")
         return
 
     # Clean Markdown formatting
@@ -97,7 +174,8 @@ def optimize_code(file_path, file_type="POM"):
     err_msg = ""
 
     if file_type == "POM":
-        class_name = filename.replace(".ts", "")
+        # validate_pom expects the base name: LoginPage.ts -> class LoginPage
+        class_name = filename.replace("Page.ts", "").replace(".ts", "")
         is_valid, err_msg = validator.validate_pom(optimized_code, class_name)
     else:
         # For specs, extract the POM class name from imports to validate
@@ -107,12 +185,69 @@ def optimize_code(file_path, file_type="POM"):
 
     # 5. Apply Changes
     if is_valid:
+        # A heal or a regeneration may have rewritten the file while the model was thinking
+        with open(file_path, "r") as f:
+            if f.read() != original_code:
+                print(f"   ⚠️ Optimization dropped. {filename} changed while it was being optimized.")
+                return "stale"
         with open(file_path, "w") as f:
             f.write(optimized_code)
         print(f"   ✅ Optimization successfully applied.")
+        optimized_record.add(original_code, optimized_code, filename)
+        return "applied"
     else:
         print(f"   ⚠️ Optimization discarded. AI produced invalid code.")
         print(f"      Reason: {err_msg}")
+        with _discarded_lock:
+            _discarded.add(discard_key)
+        return "discarded"
+
+class OptimizerQueue:
+    """
+    Background optimize_code jobs on a bounded pool of worker threads.
+    submit() returns a concurrent.futures.Future; a file already waiting in the
+    queue is not queued twice. drain() blocks until everything submitted is done.
+    """
+    def __init__(self, workers=OPTIMIZER_WORKERS):
+        self._executor = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="optimizer")
+        self._lock = threading.Lock()
+        self._queued = {}           # file path -> Future not yet started
+        self._futures = set()
+        self.stats = {"submitted": 0, "applied": 0, "discarded": 0, "skipped": 0, "reused": 0, "stale": 0, "failed": 0}
+
+    def submit(self, file_path, file_type="POM", config=None, bypass_cache=False):
+        with self._lock:
+            self.stats["submitted"] += 1
+            if file_path in self._queued:
+                return self._queued[file_path]
+            future = self._executor.submit(self._run, file_path, file_type, config, bypass_cache)
+            self._queued[file_path] = future
+            self._futures.add(future)
+            future.add_done_callback(self._futures.discard)
+            return future
+
+    def _run(self, file_path, file_type, config, bypass_cache):
+        with self._lock:
+            # Started: a later submit must queue a fresh run on the newer content
+            self._queued.pop(file_path, None)
+        try:
+            result = optimize_code(file_path, file_type=file_type, config=config, bypass_cache=bypass_cache)
+        except Exception as e:
+            print(f"   ❌ Optimizer job failed for {os.path.basename(file_path)}: {e}")
+            result = None
+        with self._lock:
+            self.stats[result if result in self.stats else "failed"] += 1
+        return result
+
+    def pending(self):
+        return len(self._futures)
+
+    def drain(self, timeout=None):
+        """Waits for every submitted job. Call before running or healing the generated files."""
+        # Worker threads discard finished futures from the set
+        with self._lock:
+            futures = list(self._futures)
+        for future in futures:
+            future.result(timeout=timeout)
 
-    # 6. Reset Model
-    set_active_model("gemini", "models/gemini-1.5-flash")
\ No newline at end of file
+optimizer_queue = OptimizerQueue()
\ No newline at end of file
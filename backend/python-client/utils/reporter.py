@@ -1,3 +1,4 @@
+import re
 import json
 import os
 import webbrowser
@@ -73,9 +74,69 @@ def _process_suite(suite, summary):
     for child_suite in suite.get("suites", []):
         _process_suite(child_suite, summary)
 
+# Playwright prints the locator it was waiting for in the error message
+_LOCATOR_PATTERNS = [
+    re.compile(r"^\s*Locator:\s*(.+)$", re.M),
+    re.compile(r"waiting for ((?:locator|getBy\w+)\(.+)$", re.M),
+]
+SNAPSHOT_MAX_CHARS = 6000
+
+def collect_failures(report):
+    """
+    Structured details of every failed test in a Playwright JSON report:
+    error, failing locator, source location/snippet, the page accessibility
+    snapshot at the failure (error-context attachment) and the retained trace.
+    """
+    failures = []
+
+    def visit(suite):
+        for spec in suite.get("specs", []):
+            for test in spec.get("tests", []):
+                if not test.get("results"):
+                    continue
+                last_run = test["results"][-1]
+                if last_run.get("status") in ("passed", "skipped"):
+                    continue
+                failures.append(_failure_details(spec, last_run))
+        for child_suite in suite.get("suites", []):
+            visit(child_suite)
+
+    for suite in report.get("suites", []):
+        visit(suite)
+    return failures
+
+def _failure_details(spec, run):
+    error = run.get("error") or (run.get("errors") or [{}])[0]
+    message = _strip_ansi(error.get("message", "Unknown Error"))
+    locator = None
+    for pattern in _LOCATOR_PATTERNS:
+        match = pattern.search(message)
+        if match:
+            locator = match.group(1).strip()
+            break
+
+    attachments = {a.get("name"): a for a in run.get("attachments", [])}
+    snapshot = None
+    context_path = (attachments.get("error-context") or {}).get("path")
+    if context_path and os.path.exists(context_path):
+        with open(context_path, "r", encoding="utf-8", errors="replace") as f:
+            snapshot = f.read()[:SNAPSHOT_MAX_CHARS]
+
+    return {
+        "file": spec.get("file"),
+        "title": spec.get("title"),
+        "status": run.get("status"),
+        "error": message,
+        "locator": locator,
+        "location": error.get("location"),
+        "snippet": _strip_ansi(error.get("snippet", "")) or None,
+        "stack": _strip_ansi(error.get("stack", ""))[:2000] or None,
+        "page_snapshot": snapshot,
+        "trace_path": (attachments.get("trace") or {}).get("path"),
+    }
+
 def _strip_ansi(text):
     """Removes ANSI escape codes (colors) from Playwright error output."""
-    import re
     ansi_escape = re.compile(r'\x1B(?:[@-Z\\-_]|\[[0-?]*[ -/]*[@-~])')
     return ansi_escape.sub('', text)
 
@@ -0,0 +1,151 @@
+import os
+import json
+import time
+import itertools
+import threading
+import subprocess
+from concurrent.futures import Future
+
+# --- CONFIGURATION FROM ENV ---
+TS_VALIDATION_ENABLED = os.getenv("TS_VALIDATION", "1") == "1"
+# First request loads the TypeScript libs and can take a few seconds; later ones are fast
+TS_SERVICE_TIMEOUT_SECONDS = float(os.getenv("TS_SERVICE_TIMEOUT_SECONDS", "30"))
+# After a failed start the service is retried after this long, doubling up to TS_SERVICE_MAX_BACKOFF_SECONDS
+TS_SERVICE_RETRY_SECONDS = float(os.getenv("TS_SERVICE_RETRY_SECONDS", "15"))
+TS_SERVICE_MAX_BACKOFF_SECONDS = float(os.getenv("TS_SERVICE_MAX_BACKOFF_SECONDS", "600"))
+
+# logic: current_file -> utils -> python-client -> root -> playwright-server
+_PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+SERVER_DIR = os.path.join(_PROJECT_ROOT, "playwright-server")
+SERVICE_SCRIPT = os.path.join(SERVER_DIR, "src", "tsc-service.ts")
+
+class TsService:
+    """
+    Client for the playwright-server TypeScript language service (src/tsc-service.ts).
+
+    One node process for the whole Python process. check() sends a batch of
+    {relative path: code} and returns {path: [diagnostic dicts]}. Calls from
+    several threads are pipelined over the same process. Returns None whenever
+    the service is unavailable, so callers can fall back to simpler checks; a
+    service that failed to start is retried with backoff.
+    """
+    def __init__(self, server_dir=SERVER_DIR, timeout=TS_SERVICE_TIMEOUT_SECONDS):
+        self.server_dir = server_dir
+        self.timeout = timeout
+        self.disabled = not TS_VALIDATION_ENABLED
+        self._failures = 0          # Failed starts in a row
+        self._retry_at = 0.0        # No start attempt before this (time.monotonic)
+        self._process = None
+        self._pending = {}          # request id -> Future
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def _start(self):
+        """Spawns the service and waits for its ready line. Caller holds the lock."""
+        if self._process and self._process.poll() is None:
+            return True
+        if time.monotonic() < self._retry_at:
+            return False
+        ready = Future()
+        try:
+            self._process = subprocess.Popen(
+                ["npx", "tsx", SERVICE_SCRIPT],
+                cwd=self.server_dir,
+                stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+                text=True, bufsize=1,
+                shell=True if os.name == 'nt' else False,
+            )
+        except OSError as e:
+            self._backoff(f"unavailable ({e})")
+            return False
+
+        threading.Thread(target=self._read_loop, args=(self._process, ready), daemon=True).start()
+        try:
+            info = ready.result(timeout=self.timeout)
+            print(f"🧩 TypeScript service ready (typescript {info.get('typescript')})")
+            self._failures = 0
+            return True
+        except Exception:
+            self._process.kill()
+            self._backoff("did not start")
+            return False
+
+    def _backoff(self, reason):
+        """Basic validation only until the next start attempt. Caller holds the lock."""
+        delay = min(TS_SERVICE_RETRY_SECONDS * 2 ** self._failures, TS_SERVICE_MAX_BACKOFF_SECONDS)
+        self._failures += 1
+        self._retry_at = time.monotonic() + delay
+        print(f"⚠️ TypeScript service {reason}, using basic validation (retrying in {delay:.0f}s).")
+
+    def _read_loop(self, process, ready):
+        for line in process.stdout:
+            try:
+                message = json.loads(line)
+            except ValueError:
+                continue
+            if message.get("ready"):
+                ready.set_result(message)
+                continue
+            future = self._pending.pop(message.get("id"), None)
+            if future is None:
+                continue
+            if "error" in message:
+                future.set_exception(RuntimeError(message["error"]))
+            else:
+                future.set_result(message["results"])
+        # Process exited: nothing pending will ever be answered
+        if not ready.done():
+            ready.set_exception(RuntimeError("TypeScript service exited"))
+        for future in list(self._pending.values()):
+            if not future.done():
+                future.set_exception(RuntimeError("TypeScript service exited"))
+
+    def check(self, files):
+        """{relative path (from playwright-server): code} -> {path: [diagnostics]} or None."""
+        if self.disabled or not files:
+            return None
+        with self._lock:
+            if not self._start():
+                return None
+            request_id = next(self._ids)
+            future = self._pending[request_id] = Future()
+            try:
+                request = {"id": request_id, "files": [{"path": p, "code": c} for p, c in files.items()]}
+                self._process.stdin.write(json.dumps(request) + "\n")
+                self._process.stdin.flush()
+            except OSError as e:
+                self._pending.pop(request_id, None)
+                print(f"⚠️ TypeScript service write failed: {e}")
+                return None
+        try:
+            return future.result(timeout=self.timeout)
+        except Exception as e:
+            self._pending.pop(request_id, None)
+            print(f"⚠️ TypeScript check failed: {e}")
+            return None
+
+    def close(self):
+        with self._lock:
+            if self._process and self._process.poll() is None:
+                self._process.stdin.close()
+                try:
+                    self._process.wait(timeout=5)
+                except subprocess.TimeoutExpired:
+                    self._process.kill()
+
+_SERVICE = None
+_SERVICE_LOCK = threading.Lock()
+
+def get_ts_service():
+    """Shared service instance, started on first use."""
+    global _SERVICE
+    with _SERVICE_LOCK:
+        if _SERVICE is None:
+            _SERVICE = TsService()
+        return _SERVICE
+
+def format_diagnostics(diagnostics):
+    """Diagnostics as the lines handed to the fixing prompt."""
+    return "\n".join(
+        f"TS{d['code']} (line {d['line']}:{d['column']}): {d['message']}" for d in diagnostics
+    )
@@ -1,14 +1,48 @@
 import re
 import os
+from utils.ts_service import get_ts_service, format_diagnostics
+
+# Unresolved relative imports are left to the rule checks: a spec is validated
+# while its POM may still be generating
+_RELATIVE_IMPORT_MISSING = re.compile(r"Cannot find module '\.\.?/")
 
 class PlaywrightValidator:
-    def __init__(self, server_dir):
+    def __init__(self, server_dir, ts_service=None):
         self.server_dir = server_dir
         self.pages_dir = os.path.join(server_dir, "tests", "pages")
+        # Real type-checking; the rule checks below still run when it is unavailable
+        self.ts_service = ts_service or get_ts_service()
 
-    def validate_spec(self, code, pom_class_name):
+    def type_check(self, files):
+        """
+        Batched TypeScript check of {path relative to playwright-server: code}.
+        Returns {path: [error messages]}, or None when the service is unavailable.
+        """
+        results = self.ts_service.check(files)
+        if results is None:
+            return None
+        errors = {}
+        for path, diagnostics in results.items():
+            diagnostics = [d for d in diagnostics
+                           if d["category"] == "error" and not (d["code"] == 2307 and _RELATIVE_IMPORT_MISSING.search(d["message"]))]
+            errors[path] = [format_diagnostics([d]) for d in diagnostics]
+        return errors
+
+    def _results(self, files):
+        """
+        [(path, code, rule errors)] -> [(is_valid, message)] in the same order,
+        with one type-check request for all files (they can import each other).
+        """
+        type_errors = self.type_check({path: code for path, code, _ in files}) or {}
+        results = []
+        for path, _, errors in files:
+            errors = errors + type_errors.get(path, [])
+            results.append((False, "\n".join(errors)) if errors else (True, "Valid"))
+        return results
+
+    def _spec_rules(self, code, pom_class_name):
         errors = []
-        
+
         # RULE: Specific Playwright Import
         # Allows "playwright/test" OR "@playwright/test" based on your setup
         if 'from "playwright/test"' not in code and 'from "@playwright/test"' not in code:
@@ -21,19 +55,33 @@ class PlaywrightValidator:
         # RULE: Test Block
         if "test(" not in code or "await" not in code:
             errors.append("SYNTAX ERROR: Missing valid test(...) block or async/await.")
+        return errors
 
-        if errors:
-            return False, "\n".join(errors)
-        return True, "Valid"
-
-    def validate_pom(self, code, class_name):
+    def _pom_rules(self, code, class_name):
         errors = []
         if f"class {class_name}Page" not in code:
             errors.append(f"SYNTAX ERROR: Expected 'class {class_name}Page'")
-        
+
         if "readonly page" not in code and "private page" not in code:
             errors.append("LOGIC ERROR: Constructor must accept 'page'.")
+        return errors
+
+    def validate_spec(self, code, pom_class_name):
+        # Type-check in place of the spec, so '../pages/...' imports resolve
+        path = f"tests/specs/{pom_class_name}.spec.ts"
+        return self._results([(path, code, self._spec_rules(code, pom_class_name))])[0]
+
+    def validate_pom(self, code, class_name):
+        # Checked under its real path so relative imports resolve; disk is not touched
+        path = f"tests/pages/{class_name}Page.ts"
+        return self._results([(path, code, self._pom_rules(code, class_name))])[0]
 
-        if errors:
-            return False, "\n".join(errors)
-        return True, "Valid"
\ No newline at end of file
+    def validate_pom_candidates(self, codes, class_name):
+        """
+        Alternative versions of one POM (heal candidates) in a single type-check
+        request, each under its own path next to the real one. [(is_valid, message)].
+        """
+        return self._results([
+            (f"tests/pages/.candidate-{i}/{class_name}Page.ts", code, self._pom_rules(code, class_name))
+            for i, code in enumerate(codes)
+        ])
@@ -0,0 +1,133 @@
+import os
+import json
+import time
+import asyncio
+import xml.etree.ElementTree as ET
+from core.mcp_pool import McpSessionPool, CONTEXTS_PER_SERVER
+from workflow.engine import WorkflowEngine
+from workflow.nodes import FixtureLoaderNode, PlaywrightAgentNode, VerifiedPomNode, VerifiedSpecNode
+from workflow.trace_store import fixture_hash
+from workflow.checkpoint import checkpoint_key
+from core.execution_profile import get_profile
+from utils.optimizer import optimizer_queue, OPTIMIZER_WAIT
+
+# --- CONFIGURATION FROM ENV ---
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", "3"))
+SERVER_DIR = os.path.abspath(os.path.join(os.getcwd(), "../playwright-server"))
+REPORT_DIR = os.path.join(SERVER_DIR, "batch-results")
+
+def build_fixture_workflow(file_path, model_config=None, pool=None, profile=None, rerun_from=None,
+                           wait_for_optimizer=OPTIMIZER_WAIT):
+    """
+    The standard fixture pipeline: Loader -> Agent -> (Verified POM || Verified Spec).
+    Checkpointed per fixture file, content and profile, so a rerun resumes after the last completed node
+    (rerun_from="VerifiedPomNode" etc. forces that node and its dependents to run again).
+    wait_for_optimizer=False finishes as soon as the files are written; the optimizer
+    queue keeps refining them in the background.
+    """
+    try:
+        run_key = checkpoint_key(file_path, fixture_hash(file_path), get_profile(profile).name)
+    except OSError:
+        run_key = None   # The loader node reports the missing file
+    engine = WorkflowEngine(model_config=model_config, pool=pool, profile=profile,
+                            checkpoint_key=run_key, rerun_from=rerun_from)
+    # Node 1: Load the File
+    engine.add_node(FixtureLoaderNode(file_path))
+    # Node 2: AI Agent Execution (Drives Browser & Records Actions)
+    engine.add_node(PlaywrightAgentNode())
+    # Node 3 + 4: Verified POM and Spec (From Recorded Actions), independent so they run concurrently
+    engine.add_node(VerifiedPomNode(wait_for_optimizer=wait_for_optimizer))
+    engine.add_node(VerifiedSpecNode(wait_for_optimizer=wait_for_optimizer))
+    return engine
+
+async def run_batch(files, concurrency=BATCH_CONCURRENCY, model_config=None, report_dir=REPORT_DIR, profile=None,
+                    rerun_from=None, wait_for_optimizer=OPTIMIZER_WAIT):
+    """
+    Runs the fixture pipeline over many markdown files, at most `concurrency` at a time.
+    Every run gets its own WorkflowContext and its own leased browser context,
+    so fixtures cannot see each other's state.
+    Writes batch-summary.json and batch-junit.xml into report_dir and returns the summary.
+    """
+    if not files:
+        print("❌ No fixtures to run.")
+        return None
+
+    concurrency = max(1, min(concurrency, len(files)))
+    print(f"\n📦 Batch run: {len(files)} fixtures, concurrency {concurrency}")
+
+    semaphore = asyncio.Semaphore(concurrency)
+    batch_start = time.perf_counter()
+
+    async def run_one(file_path):
+        async with semaphore:
+            fixture = os.path.basename(file_path)
+            print(f"\n▶️  [{fixture}] started")
+            engine = build_fixture_workflow(file_path, model_config=model_config, pool=pool, profile=profile,
+                                            rerun_from=rerun_from, wait_for_optimizer=wait_for_optimizer)
+            start = time.perf_counter()
+            try:
+                await engine.run()
+            except Exception as e:
+                engine.context.mark_failed(str(e))
+            elapsed = time.perf_counter() - start
+            ctx = engine.context
+            status = "failed" if ctx.failed else "passed"
+            print(f"{'✅' if status == 'passed' else '❌'} [{fixture}] {status} in {elapsed:.1f}s")
+            return {
+                "fixture": fixture,
+                "path": file_path,
+                "test_name": ctx.test_name,
+                "status": status,
+                "error": ctx.error_message,
+                "seconds": round(elapsed, 3),
+                "recorded_actions": len(ctx.recorded_history),
+                "pom_path": ctx.pom_path,
+                "spec_path": ctx.spec_path,
+                "node_timings": ctx.node_timings,
+            }
+
+    # Runs share servers, one browser context each
+    servers = -(-concurrency // CONTEXTS_PER_SERVER)
+    async with McpSessionPool(size=servers, profile=profile) as pool:
+        results = await asyncio.gather(*(run_one(f) for f in files))
+
+    summary = {
+        "total": len(results),
+        "passed": sum(1 for r in results if r["status"] == "passed"),
+        "failed": sum(1 for r in results if r["status"] == "failed"),
+        "concurrency": concurrency,
+        "wall_seconds": round(time.perf_counter() - batch_start, 3),
+        "results": results,
+    }
+    write_batch_reports(summary, report_dir)
+    print(f"\n📊 Batch Summary: {summary['passed']} Passed | {summary['failed']} Failed | {summary['wall_seconds']:.1f}s total")
+    if optimizer_queue.pending():
+        print(f"✨ {optimizer_queue.pending()} optimizer jobs still running in the background.")
+    return summary
+
+def write_batch_reports(summary, report_dir=REPORT_DIR):
+    if not os.path.exists(report_dir): os.makedirs(report_dir)
+
+    json_path = os.path.join(report_dir, "batch-summary.json")
+    with open(json_path, "w") as f:
+        json.dump(summary, f, indent=2)
+
+    suite = ET.Element("testsuite", {
+        "name": "workflow-batch",
+        "tests": str(summary["total"]),
+        "failures": str(summary["failed"]),
+        "time": f"{summary['wall_seconds']:.3f}",
+    })
+    for r in summary["results"]:
+        case = ET.SubElement(suite, "testcase", {
+            "classname": "fixtures",
+            "name": r["fixture"],
+            "time": f"{r['seconds']:.3f}",
+        })
+        if r["status"] == "failed":
+            failure = ET.SubElement(case, "failure", {"message": str(r["error"] or "Workflow failed")})
+            failure.text = str(r["error"] or "")
+    junit_path = os.path.join(report_dir, "batch-junit.xml")
+    ET.ElementTree(suite).write(junit_path, encoding="utf-8", xml_declaration=True)
+
+    print(f"📝 Reports: {json_path} | {junit_path}")
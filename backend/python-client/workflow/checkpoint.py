@@ -0,0 +1,66 @@
+import os
+import json
+import time
+import hashlib
+
+# --- CONFIGURATION FROM ENV ---
+_CLIENT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CHECKPOINT_DIR = os.getenv("WORKFLOW_CHECKPOINT_DIR", os.path.join(_CLIENT_ROOT, ".ai_cache", "checkpoints"))
+CHECKPOINTS_ENABLED = os.getenv("WORKFLOW_CHECKPOINTS", "1") == "1"
+
+def checkpoint_key(file_path, content_hash, profile_name):
+    """
+    Run key: the fixture's content and its path (two files with the same steps get
+    their own test names and outputs) and the execution profile it ran under.
+    """
+    raw = json.dumps([content_hash, os.path.abspath(file_path), profile_name])
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+class CheckpointStore:
+    """
+    Outputs of completed workflow nodes, one JSON file per run key (see checkpoint_key):
+        {"nodes": {"<NodeName>": {"version", "completed_at", "outputs": {field: value}}}}
+    A checkpoint only counts for the node version that wrote it.
+    """
+    def __init__(self, directory=CHECKPOINT_DIR):
+        self.directory = directory
+
+    def path(self, key):
+        return os.path.join(self.directory, f"{key}.json")
+
+    def load(self, key):
+        """{node name: checkpoint} for this key ({} when there is none)."""
+        if not key or not os.path.exists(self.path(key)):
+            return {}
+        try:
+            with open(self.path(key), "r") as f:
+                return json.load(f)["nodes"]
+        except (OSError, ValueError, KeyError) as e:
+            print(f"⚠️ Ignoring unreadable checkpoint {key[:12]}: {e}")
+            return {}
+
+    def save_node(self, key, node, context):
+        """Stores the node's declared outputs as they are in the context now."""
+        nodes = self.load(key)
+        nodes[node.name] = {
+            "version": node.version,
+            "completed_at": time.time(),
+            "outputs": {field: getattr(context, field) for field in node.outputs},
+        }
+        self._write(key, nodes)
+
+    def drop_nodes(self, key, names):
+        nodes = self.load(key)
+        if any(n in nodes for n in names):
+            self._write(key, {n: c for n, c in nodes.items() if n not in names})
+
+    def _write(self, key, nodes):
+        os.makedirs(self.directory, exist_ok=True)
+        tmp_path = self.path(key) + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({"nodes": nodes}, f, indent=2)
+        os.replace(tmp_path, self.path(key))
+
+    def delete(self, key):
+        if key and os.path.exists(self.path(key)):
+            os.remove(self.path(key))
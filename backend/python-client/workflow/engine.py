@@ -1,63 +1,203 @@
+import time
 import asyncio
-import os
-import sys
-from mcp import ClientSession, StdioServerParameters
-from mcp.client.stdio import stdio_client
+from core.mcp_pool import McpSessionPool
 from workflow.state import WorkflowContext
+from workflow.checkpoint import CheckpointStore, CHECKPOINTS_ENABLED
 
 class WorkflowEngine:
-    def __init__(self):
+    """
+    Runs nodes as a dependency graph on one shared WorkflowContext.
+
+    A node depends on the most recent earlier node producing one of its
+    `inputs` (or on `depends_on`, if given). Nodes whose dependencies are done
+    run concurrently. When a node fails or times out, everything downstream of
+    it is cancelled; other branches finish (and see context.failed).
+
+    With a checkpoint_key (see workflow.checkpoint.checkpoint_key), the declared outputs of every
+    completed node are saved, and the next run restores them instead of
+    running the node again. rerun_from forces a node and everything after it
+    to run anyway.
+    """
+    def __init__(self, model_config=None, pool=None, profile=None,
+                 checkpoint_key=None, rerun_from=None, checkpoints=None):
         self.nodes = []
+        self.dependencies = {}      # node -> [nodes it waits for]
+        self.timeouts = {}          # node -> seconds (overrides node.timeout)
         self.context = WorkflowContext()
-        
-        # 1. Robustly find the server path relative to this script
-        # This handles running from 'python-client/' or root folder
-        base_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__))) # python-client root
-        server_script_path = os.path.join(base_dir, "../playwright-server/src/index.ts")
-        self.server_path = os.path.abspath(server_script_path)
-
-        # 2. Safety Check
-        if not os.path.exists(self.server_path):
-            # Fallback try for different cwd
-            self.server_path = os.path.abspath(os.path.join(os.getcwd(), "../playwright-server/src/index.ts"))
-            
-        if not os.path.exists(self.server_path):
-            print(f"❌ Critical Error: Cannot find Playwright Server at: {self.server_path}")
-
-    def add_node(self, node):
+        self.context.model_config = model_config
+        # Shared warm-session pool (e.g. the API server's). Without one, a
+        # private on-demand pool spawns a single server for this run.
+        self.pool = pool
+        # Browser settings for the leased context (ExecutionProfile or name, None = env default)
+        self.profile = profile
+        self._barrier = None        # Last node without declared inputs/outputs
+        # Checkpoint/resume (off without a key)
+        self.checkpoint_key = checkpoint_key if CHECKPOINTS_ENABLED else None
+        self.rerun_from = rerun_from
+        self.checkpoints = checkpoints or CheckpointStore()
+
+    def add_node(self, node, depends_on=None, timeout=None):
+        if depends_on is None:
+            depends_on = self._infer_dependencies(node)
+        self.dependencies[node] = list(depends_on)
+        if timeout is not None:
+            self.timeouts[node] = timeout
+        if not node.inputs and not node.outputs:
+            self._barrier = node
         self.nodes.append(node)
         return self
 
+    def _infer_dependencies(self, node):
+        if not node.inputs and not node.outputs:
+            # Undeclared node: keep the old strictly sequential behaviour
+            return list(self.nodes)
+        producers = {}
+        for earlier in self.nodes:
+            for field in earlier.outputs:
+                producers[field] = earlier
+        deps = [self._barrier] if self._barrier else []
+        for field in node.inputs:
+            producer = producers.get(field)
+            if producer and producer not in deps:
+                deps.append(producer)
+        return deps
+
+    def _downstream(self, node):
+        """Every node that (transitively) waits for `node`."""
+        found = []
+        for candidate in self.nodes:
+            if any(d is node or d in found for d in self.dependencies[candidate]):
+                found.append(candidate)
+        return found
+
     async def run(self):
         print("\n🚀 Starting Autonomous Test Run...")
-        
-        # 3. Define Server Parameters (using 'npx tsx' to run TypeScript directly)
-        server_params = StdioServerParameters(
-            command="npx",
-            args=["tsx", self.server_path],
-            env=os.environ # Pass API keys to server if needed
-        )
+
+        pool = self.pool or McpSessionPool(size=0)
 
         try:
-            # 4. Connect to MCP Server
-            async with stdio_client(server_params) as (read, write):
-                async with ClientSession(read, write) as session:
-                    await session.initialize()
-                    
-                    # 5. Run the Pipeline Nodes
-                    for node in self.nodes:
-                        # Execute the node logic
-                        await node.execute(self.context, session=session)
-                        
-                        # Stop immediately if a node marks the context as failed
-                        if self.context.failed:
-                            print(f"\n⛔ Workflow Halted: {self.context.error_message}")
-                            break
-                            
+            # 1. Restore whatever the last run of this fixture already finished
+            restored = self._restore_checkpoints()
+            if len(restored) == len(self.nodes):
+                # Nothing left that needs a browser
+                await self._run_graph(None, restored)
+            else:
+                # 2. Lease an isolated browser context on a ready MCP server
+                async with pool.lease(profile=self.profile) as session:
+                    # 3. Run the Pipeline Graph
+                    await self._run_graph(session, restored)
+
             if not self.context.failed:
                 print("\n✅ Test Run Completed Successfully.")
                 return self.context
 
         except Exception as e:
             print(f"\n🔥 Engine Critical Error: {e}")
-            self.context.mark_failed(str(e))
\ No newline at end of file
+            self.context.mark_failed(str(e))
+        finally:
+            if pool is not self.pool:
+                await pool.close()
+
+    def _restore_checkpoints(self):
+        """Loads checkpointed outputs into the context, returns the restored nodes."""
+        if not self.checkpoint_key:
+            return set()
+
+        rerun = set()
+        if self.rerun_from:
+            start = next((n for n in self.nodes if n.name == self.rerun_from), None)
+            if start is None:
+                print(f"⚠️ Unknown node '{self.rerun_from}' (have: {', '.join(n.name for n in self.nodes)}), re-running everything.")
+                rerun = set(self.nodes)
+            else:
+                rerun = {start, *self._downstream(start)}
+            # Forced nodes must not come back from stale checkpoints if this run fails
+            self.checkpoints.drop_nodes(self.checkpoint_key, {n.name for n in rerun})
+
+        saved = self.checkpoints.load(self.checkpoint_key)
+        restored = set()
+        for node in self.nodes:
+            checkpoint = saved.get(node.name)
+            if (node in rerun or not node.outputs or not checkpoint
+                    or checkpoint.get("version") != node.version
+                    or any(d not in restored for d in self.dependencies[node])):
+                continue
+            for field, value in checkpoint["outputs"].items():
+                setattr(self.context, field, value)
+            if node.checkpoint_valid(self.context):
+                restored.add(node)
+
+        if restored:
+            names = [n.name for n in self.nodes if n in restored]
+            print(f"♻️  Resuming from checkpoint ({self.checkpoint_key[:12]}): {', '.join(names)}")
+        return restored
+
+    async def _run_graph(self, session, restored=()):
+        status = {}
+        tasks = {}
+        attributed = set()          # Error messages already blamed on a node
+        timings = self.context.node_timings = []
+        run_start = time.perf_counter()
+
+        def record(node, result, started):
+            status[node] = result
+            timings.append({
+                "node": node.name,
+                "status": result,
+                "start": round(started - run_start, 3),
+                "seconds": round(time.perf_counter() - started, 3),
+            })
+
+        async def run_node(node):
+            started = time.perf_counter()
+            if node in restored:
+                record(node, "restored", started)
+                return
+            try:
+                deps = self.dependencies[node]
+                if deps:
+                    # asyncio.wait, not gather: cancelling this node must not cancel shared upstream tasks
+                    await asyncio.wait([tasks[d] for d in deps])
+                # Skip when an upstream node did not succeed or the run already failed
+                if any(status.get(d) not in ("ok", "restored") for d in deps) or self.context.failed:
+                    record(node, "skipped", started)
+                    return
+
+                started = time.perf_counter()
+                timeout = self.timeouts.get(node, node.timeout)
+                try:
+                    await asyncio.wait_for(node.execute(self.context, session=session), timeout)
+                    # A sibling branch failing meanwhile does not fail this node
+                    own_failure = self.context.failed and self.context.error_message not in attributed
+                    result = "failed" if own_failure else "ok"
+                except asyncio.TimeoutError:
+                    result = "timeout"
+                    self.context.mark_failed(f"{node.name} timed out after {timeout}s")
+                except Exception as e:
+                    result = "failed"
+                    self.context.mark_failed(f"{node.name}: {e}")
+            except asyncio.CancelledError:
+                record(node, "cancelled", started)
+                raise
+
+            record(node, result, started)
+            if result == "ok" and self.checkpoint_key and node.outputs:
+                self.checkpoints.save_node(self.checkpoint_key, node, self.context)
+            if result != "ok":
+                attributed.add(self.context.error_message)
+                print(f"\n⛔ Workflow Halted at {node.name}: {self.context.error_message}")
+                for downstream in self._downstream(node):
+                    task = tasks.get(downstream)
+                    if task and not task.done():
+                        task.cancel()
+
+        for node in self.nodes:
+            tasks[node] = asyncio.create_task(run_node(node))
+        await asyncio.gather(*tasks.values(), return_exceptions=True)
+
+        self._print_timings(time.perf_counter() - run_start)
+
+    def _print_timings(self, total):
+        print(f"\n⏱️  Node Timings (wall {total:.2f}s):")
+        for t in sorted(self.context.node_timings, key=lambda t: t["start"]):
+            print(f"   {t['node']:<22} {t['status']:<10} +{t['start']:>7.2f}s  {t['seconds']:>7.2f}s")
@@ -1,14 +1,19 @@
 import os
+import re
 import json
+import time
 import asyncio
 from abc import ABC, abstractmethod
 from workflow.state import WorkflowContext
 from utils.file_parser import read_test_steps
 # UPDATE IMPORT: Add parse_ai_response
-from core.ai import get_ai_response, parse_ai_response 
-from core.mcp_client import create_mcp_connection
-from utils.generators import generate_pom_code, generate_spec_code
-from utils.optimizer import optimize_code
+from core.ai import get_ai_response_async, parse_ai_response, extract_ai_text
+from core.mcp_client import get_tools_schema
+from core.memory import ConversationMemory
+from core.selector_memory import get_selector_memory
+from workflow.trace_store import TraceStore, fixture_hash, REPLAY_ENABLED
+from utils.generators import generate_pom_code, generate_spec_code, pom_class_name
+from utils.optimizer import optimizer_queue, OPTIMIZER_WAIT
 
 # Paths
 BASE_DIR = os.path.dirname(os.path.dirname(os.getcwd()))
@@ -17,12 +22,31 @@ PAGES_DIR = os.path.join(SERVER_DIR, "tests", "pages")
 SPECS_DIR = os.path.join(SERVER_DIR, "tests", "specs")
 
 class BaseNode(ABC):
+    # WorkflowContext fields this node reads / writes. The engine wires the
+    # dependency graph from them; nodes declaring neither run strictly in order.
+    inputs = ()
+    outputs = ()
+    # Seconds before the engine gives up on the node (None = no limit)
+    timeout = None
+    # Bump when the node's logic changes: older checkpoints of it are ignored
+    version = 1
+
+    @property
+    def name(self):
+        return type(self).__name__
+
+    def checkpoint_valid(self, context):
+        """Called after restoring the node's outputs; False re-runs the node."""
+        return True
+
     @abstractmethod
     async def execute(self, context: WorkflowContext, session=None):
         pass
 
 # --- NODE 1: LOAD STEPS FROM MARKDOWN ---
 class FixtureLoaderNode(BaseNode):
+    outputs = ("steps_queue", "fixture_hash", "test_name")
+
     def __init__(self, file_path: str):
         self.file_path = file_path
 
@@ -34,6 +58,7 @@ class FixtureLoaderNode(BaseNode):
                 raise ValueError("File is empty or contains no steps.")
             
             context.steps_queue = steps
+            context.fixture_hash = fixture_hash(self.file_path)
             safe_name = os.path.basename(self.file_path).replace(".md", "").replace(" ", "_")
             context.test_name = safe_name
             
@@ -42,83 +67,302 @@ class FixtureLoaderNode(BaseNode):
             context.mark_failed(str(e))
 
 # --- NODE 2: EXECUTE STEPS VIA AI & PLAYWRIGHT --- 
+# Browser actions that end up in the POM
+RECORDED_ACTIONS = ["navigate", "click", "fill", "selectOption", "press"]
+# Planning mode: one LLM call plans the whole scenario, re-planned from the first failing step
+PLANNING_ENABLED = os.getenv("AGENT_PLANNING_MODE", "0") == "1"
+PLAN_MAX_REPLANS = int(os.getenv("AGENT_PLAN_MAX_REPLANS", "2"))
+# Per-step mode: LLM calls for one step, e.g. snapshot first, then click/fill by ref
+STEP_MAX_ROUNDS = int(os.getenv("AGENT_STEP_MAX_ROUNDS", "3"))
+# "(selector: #login)" the server appends when an element was targeted by snapshot ref
+_DURABLE_SELECTOR = re.compile(r"\(selector: (.+)\)\s*$")
+
+def durable_action(tool, args, result_text):
+    """
+    The action as it should be recorded: snapshot refs (e12) only exist for one page
+    load, so traces, POMs and selector memory get the server's durable selector instead.
+    """
+    if "ref" not in args:
+        return {"tool": tool, "args": args}
+    match = _DURABLE_SELECTOR.search(result_text or "")
+    if not match or match.group(1) == "none":
+        return {"tool": tool, "args": args}
+    durable = {k: v for k, v in args.items() if k != "ref"}
+    durable["selector"] = match.group(1)
+    return {"tool": tool, "args": durable}
+
 class PlaywrightAgentNode(BaseNode):
+    inputs = ("steps_queue", "fixture_hash", "test_name")
+    outputs = ("recorded_history",)
+
+    def __init__(self, replay=REPLAY_ENABLED, trace_store=None, planning=PLANNING_ENABLED, selector_memory=None):
+        # replay: re-run the stored trace of an unchanged fixture without the LLM
+        self.replay = replay
+        self.trace_store = trace_store or TraceStore()
+        # Selectors that worked for the same kind of step on the same page, in any fixture
+        self.selector_memory = selector_memory or get_selector_memory()
+        # planning: tool calls for all steps from one request instead of one request per step
+        self.planning = planning
+        self._plan = None
+        self._plans_left = 0
+
     async def execute(self, context: WorkflowContext, session=None):
         if context.failed: return
 
         # 1. Get Tools
         print("   🔌 Fetching Playwright Tools...")
-        tools = await session.list_tools()
-        tools_schema = []
-        for t in tools.tools:
-            # Handle PyDantic vs Dictionary schema structure
-            schema = getattr(t, 'inputSchema', getattr(t, 'input_schema', {}))
-            tools_schema.append({
-                "name": t.name,
-                "description": t.description,
-                "inputSchema": schema 
-            })
+        tools_schema = await get_tools_schema(session)
             
-        # 2. Initialize Chat History
-        messages = [{
+        # 2. Initialize Chat History (token-budgeted: instructions + current step always sent)
+        memory = ConversationMemory(system=[{
             "role": "user", 
-            "content": "You are a QA Automation Agent. Execute the test steps precisely using the provided tools."
-        }]
+            "content": "You are a QA Automation Agent. Execute the test steps precisely using the provided tools. "
+                       "When a step does not name an exact selector, call snapshot and click/fill by the element's ref. "
+                       "Reply with a short note once a step needs no further tool calls."
+        }])
+        model_name = context.model_config.model_name if context.model_config else None
+
+        # 3. Recorded trace of this exact fixture (keyed by content hash)
+        trace = self.trace_store.load(context.fixture_hash) if self.replay else None
+        if trace:
+            print(f"   📼 Replaying recorded trace ({len(trace)} steps, AI only for failing steps)")
+        step_traces = []
+        used_ai = False
+        clean = True    # No tool errors: the trace is worth replaying
+        self._plan = None
+        self._plans_left = 1 + PLAN_MAX_REPLANS
+        current_url = None  # Last navigated URL: the page memory lookups are keyed by
         
         total_steps = len(context.steps_queue)
         for i, step in enumerate(context.steps_queue):
             if context.failed: break
             print(f"\n▶️  Step {i+1}/{total_steps}: {step}")
-            messages.append({"role": "user", "content": f"Execute this step: {step}"})
-            
+            step_start = time.perf_counter()
+            memory.add({"role": "user", "content": f"Execute this step: {step}"}, current=True)
+
+            actions, failure = None, None
+            recorded = trace[i] if trace and i < len(trace) and trace[i]["step"] == step else None
+            if recorded is not None:
+                actions, failure = await self._run_actions(session, recorded["actions"], memory, "📼 Replay")
+                if actions is None:
+                    print("   ⚠️  Replay failed, asking the AI for this step.")
+
+            if actions is None:
+                remembered = self.selector_memory.resolve_step(current_url, step)
+                if remembered:
+                    actions, failure = await self._run_actions(session, remembered, memory, "🧠 Memory")
+                    if actions is None:
+                        self.selector_memory.forget_step(current_url, step, remembered)
+
+            if actions is None and self.planning:
+                used_ai = True
+                actions, failure = await self._run_planned_step(context, session, i, memory, tools_schema, failure)
+
+            if actions is None:
+                used_ai = True
+                actions, step_clean = await self._run_step_with_ai(context, session, step, memory, tools_schema, model_name)
+                if actions is None: break
+                clean = clean and step_clean
+
+            step_traces.append({"step": step, "actions": actions})
+            for action in actions:
+                if action["tool"] == "navigate": current_url = action["args"].get("url")
+            # Record for POM Generation
+            for action in actions:
+                if action["tool"] in RECORDED_ACTIONS:
+                    context.recorded_history.append({
+                        "action": action["tool"],
+                        "params": action["args"],
+                        "description": step
+                    })
+            print(f"   ⏱️  Step took {time.perf_counter() - step_start:.2f}s")
+
+        # 4. Persist the trace for the next run (only complete, successful runs)
+        if not context.failed and clean and context.fixture_hash and (used_ai or not trace):
+            self.trace_store.save(context.fixture_hash, context.test_name, step_traces)
+            print("   💾 Trace saved for replay.")
+        # 5. Remember the working selectors for other fixtures on the same pages
+        if not context.failed and clean:
+            self.selector_memory.learn_from_history(context.recorded_history)
+
+    async def _run_actions(self, session, actions, memory, label):
+        """
+        Runs recorded/planned tool calls without the LLM.
+        Returns (actions, None) on success, (None, failure description) on the first failure.
+        """
+        done = []
+        for action in actions:
+            print(f"   {label}: {action['tool']} {action['args']}")
+            try:
+                result = await session.call_tool(action["tool"], arguments=action["args"])
+            except Exception as e:
+                print(f"   ❌ {label} Error: {e}")
+                return None, f"{action['tool']} {json.dumps(action['args'])} raised: {e}"
+            result_text = str(result.content[0].text) if result.content else ""
+            # Keep the chat history in sync, the AI fallback needs to know what happened
+            memory.add({"role": "model", "content": f"I am calling {action['tool']}."})
+            memory.add({"role": "user", "content": f"Tool '{action['tool']}' returned: {result_text}"})
+            if result.isError:
+                print(f"   ❌ {label} Result: {result_text[:100]}")
+                return None, f"{action['tool']} {json.dumps(action['args'])} failed: {result_text}"
+            done.append(durable_action(action["tool"], action["args"], result_text))
+        return done, None
+
+    async def _run_planned_step(self, context, session, index, memory, tools_schema, failure=None):
+        """
+        Runs step `index` from the scenario plan. (Re)plans from this step when there is
+        no plan yet or the planned actions fail, up to PLAN_MAX_REPLANS times.
+        Returns (actions, failure); actions None means: fall back to per-step AI.
+        """
+        while True:
+            if self._plan is None:
+                if self._plans_left <= 0:
+                    return None, failure
+                self._plans_left -= 1
+                self._plan = await self._make_plan(context, session, index, tools_schema, failure)
+                if self._plan is None:
+                    # Unusable plan: per-step mode for the rest of the run
+                    self._plans_left = 0
+                    return None, failure
+            if index not in self._plan:
+                return None, failure
+            actions, failure = await self._run_actions(session, self._plan[index], memory, "🗺️  Plan")
+            if actions is not None:
+                return actions, None
+            self._plan = None
+
+    async def _make_plan(self, context, session, start, tools_schema, failure=None):
+        """One LLM request for the tool calls of steps[start:]. Returns {step index: [actions]} or None."""
+        steps = context.steps_queue
+        tool_lines = "\n".join(
+            f"- {t['name']}({', '.join((t['inputSchema'] or {}).get('properties', {}).keys())}): {t['description']}"
+            for t in tools_schema
+        )
+        step_lines = "\n".join(f"{n}. {steps[n - 1]}" for n in range(start + 1, len(steps) + 1))
+
+        failure_note = ""
+        if failure:
+            # Show the model where the browser actually is, with refs it can target
+            page_text = ""
             try:
+                result = await session.call_tool("snapshot", arguments={"full": True})
+                page_text = str(result.content[0].text)[:3000] if result.content else ""
+            except Exception:
+                pass
+            failure_note = f"""
+        The previous plan failed at step {start + 1}: {failure}
+        CURRENT PAGE (accessibility snapshot, click/fill accept "ref": "eN"):
+        {page_text}
+        """
+
+        prompt = f"""
+        You are a QA Automation Agent. Plan the browser tool calls for these test steps.
+        TOOLS:
+        {tool_lines}
+        STEPS:
+        {step_lines}
+        {failure_note}
+        RULES:
+        1. Every step gets at least one call (use snapshot or get_content for verification steps).
+        2. Use only the tools above, with exact CSS selectors / URLs from the steps.
+        3. Return ONLY a JSON array in execution order:
+           [{{"step": <step number>, "tool": "<tool name>", "args": {{...}}}}]
+        """
+        print(f"   🗺️  Planning steps {start + 1}-{len(steps)}{' (re-plan)' if failure else ''}...")
+        try:
+            raw_response = await get_ai_response_async([{"role": "user", "content": prompt}], config=context.model_config)
+            text = extract_ai_text(raw_response) if raw_response is not None else ""
+            planned = json.loads(text.replace("```json", "").replace("```", "").strip())
+        except Exception as e:
+            print(f"   ⚠️  Planning failed ({e}), using per-step mode.")
+            return None
+
+        tool_names = {t["name"] for t in tools_schema}
+        plan = {}
+        for call in planned if isinstance(planned, list) else []:
+            if not isinstance(call, dict) or call.get("tool") not in tool_names:
+                continue
+            try:
+                index = int(call.get("step", 0)) - 1
+            except (TypeError, ValueError):
+                continue
+            if start <= index < len(steps):
+                args = call.get("args") if isinstance(call.get("args"), dict) else {}
+                plan.setdefault(index, []).append({"tool": call["tool"], "args": args})
+        if not plan:
+            print("   ⚠️  Empty plan, using per-step mode.")
+            return None
+        print(f"   🗺️  Plan: {sum(len(a) for a in plan.values())} calls for {len(plan)} steps.")
+        return plan
+
+    async def _run_step_with_ai(self, context, session, step, memory, tools_schema, model_name):
+        """
+        LLM round trips for the step, at most STEP_MAX_ROUNDS: observations (snapshot,
+        get_content, ...) feed the next round, the step ends with the first browser
+        action (RECORDED_ACTIONS), a text answer or a tool error.
+        Returns (successful tool calls, no tool errors), actions None if the run failed.
+        Observations are only kept for steps without an action (verification steps).
+        """
+        observations = []
+        try:
+            for _ in range(STEP_MAX_ROUNDS):
                 # 1. CALL AI (Universal Handler)
-                raw_response = get_ai_response(messages, tools_schema)
-                
+                messages = memory.window(model_name)
+                if memory.last_stats["saved_tokens"]:
+                    print(f"   🧹 Context: {memory.last_stats['sent_tokens']} tokens sent ({memory.last_stats['saved_tokens']} saved)")
+                raw_response = await get_ai_response_async(messages, tools_schema, config=context.model_config)
+
                 # 2. PARSE RESPONSE (Universal Adapter)
                 intent = parse_ai_response(raw_response)
 
-                # 3. HANDLE TOOL CALL
-                if intent["type"] == "tool_call":
-                    tool_name = intent["tool_name"]
-                    tool_args = intent["tool_args"]
-                    print(f"   🛠️  AI Action: {tool_name} {tool_args}")
-                    
-                    # Execute on Server
-                    result = await session.call_tool(tool_name, arguments=tool_args)
-                    result_text = str(result.content[0].text)
-                    print(f"   ✅ Tool Result: {result_text[:100]}...")
-                    
-                    # Record for POM Generation
-                    if tool_name in ["navigate", "click", "fill", "selectOption", "press"]:
-                        context.recorded_history.append({
-                            "action": tool_name,
-                            "params": tool_args,
-                            "description": step
-                        })
-
-                    # Update History
-                    # We treat the tool result as a User Observation to keep it compatible across models
-                    messages.append({"role": "model", "content": f"I am calling {tool_name}."})
-                    messages.append({"role": "user", "content": f"Tool '{tool_name}' returned: {result_text}"})
-
-                # 4. HANDLE TEXT RESPONSE
-                elif intent["type"] == "text":
-                    print(f"   ℹ️  AI Note: {intent['content']}")
-                    messages.append({"role": "model", "content": intent["content"]})
-
-                # Small pause to prevent rate limit hammering during loops
-                await asyncio.sleep(1)
+                # 3. HANDLE TEXT RESPONSE: the step is done
+                if intent["type"] != "tool_call":
+                    print(f"   ℹ️  AI Note: {intent.get('content')}")
+                    memory.add({"role": "model", "content": intent.get("content") or ""})
+                    return observations, True
 
-            except Exception as e:
-                print(f"   ❌ Execution Failed: {e}")
-                # Print full traceback for debugging if needed
-                # import traceback; traceback.print_exc()
-                context.mark_failed(str(e))
-                break
+                # 4. HANDLE TOOL CALL
+                tool_name = intent["tool_name"]
+                tool_args = intent["tool_args"]
+                print(f"   🛠️  AI Action: {tool_name} {tool_args}")
+
+                # Execute on Server
+                result = await session.call_tool(tool_name, arguments=tool_args)
+                result_text = str(result.content[0].text)
+                print(f"   ✅ Tool Result: {result_text[:100]}...")
+
+                # Update History
+                # We treat the tool result as a User Observation to keep it compatible across models
+                memory.add({"role": "model", "content": f"I am calling {tool_name}."})
+                memory.add({"role": "user", "content": f"Tool '{tool_name}' returned: {result_text}"})
+
+                # Only successful actions are recorded/replayed
+                if result.isError:
+                    return observations, False
+                action = durable_action(tool_name, tool_args, result_text)
+                if tool_name in RECORDED_ACTIONS:
+                    return [action], True
+                observations.append(action)
+
+            print(f"   ⚠️  Step used all {STEP_MAX_ROUNDS} rounds without a browser action.")
+            return observations, True
+
+        except Exception as e:
+            print(f"   ❌ Execution Failed: {e}")
+            # Print full traceback for debugging if needed
+            # import traceback; traceback.print_exc()
+            context.mark_failed(str(e))
+            return None, False
 
 # --- NODE 3: VERIFIED POM GENERATOR ---
 class VerifiedPomNode(BaseNode):
+    inputs = ("recorded_history", "test_name")
+    outputs = ("pom_class_name", "pom_path")
+
+    def __init__(self, wait_for_optimizer=OPTIMIZER_WAIT):
+        # False: the optimizer rewrites the file in the background after the node finished
+        self.wait_for_optimizer = wait_for_optimizer
+
     async def execute(self, context: WorkflowContext, session=None):
         if context.failed: return
         print(f"\n--- 🏗️ NODE 3: POM Generation ---")
@@ -129,7 +373,8 @@ class VerifiedPomNode(BaseNode):
 
         history_json = json.dumps({"title": context.test_name, "steps": context.recorded_history})
         
-        pom_name, pom_code = generate_pom_code(history_json)
+        # Generators use the blocking client, keep them off the event loop
+        pom_name, pom_code = await asyncio.to_thread(generate_pom_code, history_json, config=context.model_config)
         
         if not os.path.exists(PAGES_DIR): os.makedirs(PAGES_DIR)
         pom_path = os.path.join(PAGES_DIR, f"{pom_name}Page.ts")
@@ -139,20 +384,33 @@ class VerifiedPomNode(BaseNode):
             
         print(f"   📄 Generated: {pom_name}Page.ts")
         
-        # Optimize
-        optimize_code(pom_path, file_type="POM")
+        # Optimize (background queue, skipped when the content was optimized before)
+        job = optimizer_queue.submit(pom_path, file_type="POM")
+        if self.wait_for_optimizer:
+            await asyncio.wrap_future(job)
         
         context.pom_class_name = pom_name
         context.pom_path = pom_path
 
+    def checkpoint_valid(self, context):
+        # The checkpoint only holds the path, the file itself must still be there
+        return not context.pom_path or os.path.exists(context.pom_path)
+
 # --- NODE 4: SPEC GENERATOR ---
+# Only needs the POM class name, which follows from the title: can run alongside Node 3
 class VerifiedSpecNode(BaseNode):
+    inputs = ("recorded_history", "test_name")
+    outputs = ("spec_path",)
+
+    def __init__(self, wait_for_optimizer=OPTIMIZER_WAIT):
+        self.wait_for_optimizer = wait_for_optimizer
+
     async def execute(self, context: WorkflowContext, session=None):
-        if context.failed or not context.pom_class_name: return
+        if context.failed or not context.recorded_history: return
         print(f"\n--- 🧪 NODE 4: Spec Generation ---")
         
         history_json = json.dumps({"title": context.test_name, "steps": context.recorded_history})
-        spec_code = generate_spec_code(history_json, context.pom_class_name)
+        spec_code = await asyncio.to_thread(generate_spec_code, history_json, pom_class_name(context.test_name), config=context.model_config)
         
         if not os.path.exists(SPECS_DIR): os.makedirs(SPECS_DIR)
         spec_path = os.path.join(SPECS_DIR, f"{context.test_name}.spec.ts")
@@ -162,5 +420,10 @@ class VerifiedSpecNode(BaseNode):
             
         print(f"   📄 Generated: {context.test_name}.spec.ts")
         
-        optimize_code(spec_path, file_type="Spec")
-        context.spec_path = spec_path
\ No newline at end of file
+        job = optimizer_queue.submit(spec_path, file_type="Spec")
+        if self.wait_for_optimizer:
+            await asyncio.wrap_future(job)
+        context.spec_path = spec_path
+
+    def checkpoint_valid(self, context):
+        return not context.spec_path or os.path.exists(context.spec_path)
\ No newline at end of file
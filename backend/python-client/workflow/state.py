@@ -2,6 +2,7 @@ class WorkflowContext:
     def __init__(self):
         # Input Data
         self.steps_queue = []       # Steps loaded from Markdown
+        self.fixture_hash = None    # sha256 of the fixture file (trace/replay key)
         # Execution Data (The missing part)
         self.recorded_history = []  # Stores successful actions (Selector, Value, Action)
         # State Flags
@@ -12,6 +13,10 @@ class WorkflowContext:
         self.pom_class_name = None
         self.pom_path = None
         self.spec_path = None
+        # Per-node {"node", "status", "seconds"} of the last engine run
+        self.node_timings = []
+        # AI Settings (request-scoped, see core.ai.ModelConfig)
+        self.model_config = None
 
     def mark_failed(self, error):
         """Helper to mark the workflow as failed and stop execution."""
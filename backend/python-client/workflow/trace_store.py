@@ -0,0 +1,48 @@
+import os
+import json
+import time
+import hashlib
+
+# --- CONFIGURATION FROM ENV ---
+_CLIENT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+TRACE_DIR = os.getenv("FIXTURE_TRACE_DIR", os.path.join(_CLIENT_ROOT, ".ai_cache", "traces"))
+REPLAY_ENABLED = os.getenv("FIXTURE_REPLAY", "1") == "1"
+
+def fixture_hash(file_path):
+    """sha256 of the fixture file: any edit to the markdown invalidates its trace."""
+    with open(file_path, "rb") as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+class TraceStore:
+    """
+    Recorded tool calls of successful fixture runs, one JSON file per fixture hash:
+        {"test_name", "recorded_at", "steps": [{"step": "...", "actions": [{"tool", "args"}]}]}
+    """
+    def __init__(self, directory=TRACE_DIR):
+        self.directory = directory
+
+    def path(self, digest):
+        return os.path.join(self.directory, f"{digest}.json")
+
+    def load(self, digest):
+        """Recorded steps for this fixture hash, or None."""
+        if not digest or not os.path.exists(self.path(digest)):
+            return None
+        try:
+            with open(self.path(digest), "r") as f:
+                return json.load(f)["steps"]
+        except (OSError, ValueError, KeyError) as e:
+            print(f"⚠️ Ignoring unreadable trace {digest[:12]}: {e}")
+            return None
+
+    def save(self, digest, test_name, steps):
+        os.makedirs(self.directory, exist_ok=True)
+        tmp_path = self.path(digest) + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({"test_name": test_name, "recorded_at": time.time(), "steps": steps}, f, indent=2)
+        # Atomic: a concurrent batch run never reads half a trace
+        os.replace(tmp_path, self.path(digest))
+
+    def delete(self, digest):
+        if digest and os.path.exists(self.path(digest)):
+            os.remove(self.path(digest))
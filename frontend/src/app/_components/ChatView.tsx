@@ -12,7 +12,9 @@ import { twMerge } from "tailwind-merge";
 
 function cn(...inputs: ClassValue[]) { return twMerge(clsx(inputs)); }
 
-type Message = { role: "user" | "ai"; content: string; image?: string; timestamp: string };
+type Message = { role: "user" | "ai"; content: string; image?: { url: string; thumbnail?: string }; timestamp: string; streaming?: boolean };
+
+const API_BASE = "http://localhost:8000";
 type Log = { text: string; timestamp: string; type: "info" | "action" | "error" | "success" };
 
 export default function ChatView() {
@@ -52,13 +54,28 @@ export default function ChatView() {
         
         setLogs((prev) => [...prev, { text: data.content, timestamp: time, type: logType }]);
       } 
-      // Handle Chat Response
+      // Handle Streaming Tokens (append to the in-progress AI message)
+      else if (data.type === "delta") {
+        setMessages((prev) => {
+          const last = prev[prev.length - 1];
+          if (last?.role === "ai" && last.streaming) {
+            return [...prev.slice(0, -1), { ...last, content: last.content + data.content }];
+          }
+          return [...prev, { role: "ai", content: data.content, timestamp: time, streaming: true }];
+        });
+      }
+      // Handle Chat Response (final text replaces the streamed draft)
       else if (data.type === "response") {
-        setMessages((prev) => [...prev, { role: "ai", content: data.content, timestamp: time }]);
+        setMessages((prev) => {
+          const last = prev[prev.length - 1];
+          const base = last?.role === "ai" && last.streaming ? prev.slice(0, -1) : prev;
+          return [...base, { role: "ai", content: data.content, timestamp: time }];
+        });
       } 
-      // Handle Images
+      // Handle Images (link to the stored PNG + optional inline preview)
       else if (data.type === "image") {
-        setMessages((prev) => [...prev, { role: "ai", content: "Screenshot Captured", image: data.content, timestamp: time }]);
+        const image = { url: `${API_BASE}${data.url}`, thumbnail: data.thumbnail ?? undefined };
+        setMessages((prev) => [...prev, { role: "ai", content: "Screenshot Captured", image, timestamp: time }]);
       }
       // Handle Errors
       else if (data.type === "error") {
@@ -68,6 +85,8 @@ export default function ChatView() {
       // Stop Processing State
       if(data.type === "done" || data.type === "response" || data.type === "error") {
         setIsProcessing(false);
+        // Close any draft left open (e.g. text streamed before a tool call)
+        setMessages((prev) => prev.map((m) => (m.streaming ? { ...m, streaming: false } : m)));
       }
     };
 
@@ -170,7 +189,13 @@ export default function ChatView() {
                 
                 {msg.image && (
                   <div className="mt-2 border border-white/10 rounded-lg overflow-hidden bg-black shadow-2xl relative group">
-                    <img src={`data:image/png;base64,${msg.image}`} alt="Screenshot" className="w-full h-auto opacity-90 group-hover:opacity-100 transition-opacity" />
+                    <a href={msg.image.url} target="_blank" rel="noreferrer">
+                      <img
+                        src={msg.image.thumbnail ? `data:image/jpeg;base64,${msg.image.thumbnail}` : msg.image.url}
+                        alt="Screenshot"
+                        className="w-full h-auto opacity-90 group-hover:opacity-100 transition-opacity"
+                      />
+                    </a>
                   </div>
                 )}
               </div>